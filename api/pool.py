@@ -21,10 +21,12 @@ SOFTWARE.
 """
 import copy
 from enum import Enum
+import functools
 import numpy as np
 from typing import List, Tuple, Any
-from source.water_year_info import WaterYearInfo
+from source.water_year_info import WaterYearInfo, WaterYearCalendar
 from api.event_log import EventLog
+from api import pool_kernels
 from api.ui_abstraction import UIAbstraction
 
 
@@ -124,6 +126,8 @@ class FillRun(PoolRun):
         self.paper_fills:list[float] = []
         self.paper_fill_dates:list[str] = []
         self.date_values:list[DateValue] = []
+        # Start day of each date value, looked up once rather than on every simulated day
+        self.date_value_days:list[int]|None = None
 
     def __str__(self)->str:
         string = super().__str__()
@@ -150,16 +154,27 @@ class FillRun(PoolRun):
 
     def append_date_value(self, start_date:str, value:float)->None:
         self.date_values.append(DateValue(start_date, value))
+        self.date_value_days = None
 
     def get_value_for_day(self, day:int)->float:
-        for date_value in reversed(self.date_values):
-            start_day = WaterYearInfo.day_for_date(self.dates, date_value.start_date)
+        if self.date_value_days is None or len(self.date_value_days) != len(self.date_values):
+            calendar = WaterYearCalendar.for_dates(self.dates)
+            self.date_value_days = [calendar.day_for_label(date_value.start_date) for date_value in self.date_values]
+        for date_value, start_day in zip(reversed(self.date_values), reversed(self.date_value_days)):
             if day >= start_day:
                 return date_value.value
         print(f'get_value_for_day out of range {day} {str(self.date_values)}')
         return 0.0
 
     def fill_pool(self, pool:list|np.ndarray, call_water:list|np.ndarray):
+        complete_day, remaining_cfs = pool_kernels.fill_to_target(pool, call_water, self.start_day, self.end_day,
+                                                                  self.target)
+        if complete_day is not None:
+            self.complete_day = complete_day
+            self.complete_remaining_cfs = remaining_cfs
+
+    def fill_pool_by_day(self, pool:list|np.ndarray, call_water:list|np.ndarray):
+        # Reference for pool_kernels.fill_to_target
         day = 0
         end_day = self.end_day
         if not end_day:
@@ -239,6 +254,36 @@ class DrainRun(PoolRun):
         self.paper_drains.append(value)
         self.paper_drain_dates.append(date)
 
+    def drain_pool(self, pool:list|np.ndarray, call_water:list|np.ndarray):
+        complete_day, remaining_cfs = pool_kernels.drain_to_zero(pool, call_water, self.start_day, self.end_day)
+        if complete_day is not None:
+            self.complete_day = complete_day
+            self.complete_remaining_cfs = remaining_cfs
+
+    def drain_pool_by_day(self, pool:list|np.ndarray, call_water:list|np.ndarray):
+        # Reference for pool_kernels.drain_to_zero
+        day = 0
+        end_day = self.end_day
+        if not end_day:
+            end_day = len(pool)
+        for day in range(self.start_day, end_day):
+            cfs = PoolQueue.get_value(day, call_water)
+            if cfs > 0.0:
+                available = pool[day-1]
+                if cfs < available: # Draining
+                    pool[day] = pool[day-1] - cfs
+                else: # Drain complete
+                    self.complete_day = day
+                    self.complete_remaining_cfs = cfs - available
+                    pool[day] = pool[day-1] - available
+                    break
+            else:
+                pass # Call water is negative so we are filling not draining
+
+        start_day = day + 1
+        for day in range(start_day, len(pool)):
+            pool[day] = pool[day - 1]
+
 
 class EvapRun(PoolRun):
     def __init__(self, variable_name:str, start_day:int, dates:list[str]):
@@ -251,6 +296,27 @@ class EvapRun(PoolRun):
         return 'Evap ' + string.replace('TYPE', type_str)
 
 
+class CompiledEquation:
+    """
+    An equation string scanned once: whether a term may be multiplied by zero and, for each list of
+    variable names it is asked about, which of them appear in it.  Instances are shared by equation text
+    through PoolQueue.compile_equation's bounded cache, so a repeated equation is only scanned the first time.
+    """
+    __slots__ = ('text', 'may_be_nulled', 'names_found')
+
+    def __init__(self, text:str):
+        self.text:str = text
+        self.may_be_nulled:bool = '*0)' in text or text.endswith('*0')
+        self.names_found:dict[tuple, tuple] = {}
+
+    def names_in(self, variable_names:tuple)->tuple:
+        found = self.names_found.get(variable_names)
+        if found is None:
+            found = tuple(variable_name for variable_name in variable_names if variable_name in self.text)
+            self.names_found[variable_names] = found
+        return found
+
+
 class PoolQueue(List):
     af_to_cfs = 1.9835
 
@@ -512,13 +578,18 @@ class PoolQueue(List):
         custom_start_day = -1
         custom = False
 
+        fill_drain_names = tuple(fill_drain_variable_names)
+        evap_names = tuple(evap_variable_names)
+        transfer_names = tuple(transfer_to_names) if transfer_to_names else ()
+
+        calendar = WaterYearCalendar.for_dates(dates)
         fill_max_end_day = len(dates)
         if fill_max_end_date:
-            fill_max_end_day = WaterYearInfo.day_for_date(dates, fill_max_end_date)
+            fill_max_end_day = calendar.day_for_label(fill_max_end_date)
 
         day = 0
         for day, equation in enumerate(f):
-            date_str = WaterYearInfo.format_to_month_day(dates[day])
+            date_str = calendar.labels[day]
 
             paper_fill = 0
 
@@ -552,16 +623,14 @@ class PoolQueue(List):
             if equation is not None:
                 # Fill/Drain analysis
                 #
-                equation_may_be_nulled = False
-                if '*0)' in equation or equation.endswith('*0'):
+                compiled = PoolQueue.compile_equation(equation)
+                equation_may_be_nulled = compiled.may_be_nulled
+                if equation_may_be_nulled:
                     print(f'  {date_str} {variable_name} equation may be nulled: {equation}')
-                    equation_may_be_nulled = True
 
-                fill_drain_names_in_equation = PoolQueue.variable_names_in_equation(fill_drain_variable_names, equation)
-                evap_names_in_equation = PoolQueue.variable_names_in_equation(evap_variable_names, equation)
-                transfer_to_names_in_equation = []
-                if transfer_to_names:
-                    transfer_to_names_in_equation = PoolQueue.variable_names_in_equation(transfer_to_names, equation)
+                fill_drain_names_in_equation = compiled.names_in(fill_drain_names)
+                evap_names_in_equation = compiled.names_in(evap_names)
+                transfer_to_names_in_equation = compiled.names_in(transfer_names)
 
                 if fill_drain_names_in_equation and not equation_may_be_nulled:
                     if fill_value > 0 and pool_delta > 0:
@@ -700,7 +769,7 @@ class PoolQueue(List):
                         custom_start_day = -1
                 self.end_evap_run(variable_name, day, date_str)
 
-        date_str = WaterYearInfo.format_to_month_day(dates[day-1])
+        date_str = calendar.labels[day-1]
         if self.fill_run:
             self.fill_run.still_in_progress = True
             self.end_fill_run(variable_name, day, date_str)
@@ -712,7 +781,7 @@ class PoolQueue(List):
             self.end_evap_run(variable_name, day, date_str)
 
         if custom_start_day != -1:
-            date_str = WaterYearInfo.format_to_month_day(dates[day-1])
+            date_str = calendar.labels[day-1]
             print(f'  {date_str} {variable_name} custom data in progress')
             custom_runs.append((custom_start_day, day))
         if custom_runs:
@@ -795,6 +864,12 @@ class PoolQueue(List):
         self.end_fill_run(variable_name, day, date_str)
         self.end_drain_run(variable_name, day, date_str)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def compile_equation(equation:str)->CompiledEquation:
+        # Shared across variables and water years, the least recently used equations are dropped
+        return CompiledEquation(equation)
+
     @staticmethod
     def variable_names_in_equation(variable_names, equation):
         variable_names_in_equation = []
@@ -807,9 +882,12 @@ class PoolQueue(List):
     def analyze_drain_runs(variable_name, drain_variable_names, evap_variable_names, drain_runs, equations, dates):
         result = []
         f = equations.get(variable_name)
+        drain_names = tuple(drain_variable_names)
+        evap_names = tuple(evap_variable_names)
+        calendar = WaterYearCalendar.for_dates(dates)
         for drain_run in drain_runs:
-            start_day = WaterYearInfo.day_for_date(dates, drain_run[0])
-            end_day = WaterYearInfo.day_for_date(dates, drain_run[1])
+            start_day = calendar.day_for_label(drain_run[0])
+            end_day = calendar.day_for_label(drain_run[1])
 
             # print(f'  {variable_name} Drain [{drain_run[0]} {drain_run[1]}]:')
             run = DrainRun(variable_name, DrainType.NONE, start_day, dates)
@@ -818,14 +896,9 @@ class PoolQueue(List):
                 drain = False
                 evap = False
                 if equation is not None:
-                    for drain_variable_name in drain_variable_names:
-                        if drain_variable_name in equation:
-                            drain = True
-                            break
-                    for evap_variable_name in evap_variable_names:
-                        if evap_variable_name in equation:
-                            evap = True
-                            break
+                    compiled = PoolQueue.compile_equation(equation)
+                    drain = bool(compiled.names_in(drain_names))
+                    evap = bool(compiled.names_in(evap_names))
 
                     if drain:
                         drain_state = DrainType.DRAIN
@@ -978,13 +1051,13 @@ class PoolQueue(List):
             List of tuples ('start_date_str', 'end_date_str') in 'Nov-1' format
         """
         result = []
+        if not runs:
+            return result
+        labels = WaterYearCalendar.for_dates(date_times).labels_no_zeroes
         for run in runs:
-            start_dt = date_times[run[0]]
-            end_dt = date_times[run[1]]
-
             # Format as 'Nov-1', 'Dec-25', etc.
-            start_str = start_dt.strftime('%b-%-d').replace(' 0', ' ')  # Handle single-digit days
-            end_str = end_dt.strftime('%b-%-d').replace(' 0', ' ')
+            start_str = labels[run[0]]
+            end_str = labels[run[1]]
 
             if len(run) == 2:
                 result.append((start_str, end_str))
@@ -0,0 +1,290 @@
+"""
+Copyright (c) 2025 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import contextlib
+import gc
+import io
+import multiprocessing.util
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from api.event_log import EventLog
+from api.pool import PoolQueue
+from api.ui_abstraction import UIAbstraction
+
+# Batch pool run analysis.  A batch is a list of (water year, variable name) jobs, each runs
+# PoolQueue.build_pool_runs and then PoolQueue.analyze_drain_runs on the drain runs it found.  Water years
+# and variables are independent so jobs run in a process pool.
+#
+# The inputs for every water year are packed once into a single shared memory block, numeric series as raw
+# arrays and everything else (dates, equations, options) pickled into a header at the front.  Each worker
+# attaches to the block when it starts and builds read only views, so a job only ships its water year and
+# variable name.  Printed output and logger messages from a job are captured and replayed in job order as
+# results arrive, and results come back in job order, so a batch prints and merges the same whatever the
+# number of workers.  Workers drop their views and close the block when they exit.
+
+max_workers = os.cpu_count() or 1
+
+
+class PoolYear(object):
+    """
+    Inputs for one water year.  data and equations are by variable name as build_pool_runs takes them,
+    flows maps each pool variable name to its (fill_values, drain_values, spill_values, evap_values).
+    """
+    def __init__(self, dates:list, data:dict, equations:dict, flows:dict):
+        self.dates = dates
+        self.data:dict = data
+        self.equations:dict = equations
+        self.flows:dict = flows
+
+
+class PoolRunResult(object):
+    def __init__(self, water_year:int, variable_name:str):
+        self.water_year:int = water_year
+        self.variable_name:str = variable_name
+        self.fill_queue:PoolQueue|None = None
+        self.drain_queue:PoolQueue|None = None
+        self.evap_queue:PoolQueue|None = None
+        self.config:tuple|None = None
+        self.drain_analysis:list = []
+        self.messages:list[str] = []
+        self.output:str = ''
+        self.event_log:EventLog = EventLog()
+
+    def queues(self)->list[PoolQueue]:
+        return [queue for queue in (self.fill_queue, self.drain_queue, self.evap_queue) if queue]
+
+
+class MessageLogger(UIAbstraction):
+    def __init__(self):
+        super().__init__(None)
+        self.messages:list[str] = []
+
+    def log_message(self, message):
+        self.messages.append(message)
+
+
+def run_job(year:PoolYear, options:dict, water_year:int, variable_name:str)->PoolRunResult:
+    """ build_pool_runs and analyze_drain_runs for one variable in one water year """
+    result = PoolRunResult(water_year, variable_name)
+    logger = MessageLogger()
+    fill_drain_variable_names = options['fill_drain_variable_names']
+    evap_variable_names = options['evap_variable_names']
+    flows = year.flows.get(variable_name)
+    if flows is None:
+        flows = (None, None, None, None)
+    fill_values, drain_values, spill_values, evap_values = flows
+
+    config = {}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        pool_queue = PoolQueue()
+        result.fill_queue, result.drain_queue, result.evap_queue = pool_queue.build_pool_runs(
+            logger, variable_name, fill_values, drain_values, spill_values, config,
+            fill_drain_variable_names, evap_variable_names, evap_values, year.equations, year.data, year.dates,
+            allow_transfers=options.get('allow_transfers', False),
+            fill_max_end_date=options.get('fill_max_end_date'),
+            transfer_to_names=options.get('transfer_to_names'),
+            do_paper_drains=options.get('do_paper_drains', False))
+        result.config = config.get(variable_name)
+        if result.config is not None:
+            drain_variable_names = options.get('drain_variable_names') or fill_drain_variable_names
+            result.drain_analysis = PoolQueue.analyze_drain_runs(variable_name, drain_variable_names,
+                                                                 evap_variable_names, result.config[1],
+                                                                 year.equations, year.dates)
+    result.output = output.getvalue()
+    result.messages = logger.messages
+
+    for message in logger.messages:
+        result.event_log.log(0, variable_name, message)
+    for queue in result.queues():
+        for run in queue:
+            result.event_log.log(run.start_day, variable_name, str(run))
+    return result
+
+
+def pack(years:dict[int, PoolYear], options:dict)->shared_memory.SharedMemory:
+    """
+    Copy the inputs for all water years into one shared memory block.  Numeric 1-D series go in as raw
+    arrays, anything else (lists holding None, equations, dates) is pickled into the header.
+    """
+    chunks = []
+    offset = 0
+
+    def place(value):
+        nonlocal offset
+        if value is None or isinstance(value, (str, dict)):
+            return value
+        a = np.asarray(value)
+        if a.ndim != 1 or a.dtype.kind not in 'fiub':
+            return value
+        a = np.ascontiguousarray(a)
+        ref = ('shared', offset, a.dtype.str, len(a), not isinstance(value, np.ndarray))
+        chunks.append((offset, a))
+        offset += (a.nbytes + 7) // 8 * 8
+        return ref
+
+    header = {'options': options, 'years': {}}
+    for water_year, year in years.items():
+        header['years'][water_year] = PoolYear(year.dates,
+                                               {name: place(value) for name, value in year.data.items()},
+                                               year.equations,
+                                               {name: tuple(place(value) for value in flows)
+                                                for name, flows in year.flows.items()})
+    header_bytes = pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL)
+    data_start = (8 + len(header_bytes) + 7) // 8 * 8
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data_start + offset, 1))
+    shm.buf[:8] = len(header_bytes).to_bytes(8, 'little')
+    shm.buf[8:8 + len(header_bytes)] = header_bytes
+    for chunk_offset, a in chunks:
+        start = data_start + chunk_offset
+        shm.buf[start:start + a.nbytes] = a.tobytes()
+    return shm
+
+
+def unpack(shm:shared_memory.SharedMemory)->tuple[dict[int, PoolYear], dict]:
+    """ Water years and options from a block written by pack, arrays are read only views of the block """
+    header_length = int.from_bytes(bytes(shm.buf[:8]), 'little')
+    header = pickle.loads(shm.buf[8:8 + header_length])
+    data_start = (8 + header_length + 7) // 8 * 8
+
+    def restore(value):
+        if not isinstance(value, tuple) or len(value) != 5 or value[0] != 'shared':
+            return value
+        _, offset, dtype, length, as_list = value
+        a = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf, offset=data_start + offset)
+        if as_list:
+            return a.tolist()
+        a.flags.writeable = False
+        return a
+
+    years = {}
+    for water_year, year in header['years'].items():
+        years[water_year] = PoolYear(year.dates,
+                                     {name: restore(value) for name, value in year.data.items()},
+                                     year.equations,
+                                     {name: tuple(restore(value) for value in flows)
+                                      for name, flows in year.flows.items()})
+    return years, header['options']
+
+
+# Per worker process state set by attach
+worker_shm:shared_memory.SharedMemory|None = None
+worker_years:dict[int, PoolYear] = {}
+worker_options:dict = {}
+
+
+def attach(shm_name:str):
+    global worker_shm, worker_years, worker_options
+    worker_shm = shared_memory.SharedMemory(name=shm_name)
+    worker_years, worker_options = unpack(worker_shm)
+    # Pool workers leave through os._exit, which skips atexit, multiprocessing finalizers still run
+    multiprocessing.util.Finalize(None, detach, exitpriority=10)
+
+
+def detach():
+    # Drop the views into the block before closing it, a view still alive keeps the mapping open
+    global worker_shm, worker_years, worker_options
+    worker_years = {}
+    worker_options = {}
+    if worker_shm is not None:
+        gc.collect()
+        try:
+            worker_shm.close()
+        except BufferError as e:
+            print(f'pool_batch detach {worker_shm.name}: {e}')
+        worker_shm = None
+
+
+def run_worker_job(job:tuple[int, str])->PoolRunResult:
+    water_year, variable_name = job
+    return run_job(worker_years[water_year], worker_options, water_year, variable_name)
+
+
+def build_pool_runs(jobs:list[tuple[int, str]], years:dict[int, PoolYear],
+                    fill_drain_variable_names:list[str], evap_variable_names:list[str],
+                    drain_variable_names:list[str]|None=None, allow_transfers:bool=False,
+                    fill_max_end_date:str|None=None, transfer_to_names:list[str]|None=None,
+                    do_paper_drains:bool=False, workers:int=max_workers)->list[PoolRunResult]:
+    """
+    Run build_pool_runs and analyze_drain_runs for each (water year, variable name) in jobs.  Results are
+    in the order of jobs.  Each job's printed output is replayed as soon as it and every job before it have
+    finished, so output streams in job order.  workers=1 runs in this process without shared memory.
+    """
+    options = {
+        'fill_drain_variable_names': list(fill_drain_variable_names),
+        'evap_variable_names': list(evap_variable_names),
+        'drain_variable_names': list(drain_variable_names) if drain_variable_names else None,
+        'allow_transfers': allow_transfers,
+        'fill_max_end_date': fill_max_end_date,
+        'transfer_to_names': list(transfer_to_names) if transfer_to_names else None,
+        'do_paper_drains': do_paper_drains,
+    }
+    jobs = list(jobs)
+    workers = max(1, min(workers, len(jobs)))
+
+    results = []
+    if workers == 1:
+        for water_year, variable_name in jobs:
+            result = run_job(years[water_year], options, water_year, variable_name)
+            if result.output:
+                print(result.output, end='')
+            results.append(result)
+    else:
+        shm = pack(years, options)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=attach, initargs=(shm.name,)) as executor:
+                chunk_size = max(1, len(jobs) // (workers * 4))
+                # map yields in job order as results arrive
+                for result in executor.map(run_worker_job, jobs, chunksize=chunk_size):
+                    # Runs come back with their own copy of the dates, point them back at the caller's
+                    dates = years[result.water_year].dates
+                    for queue in result.queues():
+                        for run in queue:
+                            run.dates = dates
+                    for run in result.drain_analysis:
+                        run.dates = dates
+                    if result.output:
+                        print(result.output, end='')
+                    results.append(result)
+        finally:
+            shm.close()
+            shm.unlink()
+    return results
+
+
+def merge(results:list[PoolRunResult])->dict[int, tuple[PoolQueue, EventLog]]:
+    """
+    One PoolQueue and EventLog per water year, in order of first appearance in results, holding each
+    job's fill, drain and evap runs and events in job order.
+    """
+    merged:dict[int, tuple[PoolQueue, EventLog]] = {}
+    for result in results:
+        if result.water_year not in merged:
+            merged[result.water_year] = (PoolQueue(), EventLog())
+        pool_queue, event_log = merged[result.water_year]
+        for queue in result.queues():
+            pool_queue.extend(queue)
+        event_log.events.extend(result.event_log.events)
+    return merged
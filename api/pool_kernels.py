@@ -0,0 +1,167 @@
+"""
+Copyright (c) 2025 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import time
+import numpy as np
+
+# Whole run numpy versions of the day by day pool loops in FillRun.fill_pool_by_day and
+# DrainRun.drain_pool_by_day, which stay as the reference implementations.
+#
+# On a day with positive call water the pool moves by that amount from the previous day, on any other day
+# (zero, negative, None or NaN) the pool keeps the value it already had and the next day builds from that.
+# So the pool over a run is a cumulative sum that restarts at each non positive day, the restart index is
+# propagated forward with np.maximum.accumulate.  The first day the call water reaches the target
+# completes the run, the pool is set to the target there and held flat for the rest of the year.
+# Levels agree with the day by day loop to floating point rounding of the cumulative sum.
+
+
+def call_water_for_run(call_water, start_day:int, end_day:int) -> np.ndarray:
+    """
+    Call water for days start_day..end_day-1 as float64, None becomes NaN (treated as no call) and
+    days past the end of call_water are zero like PoolQueue.get_value.
+    """
+    cfs = np.zeros(max(end_day - start_day, 0), dtype=np.float64)
+    if call_water is None or end_day <= start_day:
+        return cfs
+    stop = min(end_day, len(call_water))
+    if stop > start_day:
+        cfs[:stop - start_day] = np.asarray(call_water[start_day:stop], dtype=np.float64)
+    if stop < end_day:
+        print(f'call_water_for_run days {stop}-{end_day - 1} out of bounds')
+    return cfs
+
+
+def hold_forward(pool, from_day:int) -> None:
+    """ Hold pool[from_day-1] flat through the end of the pool, in place """
+    if from_day < len(pool):
+        if isinstance(pool, np.ndarray):
+            pool[from_day:] = pool[from_day - 1]
+        else:
+            pool[from_day:] = [pool[from_day - 1]] * (len(pool) - from_day)
+
+
+def _accumulate_to_target(values:np.ndarray, cfs:np.ndarray, start_day:int, target:float) -> tuple[int|None, float]:
+    # values is float64 and modified in place, returns (complete_day, remaining_cfs), complete_day None if
+    # the target is never reached.  The run's last day is start_day + len(cfs) - 1.
+    days = len(cfs)
+    end_day = start_day + days
+    if not days:
+        hold_forward(values, 1)
+        return None, 0.0
+
+    positive = cfs > 0.0
+    index = np.arange(days)
+    restart = np.maximum.accumulate(np.where(positive, -1, index))
+    sums = np.cumsum(np.where(positive, cfs, 0.0))
+
+    restarted = restart >= 0
+    restart_index = np.maximum(restart, 0)
+    before = values[start_day - 1]
+    base = np.where(restarted, values[start_day + restart_index], before)
+    base_sums = np.where(restarted, sums[restart_index], 0.0)
+    levels = base + (sums - base_sums)
+
+    previous = np.empty(days, dtype=np.float64)
+    previous[0] = before
+    previous[1:] = levels[:-1]
+    completes = positive & ~(cfs < target - previous)
+
+    complete = np.flatnonzero(completes)
+    if len(complete):
+        k = int(complete[0])
+        values[start_day:start_day + k] = levels[:k]
+        available = target - previous[k]
+        values[start_day + k] = previous[k] + available
+        hold_forward(values, start_day + k + 1)
+        return start_day + k, float(cfs[k] - available)
+
+    values[start_day:end_day] = levels
+    hold_forward(values, end_day)
+    return None, 0.0
+
+
+def _as_float_pool(pool) -> np.ndarray:
+    if isinstance(pool, np.ndarray) and pool.dtype == np.float64:
+        return pool
+    return np.asarray(pool, dtype=np.float64).copy()
+
+
+def _write_back(pool, values:np.ndarray) -> None:
+    if values is pool:
+        return
+    if isinstance(pool, np.ndarray):
+        pool[:] = values
+    else:
+        pool[:] = values.tolist()
+
+
+def fill_to_target(pool, call_water, start_day:int, end_day:int, target:float) -> tuple[int|None, float]:
+    """
+    Fill pool in place from start_day up to end_day (0 for the end of the pool) with positive call water,
+    capped at target.  Returns (complete_day, remaining_cfs) for the day the target was reached, the call
+    water left over that day, or (None, 0.0) if the run didn't fill.
+    """
+    if not end_day:
+        end_day = len(pool)
+    values = _as_float_pool(pool)
+    complete_day, remaining_cfs = _accumulate_to_target(values, call_water_for_run(call_water, start_day, end_day),
+                                                        start_day, target)
+    _write_back(pool, values)
+    return complete_day, remaining_cfs
+
+
+def drain_to_zero(pool, call_water, start_day:int, end_day:int) -> tuple[int|None, float]:
+    """
+    Drain pool in place from start_day up to end_day (0 for the end of the pool) by positive call water,
+    floored at zero.  Returns (complete_day, remaining_cfs) like fill_to_target.
+    """
+    if not end_day:
+        end_day = len(pool)
+    # Draining to zero is filling the negated pool to a target of zero
+    values = np.negative(np.asarray(pool, dtype=np.float64))
+    complete_day, remaining_cfs = _accumulate_to_target(values, call_water_for_run(call_water, start_day, end_day),
+                                                        start_day, 0.0)
+    np.negative(values, out=values)
+    _write_back(pool, values)
+    return complete_day, remaining_cfs
+
+
+def benchmark(iterations:int=200, days:int=365 * 40):
+    """ Time the day by day fill loop against the kernel over a multi decade daily pool """
+    from api.pool import FillRun, FillType
+
+    rng = np.random.default_rng(0)
+    dates = [''] * days
+    call_water = rng.uniform(-1, 2, days)
+    run = FillRun('benchmark', FillType.FILL, 1, dates)
+    run.target = float(np.sum(np.maximum(call_water, 0))) * 2
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run.copy().fill_pool_by_day(np.zeros(days), call_water)
+    by_day_secs = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run.copy().fill_pool(np.zeros(days), call_water)
+    kernel_secs = (time.perf_counter() - start) / iterations
+
+    print(f'pool kernels {days} days: by day {by_day_secs * 1000:8.3f} ms  kernel {kernel_secs * 1000:8.3f} ms')
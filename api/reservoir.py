@@ -21,9 +21,9 @@ SOFTWARE.
 """
 import copy
 from enum import Enum
-import numpy as np
 from typing import List, Tuple, Any
 from source.water_year_info import WaterYearInfo
+from rw import date_range
 from api.event_log import EventLog
 from api.ui_abstraction import UIAbstraction
 
@@ -41,14 +41,7 @@ class Reservoir:
 
     @staticmethod
     def clip_array_by_dates(arr, start_date, end_date):
-        # Ensure start_date and end_date are datetime64
-        start_date = np.datetime64(start_date)
-        end_date = np.datetime64(end_date)
-
-        dates = arr['dt'].astype('datetime64[D]')
-        # Create mask for dates within the range (inclusive)
-        mask = (dates >= start_date) & (dates <= end_date)
-
-        # Return clipped array
-        return arr[mask]
+        # Copy of the rows between start_date and end_date (inclusive).  arr must be sorted by date, the range
+        # is found by binary search, unsorted rows are not masked individually
+        return date_range.clip(arr, start_date, end_date).copy()
 
@@ -0,0 +1,398 @@
+"""
+Copyright (c) 2025 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+from api.pool import PoolRun, FillRun, DrainRun, EvapRun, FillType, DrainType, DateValue, PoolQueue
+
+# Columnar table of fill, drain and evap runs for multi-year accounting.  One numpy array per field
+# (variable, kind, type, start, end, complete day, remaining cfs, target ...) with variable names, date
+# labels and dates lists interned into small integer ids.  Paper fills or drains, fill date values and drain
+# overdrafts are ragged, one flat values array and one flat label id array per field plus row offsets.
+#
+# Merges and filters work on whole columns.  merge_adjacent() applies the same rules as PoolQueue's
+# merge_adjacent_fill_runs, merge_adjacent_drain_runs and merge_adjacent_evap_runs, without their printing
+# and without modifying the runs passed in.  run(i) and to_queue() build full FillRun, DrainRun and EvapRun
+# objects from rows, not views, for the existing printing and simulation code.
+#
+# Nothing calls the table yet.  It is an opt-in side structure for accounting over many years of runs,
+# PoolQueue.build_pool_runs keeps merging its queues with the list methods, which print every merge step as
+# part of its output.  tests/bench_run_table.py times the from_runs, merge_adjacent, to_queue round trip
+# against the queue merge, about 1.4 against 1.8 ms at 60 drain runs and 1.4x faster at 20,000.  Most of a
+# table merge is spent building the tables and runs, not merging.
+
+FILL = 0
+DRAIN = 1
+EVAP = 2
+
+kind_classes = {FILL: FillRun, DRAIN: DrainRun, EVAP: EvapRun}
+
+
+class Ragged(object):
+    """ Variable length (value, label id) lists per row, row i is values[offsets[i]:offsets[i+1]] """
+    def __init__(self, values:np.ndarray, labels:np.ndarray, offsets:np.ndarray):
+        self.values:np.ndarray = values
+        self.labels:np.ndarray = labels
+        self.offsets:np.ndarray = offsets
+
+    @staticmethod
+    def empty(rows:int):
+        return Ragged(np.zeros(0, np.float64), np.zeros(0, np.int32), np.zeros(rows + 1, np.int64))
+
+    @staticmethod
+    def from_lists(value_lists:list[list[float]], label_lists:list[list[int]]):
+        lengths = np.fromiter((len(values) for values in value_lists), dtype=np.int64, count=len(value_lists))
+        offsets = np.zeros(len(value_lists) + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.fromiter((v for values in value_lists for v in values), dtype=np.float64, count=int(offsets[-1]))
+        labels = np.fromiter((l for labels in label_lists for l in labels), dtype=np.int32, count=int(offsets[-1]))
+        return Ragged(values, labels, offsets)
+
+    def row(self, i:int)->tuple[np.ndarray, np.ndarray]:
+        return self.values[self.offsets[i]:self.offsets[i+1]], self.labels[self.offsets[i]:self.offsets[i+1]]
+
+    def gather(self, starts:np.ndarray, stops:np.ndarray):
+        """ Output row j is source rows starts[j]..stops[j]-1 concatenated """
+        first = self.offsets[starts]
+        lengths = self.offsets[stops] - first
+        offsets = np.zeros(len(starts) + 1, np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        index = np.repeat(first - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return Ragged(self.values[index], self.labels[index], offsets)
+
+    def take(self, rows:np.ndarray):
+        return self.gather(rows, rows + 1)
+
+    def relabel(self, mapping:np.ndarray):
+        return Ragged(self.values, mapping[self.labels] if len(mapping) else self.labels, self.offsets)
+
+    @staticmethod
+    def concat(parts:list):
+        offsets = [np.zeros(1, np.int64)]
+        base = 0
+        for part in parts:
+            offsets.append(part.offsets[1:] + base)
+            base += part.offsets[-1]
+        return Ragged(np.concatenate([part.values for part in parts]),
+                      np.concatenate([part.labels for part in parts]).astype(np.int32),
+                      np.concatenate(offsets))
+
+
+class Interned(object):
+    """ Value to small integer id, ids in order of first appearance """
+    def __init__(self, values:list|None=None, by_identity:bool=False):
+        self.values:list = []
+        self.ids:dict = {}
+        self.by_identity:bool = by_identity
+        for value in values or []:
+            self.id(value)
+
+    def id(self, value)->int:
+        key = id(value) if self.by_identity else value
+        found = self.ids.get(key)
+        if found is None:
+            found = len(self.values)
+            self.ids[key] = found
+            self.values.append(value)
+        return found
+
+    def remap(self, values:list)->np.ndarray:
+        return np.array([self.id(value) for value in values], dtype=np.int32)
+
+
+class RunTable(object):
+    columns = ('variable', 'kind', 'run_type', 'start', 'end', 'complete', 'remaining', 'target',
+               'paper_start_cfs', 'paper_end_cfs', 'in_progress', 'transfer_to', 'year')
+    ragged_columns = ('paper', 'date_values', 'overdrafts')
+
+    def __init__(self, variable_names:list[str], labels:list[str], dates_list:list, **columns):
+        self.variable_names:list[str] = variable_names
+        self.labels:list[str] = labels
+        self.dates_list:list = dates_list
+        self.variable:np.ndarray = columns['variable']
+        self.kind:np.ndarray = columns['kind']
+        self.run_type:np.ndarray = columns['run_type']
+        self.start:np.ndarray = columns['start']
+        self.end:np.ndarray = columns['end']
+        self.complete:np.ndarray = columns['complete']
+        self.remaining:np.ndarray = columns['remaining']
+        self.target:np.ndarray = columns['target']
+        self.paper_start_cfs:np.ndarray = columns['paper_start_cfs']
+        self.paper_end_cfs:np.ndarray = columns['paper_end_cfs']
+        self.in_progress:np.ndarray = columns['in_progress']
+        self.transfer_to:np.ndarray = columns['transfer_to']
+        self.year:np.ndarray = columns['year']
+        self.paper:Ragged = columns['paper']
+        self.date_values:Ragged = columns['date_values']
+        self.overdrafts:Ragged = columns['overdrafts']
+
+    def __len__(self)->int:
+        return len(self.start)
+
+    def column_dict(self)->dict:
+        return {name: getattr(self, name) for name in RunTable.columns + RunTable.ragged_columns}
+
+    def with_columns(self, **columns):
+        return RunTable(self.variable_names, self.labels, self.dates_list, **columns)
+
+    @staticmethod
+    def from_runs(runs:list[PoolRun]):
+        variable_names = Interned()
+        labels = Interned()
+        dates_list = Interned(by_identity=True)
+
+        n = len(runs)
+        variable = np.empty(n, np.int32)
+        kind = np.empty(n, np.int8)
+        run_type = np.empty(n, np.int8)
+        transfer_to = np.full(n, -1, np.int32)
+        year = np.empty(n, np.int32)
+        paper_values, paper_labels = [], []
+        date_values, date_value_labels = [], []
+        overdrafts, overdraft_labels = [], []
+        for i, run in enumerate(runs):
+            variable[i] = variable_names.id(run.variable_name)
+            year[i] = dates_list.id(run.dates)
+            if isinstance(run, FillRun):
+                kind[i] = FILL
+                run_type[i] = run.fill_type.value
+                paper_values.append(run.paper_fills)
+                paper_labels.append([labels.id(date) for date in run.paper_fill_dates])
+                date_values.append([date_value.value for date_value in run.date_values])
+                date_value_labels.append([labels.id(date_value.start_date) for date_value in run.date_values])
+                overdrafts.append([])
+                overdraft_labels.append([])
+            elif isinstance(run, DrainRun):
+                kind[i] = DRAIN
+                run_type[i] = run.drain_type.value
+                if run.transfer_to:
+                    transfer_to[i] = variable_names.id(run.transfer_to)
+                paper_values.append(run.paper_drains)
+                paper_labels.append([labels.id(date) for date in run.paper_drain_dates])
+                date_values.append([])
+                date_value_labels.append([])
+                overdrafts.append([overdraft.value for overdraft in run.overdrafts])
+                overdraft_labels.append([labels.id(overdraft.start_date) for overdraft in run.overdrafts])
+            else:
+                kind[i] = EVAP
+                run_type[i] = run.drain_type.value
+                for values in (paper_values, paper_labels, date_values, date_value_labels, overdrafts, overdraft_labels):
+                    values.append([])
+
+        return RunTable(variable_names.values, labels.values, dates_list.values,
+                        variable=variable, kind=kind, run_type=run_type,
+                        start=np.fromiter((run.start_day for run in runs), np.int32, n),
+                        end=np.fromiter((run.end_day for run in runs), np.int32, n),
+                        complete=np.fromiter((run.complete_day for run in runs), np.int32, n),
+                        remaining=np.fromiter((run.complete_remaining_cfs for run in runs), np.float64, n),
+                        target=np.fromiter((getattr(run, 'target', 0.0) for run in runs), np.float64, n),
+                        paper_start_cfs=np.fromiter((run.paper_start_cfs for run in runs), np.float64, n),
+                        paper_end_cfs=np.fromiter((run.paper_end_cfs for run in runs), np.float64, n),
+                        in_progress=np.fromiter((run.still_in_progress for run in runs), np.bool_, n),
+                        transfer_to=transfer_to, year=year,
+                        paper=Ragged.from_lists(paper_values, paper_labels),
+                        date_values=Ragged.from_lists(date_values, date_value_labels),
+                        overdrafts=Ragged.from_lists(overdrafts, overdraft_labels))
+
+    def run(self, i:int)->PoolRun:
+        """ Build the FillRun, DrainRun or EvapRun for row i """
+        kind = int(self.kind[i])
+        variable_name = self.variable_names[self.variable[i]]
+        dates = self.dates_list[self.year[i]]
+        start_day = int(self.start[i])
+        paper_values, paper_labels = self.paper.row(i)
+        if kind == FILL:
+            run = FillRun(variable_name, FillType(int(self.run_type[i])), start_day, dates)
+            run.target = float(self.target[i])
+            run.paper_fills = paper_values.tolist()
+            run.paper_fill_dates = [self.labels[label] for label in paper_labels]
+            values, labels = self.date_values.row(i)
+            run.date_values = [DateValue(self.labels[label], value) for value, label in zip(values.tolist(), labels)]
+        elif kind == DRAIN:
+            run = DrainRun(variable_name, DrainType(int(self.run_type[i])), start_day, dates)
+            run.paper_drains = paper_values.tolist()
+            run.paper_drain_dates = [self.labels[label] for label in paper_labels]
+            if self.transfer_to[i] >= 0:
+                run.transfer_to = self.variable_names[self.transfer_to[i]]
+            values, labels = self.overdrafts.row(i)
+            run.overdrafts = [DateValue(self.labels[label], value) for value, label in zip(values.tolist(), labels)]
+        else:
+            run = EvapRun(variable_name, start_day, dates)
+        run.end_day = int(self.end[i])
+        run.complete_day = int(self.complete[i])
+        run.complete_remaining_cfs = float(self.remaining[i])
+        run.paper_start_cfs = float(self.paper_start_cfs[i])
+        run.paper_end_cfs = float(self.paper_end_cfs[i])
+        run.still_in_progress = bool(self.in_progress[i])
+        return run
+
+    def to_queue(self)->PoolQueue:
+        return PoolQueue([self.run(i) for i in range(len(self))])
+
+    def take(self, rows)->'RunTable':
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {name: getattr(self, name)[rows] for name in RunTable.columns}
+        for name in RunTable.ragged_columns:
+            columns[name] = getattr(self, name).take(rows)
+        return self.with_columns(**columns)
+
+    def select(self, mask:np.ndarray)->'RunTable':
+        return self.take(np.flatnonzero(mask))
+
+    def variable_id(self, variable_name:str)->int:
+        try:
+            return self.variable_names.index(variable_name)
+        except ValueError:
+            return -1
+
+    def for_variable(self, variable_name:str)->'RunTable':
+        return self.select(self.variable == self.variable_id(variable_name))
+
+    def of_kind(self, kind:int)->'RunTable':
+        return self.select(self.kind == kind)
+
+    def on_day(self, day:int)->'RunTable':
+        return self.select((self.start <= day) & (day < self.end))
+
+    def completed_on(self, day:int)->'RunTable':
+        return self.select((self.complete == day) & (self.kind != EVAP))
+
+    def num_days(self)->np.ndarray:
+        return np.where(self.end != 0, self.end - self.start, 1)
+
+    @staticmethod
+    def concat(tables:list['RunTable'])->'RunTable':
+        """ Rows of all tables in order, variable names, labels and dates lists re-interned """
+        variable_names = Interned()
+        labels = Interned()
+        dates_list = Interned(by_identity=True)
+        columns = {name: [] for name in RunTable.columns + RunTable.ragged_columns}
+        for table in tables:
+            variable_map = variable_names.remap(table.variable_names)
+            label_map = labels.remap(table.labels)
+            dates_map = dates_list.remap(table.dates_list)
+            for name in RunTable.columns:
+                columns[name].append(getattr(table, name))
+            columns['variable'][-1] = variable_map[table.variable] if len(table) else table.variable
+            columns['transfer_to'][-1] = np.where(table.transfer_to >= 0,
+                                                  variable_map[np.maximum(table.transfer_to, 0)] if len(variable_map) else -1,
+                                                  -1).astype(np.int32)
+            columns['year'][-1] = dates_map[table.year] if len(table) else table.year
+            for name in RunTable.ragged_columns:
+                columns[name].append(getattr(table, name).relabel(label_map))
+        for name in RunTable.columns:
+            columns[name] = np.concatenate(columns[name])
+        for name in RunTable.ragged_columns:
+            columns[name] = Ragged.concat(columns[name])
+        return RunTable(variable_names.values, labels.values, dates_list.values, **columns)
+
+    def merge_adjacent(self)->'RunTable':
+        """
+        Merge runs that follow one another for the same variable, the rules of PoolQueue's
+        merge_adjacent_fill_runs, merge_adjacent_drain_runs and merge_adjacent_evap_runs applied to the
+        fill, drain and evap rows.  A run only merges with the row before it, like the queue methods.
+        """
+        n = len(self)
+        if n == 0:
+            return self
+        index = np.arange(n)
+        run_type = self.run_type
+        start = self.start
+        end = self.end
+
+        adjacent = np.zeros(n, dtype=bool)
+        adjacent[1:] = (self.variable[1:] == self.variable[:-1]) & (end[:-1] == start[1:]) \
+                       & (self.kind[1:] == self.kind[:-1]) & (self.year[1:] == self.year[:-1])
+        previous_type = np.empty_like(run_type)
+        previous_type[0] = -1
+        previous_type[1:] = run_type[:-1]
+        previous_end = np.zeros(n, dtype=end.dtype)
+        previous_end[1:] = end[:-1]
+
+        # Fills: a fill run absorbs any following fill or paper fill, a paper fill only paper fills.  A one
+        # day paper fill followed by a fill becomes the fill, started on the paper fill's day.
+        is_none = run_type == FillType.NONE.value
+        is_fill = run_type == FillType.FILL.value
+        fill_segment = ~adjacent
+        fill_segment[1:] |= is_none[1:] != is_none[:-1]
+        segment_start = np.maximum.accumulate(np.where(fill_segment, index, 0))
+        fill_counts = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(is_fill, out=fill_counts[1:])
+        first_fill = ~fill_segment & is_fill & (fill_counts[index] == fill_counts[segment_start])
+        prefix_days = np.where(previous_end != 0, previous_end - start[segment_start], 1)
+        fill_absorbs_paper = first_fill & (prefix_days == 1)
+        fill_break = fill_segment | (first_fill & ~fill_absorbs_paper)
+
+        # Drains: runs of the same drain type merge.  A one day paper drain followed by a drain becomes
+        # the drain started a day earlier.
+        drain_segment = ~adjacent | (run_type != previous_type)
+        group_start = np.maximum.accumulate(np.where(drain_segment, index, 0))
+        previous_group_start = np.zeros(n, dtype=np.int64)
+        previous_group_start[1:] = group_start[:-1]
+        previous_days = np.where(previous_end != 0, previous_end - start[previous_group_start], 1)
+        drain_absorbs_paper = adjacent & (previous_type == DrainType.PAPER_DRAIN.value) \
+                              & (run_type == DrainType.DRAIN.value) & (previous_days == 1)
+        drain_break = drain_segment & ~drain_absorbs_paper
+
+        is_fill_kind = self.kind == FILL
+        is_drain_kind = self.kind == DRAIN
+        breaks = np.where(is_fill_kind, fill_break, np.where(is_drain_kind, drain_break, ~adjacent))
+        breaks[0] = True
+        fill_absorbs_paper &= is_fill_kind
+        drain_absorbs_paper &= is_drain_kind
+
+        first = np.flatnonzero(breaks)
+        group = np.cumsum(breaks) - 1
+        last = np.empty_like(first)
+        last[:-1] = first[1:] - 1
+        last[-1] = n - 1
+        head = first.copy()
+        absorbs = np.flatnonzero(fill_absorbs_paper | drain_absorbs_paper)
+        head[group[absorbs]] = absorbs
+
+        merged_start = start[head].copy()
+        paper_start_cfs = self.paper_start_cfs[head].copy()
+        fill_groups = group[np.flatnonzero(fill_absorbs_paper)]
+        if len(fill_groups):
+            paper_rows = first[fill_groups]
+            merged_start[fill_groups] = start[paper_rows]
+            has_paper = self.paper.offsets[paper_rows + 1] > self.paper.offsets[paper_rows]
+            first_paper = self.paper.values[np.minimum(self.paper.offsets[paper_rows], max(len(self.paper.values) - 1, 0))] \
+                if len(self.paper.values) else np.zeros(len(paper_rows))
+            paper_start_cfs[fill_groups] = np.where(has_paper, first_paper, 0.0)
+        drain_groups = group[np.flatnonzero(drain_absorbs_paper)]
+        merged_start[drain_groups] = start[head[drain_groups]] - 1
+
+        columns = {name: getattr(self, name)[head] for name in RunTable.columns}
+        columns['start'] = merged_start
+        columns['end'] = end[last]
+        columns['paper_start_cfs'] = paper_start_cfs
+        # Merged drains carry the paper drains of every run merged, fills and evaps those of the first
+        paper_stop = np.where(self.kind[head] == DRAIN, last, head) + 1
+        columns['paper'] = self.paper.gather(head, paper_stop)
+        columns['date_values'] = self.date_values.take(head)
+        columns['overdrafts'] = self.overdrafts.take(head)
+        return self.with_columns(**columns)
+
+
+def merge_queue(pool_queue:PoolQueue)->PoolQueue:
+    """ The queue's merge_adjacent_*_runs result for a fill, drain or evap queue, from a run table """
+    return RunTable.from_runs(pool_queue).merge_adjacent().to_queue()
+
@@ -84,54 +84,3 @@ def export_calc_to_png(ods_path, output_dir):
     print("Exported PNG(s) to", output_dir)
 
 import pandas as pd
-from scipy.interpolate import interp1d
-import warnings
-
-def get_lake_powell_capacity(
-    elevation_ft: float,
-    csv_path: str = "data/Colorado_River/Lake_Powell_2018_ElevAreaCap_interp.csv",  # <-- update this
-    elev_col: str = "elevation",      # adjust if column name differs (check your CSV)
-    cap_col: str = "capacity_af",     # adjust if needed (often "storage" or "capacity")
-    navd88: bool = True               # reminder: elevations must be NAVD 88
-) -> float:
-    """
-    Returns active storage capacity in acre-feet for a given elevation (ft NAVD 88)
-    using the USGS 2018 Lake Powell elevation-area-capacity table (interpolated preferred).
-
-    Example usage:
-        capacity = get_lake_powell_capacity(3650.5)
-        print(f'At 3650.5 ft: {capacity:,.0f} af')
-    """
-    if not navd88:
-        warnings.warn("Elevations should be in NAVD 88 datum per 2018 USGS data.")
-
-    # Load the CSV (skip any header rows if needed; inspect your file)
-    df = pd.read_csv(csv_path)
-
-    # Assume columns are something like: elevation_ft, area_acres, capacity_af
-    # Rename for consistency if needed
-    df = df.rename(columns={
-        elev_col: 'elevation_ft',
-        cap_col: 'capacity_af'
-    })
-
-    # Sort by elevation (should already be sorted, but ensure)
-    df = df.sort_values('elevation_ft').dropna(subset=['elevation_ft', 'capacity_af'])
-
-    if elevation_ft < df['elevation_ft'].min() or elevation_ft > df['elevation_ft'].max():
-        raise ValueError(
-            f"Elevation {elevation_ft} ft is outside table range "
-            f"({df['elevation_ft'].min():.2f} to {df['elevation_ft'].max():.2f} ft)"
-        )
-
-    # Create linear interpolator (capacity as function of elevation)
-    interpolator = interp1d(
-        df['elevation_ft'],
-        df['capacity_af'],
-        kind='linear',
-        fill_value="extrapolate"  # but we already checked bounds
-    )
-
-    capacity = interpolator(elevation_ft)
-
-    return float(capacity)
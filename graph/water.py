@@ -27,6 +27,8 @@ import matplotlib.ticker as ticker
 import numpy as np
 from matplotlib.dates import YearLocator, MonthLocator
 import matplotlib.dates as mdates
+from rw import aggregate
+from rw import rolling
 
 # gridspec to resize subplots
 # https://www.geeksforgeeks.org/how-to-create-different-subplot-sizes-in-matplotlib/
@@ -351,25 +353,12 @@ class WaterGraph(object):
         self.date_and_wait()
 
     def running_average(self, annual_af, window, sub_plot=0, label=None, color='goldenrod'):
-        running_average = np.zeros(len(annual_af), [('dt', 'i'), ('val', 'f')])
         if len(self.fig.axes) > 1:
             ax = self.ax[sub_plot]
         else:
             ax = self.ax
 
-        total = 0.0
-        n = 0
-        for x in annual_af:
-            running_average[n]['dt'] = x['dt']
-            if n >= window:
-                total -= annual_af[n - window]['val']
-                total += x['val']
-                running_average[n]['val'] = total / window
-            else:
-                total += x['val']
-                running_average[n]['val'] = total / (n+1)
-            n += 1
-
+        running_average = rolling.running_average(annual_af, window)
         x = running_average['dt']
         y = running_average['val']
         if label:
@@ -397,73 +386,19 @@ class WaterGraph(object):
 
     @staticmethod
     def daily_to_calendar_year(a, debug=False):
-        dt = datetime.date(1, 1, 1)
-        total = 0
-        result = []
-        for o in a:
-            obj = o['dt'].astype(object)
-            y = o['val']
-            if np.isnan(y):
-                if debug:
-                    print('daily_to_calendar_year isnan', o['dt'])
-                y = 0
-            if dt.year != obj.year:
-                if total > 0:
-                    result.append([dt, total])
-                    total = 0
-                dt = datetime.date(obj.year, 12, 31)
-            total += y
-        if total > 0:
-            result.append([dt, total])
-
-        a = np.zeros(len(result), [('dt', 'i'), ('val', 'f')])
-        year = 0
-        for l in result:
-            # a[day][0] = np.datetime64(l[0])
-            a[year][0] = l[0].year
-            a[year][1] = l[1]
-            year += 1
-
-        return a
+        if debug and np.isnan(a['val']).any():
+            print('daily_to_calendar_year isnan', a['dt'][np.isnan(a['val'])])
+        years, totals = aggregate.daily_to_calendar_year(a['dt'], a['val'])
+        positive = totals > 0
+        return aggregate.to_annual(years[positive], totals[positive])
 
     @staticmethod
     def daily_to_water_year(a, water_year_month=1):
-        dt = datetime.date(1, water_year_month, 1)
-        total = 0
-        result = []
-        for o in a:
-            obj = o['dt'].astype(object)
-            if obj.month == water_year_month and obj.day == 1:
-                if total > 0:
-                    result.append([dt, total])
-                    total = 0
-                if water_year_month == 1:
-                    dt = datetime.date(obj.year, water_year_month, 1)
-                else:
-                    dt = datetime.date(obj.year+1, water_year_month, 1)
-            elif dt.year == 1:
-                if obj.month < water_year_month or water_year_month == 1:
-                    dt = datetime.date(obj.year, water_year_month, 1)
-                else:
-                    dt = datetime.date(obj.year+1, water_year_month, 1)
-
-            if not np.isnan(o['val']):
-                total += o['val']
-            elif debug:
-                print('daily_to_water_year not a number:', o)
-
-        if total > 0:
-            result.append([dt, total])
-
-        a = np.zeros(len(result), [('dt', 'i'), ('val', 'f')])
-        day = 0
-        for l in result:
-            # a[day][0] = np.datetime64(l[0])
-            a[day][0] = l[0].year
-            a[day][1] = l[1]
-            day += 1
-
-        return a
+        years, totals = aggregate.daily_to_water_year(a['dt'], a['val'], water_year_month)
+        if debug and np.isnan(a['val']).any():
+            print('daily_to_water_year not a number:', a[np.isnan(a['val'])])
+        positive = totals > 0
+        return aggregate.to_annual(years[positive], totals[positive])
 
     @staticmethod
     def convert_cfs_to_af_per_day(cfs):
@@ -24,6 +24,7 @@ import numpy as np
 import signal
 import sys
 from rw.util import add_annual, add_annuals, subtract_annual, reshape_annual_range, flow_for_year
+from rw.annual import AnnualSeries
 from graph.water import WaterGraph
 import usgs
 from usgs import lc
@@ -671,13 +672,12 @@ def lake_mead_side_inflows(show_graph=False):
     paria_annual_af = usgs.az.paria_lees_ferry(graph=show_graph).annual_af(water_year_month=water_year_month,
                                                                            start_year=start_year, end_year=end_year)
 
-    glen_canyon_plus_paria_af = add_annual(glen_canyon_annual_release_af, paria_annual_af)
-    glen_canyon_seep_af = subtract_annual(lees_ferry_af, glen_canyon_plus_paria_af)
+    glen_canyon_seep = AnnualSeries.from_annual(lees_ferry_af).subtract(glen_canyon_annual_release_af, paria_annual_af)
+    glen_canyon_seep_af = glen_canyon_seep.to_annual()
 
     # Stacked graph of the inflows
     # Compare to USBR side flows from 24 month
-    total = add_annuals([little_colorado_af, virgin_af, muddy_af])
-    total = add_annual(total, glen_canyon_seep_af)
+    total = AnnualSeries.sum([little_colorado_af, virgin_af, muddy_af, glen_canyon_seep]).to_annual()
     if show_graph:
         graph = WaterGraph(nrows=2)
         graph.bars(glen_canyon_seep_af, sub_plot=0, title='Glen Canyon + Paria - Lees Ferry Gage',
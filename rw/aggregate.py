@@ -0,0 +1,133 @@
+"""
+Copyright (c) 2022 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+
+# Daily and monthly roll ups to months, water years and calendar years.  Bucket ids come from
+# datetime64 arithmetic and each run of equal ids is reduced with np.add.reduceat, so dates must be
+# in ascending order.  values may be 1-D or 2-D (series x day) sharing one date axis, every series
+# is aggregated in the same call.
+#
+# nan_policy:
+#   'skip'       NaN days add nothing
+#   'propagate'  a NaN day makes its bucket NaN
+
+af_per_cfs_day = 1.983459
+
+
+def month_ids(dates) -> np.ndarray:
+    # Months since 1970-01
+    return np.asarray(dates).astype('datetime64[M]').astype(np.int64)
+
+
+def water_year_ids(dates, water_year_month:int=1) -> np.ndarray:
+    # Water year of each date, named for the calendar year it ends in
+    months = month_ids(dates) - (water_year_month - 1)
+    years = np.floor_divide(months, 12) + 1970
+    if water_year_month != 1:
+        years += 1
+    return years
+
+
+def reduce_runs(ids, values, nan_policy:str='skip', multiplier:float=1.0):
+    """
+    Sum values over each run of equal ids along the last axis.
+    Returns (run ids, run start indices, sums), sums has a trailing axis with one entry per run.
+    """
+    ids = np.asarray(ids)
+    values = np.asarray(values, dtype=np.float64)
+    if not len(ids):
+        return ids, np.zeros(0, dtype=np.int64), np.zeros(values.shape[:-1] + (0,))
+    starts = np.flatnonzero(np.concatenate(([True], ids[1:] != ids[:-1])))
+    if nan_policy == 'skip':
+        values = np.nan_to_num(values, nan=0.0)
+    elif nan_policy != 'propagate':
+        raise ValueError(f'aggregate unknown nan_policy: {nan_policy}')
+    sums = np.add.reduceat(values, starts, axis=-1)
+    if multiplier != 1.0:
+        sums *= multiplier
+    return ids[starts], starts, sums
+
+
+def daily_to_monthly(dates, values, multiplier:float=1.0, nan_policy:str='skip'):
+    # (first day of each month, sums), e.g. multiplier=af_per_cfs_day for daily cfs to monthly af
+    months, starts, sums = reduce_runs(month_ids(dates), values, nan_policy=nan_policy, multiplier=multiplier)
+    return months.astype('datetime64[M]'), sums
+
+
+def daily_to_water_year(dates, values, water_year_month:int=1, multiplier:float=1.0, nan_policy:str='skip'):
+    # (water years, sums) for every water year with at least one day
+    years, starts, sums = reduce_runs(water_year_ids(dates, water_year_month), values, nan_policy=nan_policy,
+                                      multiplier=multiplier)
+    return years, sums
+
+
+def daily_to_calendar_year(dates, values, multiplier:float=1.0, nan_policy:str='skip'):
+    return daily_to_water_year(dates, values, water_year_month=1, multiplier=multiplier, nan_policy=nan_policy)
+
+
+def monthly_to_water_year(dates, values, water_year_month:int=1, nan_policy:str='propagate'):
+    # Monthly values to water years, same bucketing as daily_to_water_year
+    return daily_to_water_year(dates, values, water_year_month=water_year_month, nan_policy=nan_policy)
+
+
+def daily_to_monthly_af(a, start_year=0, end_year=0, multiplier=1.0) -> np.ndarray:
+    # Monthly totals of a (dt, val) daily array dated by the last day of each month with data, rounded to
+    # whole af.  Months outside start_year..end_year are dropped unless both are 0
+    months, totals = daily_to_monthly(a['dt'], a['val'], multiplier=multiplier)
+    totals = np.round(totals)
+    last_days = np.concatenate((np.flatnonzero(np.diff(month_ids(a['dt']))), [len(a) - 1]))[:len(months)]
+    keep = np.ones(len(months), dtype=bool)
+    if len(months):
+        # The last month is only written when it has a positive total
+        keep[-1] = totals[-1] > 0
+    if start_year != 0 or end_year != 0:
+        years = months.astype('datetime64[Y]').astype(int) + 1970
+        keep &= (start_year <= years) & (years <= end_year)
+    result = np.empty(np.count_nonzero(keep), [('dt', 'datetime64[s]'), ('val', 'f')])
+    result['dt'] = a['dt'][last_days[keep]]
+    result['val'] = totals[keep]
+    return result
+
+
+def water_year_range(dates, values, start_year:int, end_year:int, water_year_month:int=1, multiplier:float=1.0,
+                     nan_policy:str='skip'):
+    # Sums for every water year start_year..end_year in order, zero for years without days
+    years = water_year_ids(dates, water_year_month)
+    values = np.asarray(values, dtype=np.float64)
+    in_range = (years >= start_year) & (years <= end_year)
+    if nan_policy == 'skip':
+        values = np.nan_to_num(values, nan=0.0)
+    num_years = end_year - start_year + 1
+    if values.ndim == 1:
+        result = np.bincount(years[in_range] - start_year, weights=values[in_range], minlength=num_years)
+    else:
+        result = np.zeros(values.shape[:-1] + (num_years,))
+        np.add.at(result, (..., years[in_range] - start_year), values[..., in_range])
+    return result * multiplier
+
+
+def to_annual(years, sums) -> np.ndarray:
+    # The (year, value) array layout the annual helpers in rw.util use
+    a = np.zeros(len(years), [('dt', 'i'), ('val', 'f')])
+    a['dt'] = years
+    a['val'] = sums
+    return a
@@ -0,0 +1,225 @@
+"""
+Copyright (c) 2022 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+
+# Annual series as a start year, a float64 value array and a validity mask.  Years are offsets from
+# start_year, so aligning two series is slicing, not a search, and a year lookup is one index.  Years
+# missing from a series count as zero in arithmetic, the same as reshape_annual_range zero filling
+# them, a result year is valid when any operand has it.
+#
+# Legacy (year, value) arrays, [('dt', 'i'), ('val', 'f')], convert both ways with from_annual and
+# to_annual.  A chain of operations can stay in one AnnualSeries and update it in place, converting
+# once at the end.  A legacy array with gaps in its years converts back with the same years, not
+# filled out to every year in between.
+
+annual_dtype = [('dt', 'i'), ('val', 'f')]
+
+
+class AnnualSeries(object):
+    def __init__(self, start_year, values, valid=None):
+        self.start_year = int(start_year)
+        self.values = np.asarray(values, dtype=np.float64)
+        if valid is None:
+            valid = np.ones(len(self.values), dtype=bool)
+        self.valid = np.asarray(valid, dtype=bool)
+        # Years of the legacy array this series was converted from when they have gaps, to_annual gives them back
+        self.legacy_years = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return 'AnnualSeries(' + str(self.start_year) + '-' + str(self.end_year) + ')'
+
+    @property
+    def end_year(self):
+        return self.start_year + len(self.values) - 1
+
+    @property
+    def years(self):
+        return np.arange(self.start_year, self.start_year + len(self.values), dtype=np.int32)
+
+    @staticmethod
+    def zeros(start_year, end_year):
+        n = max(end_year - start_year + 1, 0)
+        return AnnualSeries(start_year, np.zeros(n))
+
+    @staticmethod
+    def constant(start_year, end_year, value):
+        n = max(end_year - start_year + 1, 0)
+        return AnnualSeries(start_year, np.full(n, value, dtype=np.float64))
+
+    @staticmethod
+    def from_annual(a, start_year=0, end_year=0):
+        """
+        Legacy (year, value) array to a series covering start_year..end_year, or the first to last year
+        of a when both are 0.  Years outside the range are dropped, years a doesn't have are invalid.
+        """
+        if isinstance(a, AnnualSeries):
+            if start_year and end_year:
+                return a.aligned(start_year, end_year)
+            return a.copy()
+        legacy_years = None
+        if not start_year and not end_year:
+            if len(a) == 0:
+                return AnnualSeries(0, np.zeros(0))
+            start_year = int(a['dt'][0])
+            end_year = int(a['dt'][-1])
+            if end_year - start_year + 1 == len(a):
+                # One entry per year in order, the usual case
+                return AnnualSeries(start_year, a['val'])
+            legacy_years = np.array(a['dt'], dtype=np.int32)
+        result = AnnualSeries(start_year, np.zeros(max(end_year - start_year + 1, 0)),
+                              np.zeros(max(end_year - start_year + 1, 0), dtype=bool))
+        if len(a):
+            offsets = np.asarray(a['dt'], dtype=np.int64) - start_year
+            inside = (offsets >= 0) & (offsets < len(result))
+            result.values[offsets[inside]] = a['val'][inside]
+            result.valid[offsets[inside]] = True
+        result.legacy_years = legacy_years
+        return result
+
+    def to_annual(self, start_year=0, end_year=0):
+        # Legacy (year, value) array, zero for invalid years
+        if start_year and end_year and (start_year != self.start_year or end_year != self.end_year):
+            return self.aligned(start_year, end_year).to_annual()
+        if self.legacy_years is not None and not (start_year and end_year):
+            a = np.zeros(len(self.legacy_years), annual_dtype)
+            a['dt'] = self.legacy_years
+            offsets = self.legacy_years.astype(np.int64) - self.start_year
+            inside = (offsets >= 0) & (offsets < len(self.values))
+            a['val'][inside] = self.valid_values()[offsets[inside]]
+            return a
+        a = np.zeros(len(self.values), annual_dtype)
+        a['dt'] = self.years
+        a['val'] = self.valid_values()
+        return a
+
+    def copy(self):
+        result = AnnualSeries(self.start_year, self.values.copy(), self.valid.copy())
+        result.legacy_years = self.legacy_years
+        return result
+
+    def index(self, year):
+        # Offset of year, None when outside the series
+        offset = year - self.start_year
+        if 0 <= offset < len(self.values):
+            return offset
+        return None
+
+    def value(self, year, default=0):
+        offset = year - self.start_year
+        if 0 <= offset < len(self.values) and self.valid[offset]:
+            return self.values[offset]
+        return default
+
+    def overlap(self, other):
+        # (self slice, other slice) of the years both series cover
+        lo = max(self.start_year, other.start_year)
+        hi = min(self.end_year, other.end_year) + 1
+        if hi <= lo:
+            return slice(0, 0), slice(0, 0)
+        return (slice(lo - self.start_year, hi - self.start_year),
+                slice(lo - other.start_year, hi - other.start_year))
+
+    def aligned(self, start_year, end_year):
+        # New series over start_year..end_year, years outside this series are zero and invalid
+        n = max(end_year - start_year + 1, 0)
+        result = AnnualSeries(start_year, np.zeros(n), np.zeros(n, dtype=bool))
+        mine, theirs = result.overlap(self)
+        result.values[mine] = self.values[theirs]
+        result.valid[mine] = self.valid[theirs]
+        return result
+
+    def _operands(self, others):
+        for other in others:
+            if other is None:
+                continue
+            if not isinstance(other, AnnualSeries):
+                other = AnnualSeries.from_annual(other)
+            mine, theirs = self.overlap(other)
+            yield mine, theirs, other
+
+    def valid_values(self, part=slice(None)):
+        # Values with invalid years as zero
+        valid = self.valid[part]
+        if valid.all():
+            return self.values[part]
+        return np.where(valid, self.values[part], 0)
+
+    def add(self, *others):
+        # In place sum of any number of series or legacy arrays over this series' years
+        for mine, theirs, other in self._operands(others):
+            self.values[mine] += other.valid_values(theirs)
+            self.valid[mine] |= other.valid[theirs]
+        return self
+
+    def subtract(self, *others):
+        for mine, theirs, other in self._operands(others):
+            self.values[mine] -= other.valid_values(theirs)
+            self.valid[mine] |= other.valid[theirs]
+        return self
+
+    def subtract_vector(self, vector):
+        # In place subtraction of a plain per year vector the same length as this series.  On a length
+        # mismatch the series is zeroed, as subtract_vector_from_annual returned zeros
+        positions = slice(None) if self.legacy_years is None else self.legacy_years - self.start_year
+        if len(vector) != len(self.values[positions]):
+            print('AnnualSeries subtract_vector failed, length mismatch')
+            self.values[:] = 0
+            return self
+        self.values[positions] -= np.asarray(vector, dtype=np.float64)
+        return self
+
+    def multiply(self, *multipliers):
+        # In place product with scalars, or series where a missing year multiplies by zero
+        for multiplier in multipliers:
+            if np.isscalar(multiplier):
+                self.values *= multiplier
+                continue
+            for mine, theirs, other in self._operands([multiplier]):
+                product = np.zeros(len(self.values))
+                product[mine] = self.values[mine] * other.valid_values(theirs)
+                self.values = product
+        return self
+
+    def replace(self, other):
+        # Overwrite the years other has with its values
+        if not isinstance(other, AnnualSeries):
+            other = AnnualSeries.from_annual(other)
+        mine, theirs = self.overlap(other)
+        replace = other.valid[theirs]
+        self.values[mine][replace] = other.values[theirs][replace]
+        self.valid[mine] |= replace
+        return self
+
+    def is_zero(self):
+        return not np.any(self.values[self.valid] != 0)
+
+    @staticmethod
+    def sum(arrays, start_year=0, end_year=0):
+        """
+        Sum of any number of series or legacy arrays in one pass over start_year..end_year, or the
+        years of the first array when both are 0.
+        """
+        result = AnnualSeries.from_annual(arrays[0], start_year, end_year)
+        return result.add(*arrays[1:])
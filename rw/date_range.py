@@ -0,0 +1,92 @@
+"""
+Copyright (c) 2022 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+
+# Date range primitives for daily (dt, val) arrays sorted by date.  Ranges are found with
+# np.searchsorted on whole days, so a clip is two binary searches and returns a view into the array,
+# not a copy selected by a boolean mask over every row.
+
+
+def days(dates) -> np.ndarray:
+    # Whole days of datetime64 values of any unit, or of anything np.datetime64 accepts
+    return np.asarray(dates).astype('datetime64[D]')
+
+
+def range_slice(dates, start_date, end_date) -> slice:
+    # Rows of sorted dates whose day is within start_date..end_date inclusive
+    dates = np.asarray(dates)
+    # Search in the array's own unit, midnight of start_date up to midnight after end_date
+    start = np.datetime64(start_date, 'D').astype(dates.dtype)
+    end = (np.datetime64(end_date, 'D') + 1).astype(dates.dtype)
+    first = np.searchsorted(dates, start, side='left')
+    last = np.searchsorted(dates, end, side='left')
+    return slice(int(first), int(max(first, last)))
+
+
+def clip(a, start_date, end_date) -> np.ndarray:
+    # View of the rows of a between start_date and end_date inclusive, a must be sorted by date.  Writes
+    # through the view change a, copy it if it is kept or modified
+    return a[range_slice(a['dt'], start_date, end_date)]
+
+
+def day_indices(dates, targets) -> np.ndarray:
+    # First row of sorted dates on each target day, -1 where that day is missing
+    dates = days(dates)
+    targets = days(targets)
+    found = np.searchsorted(dates, targets, side='left')
+    found_in_range = np.minimum(found, max(len(dates) - 1, 0))
+    hit = (found < len(dates)) & (dates[found_in_range] == targets) if len(dates) else np.zeros(len(targets), bool)
+    return np.where(hit, found, -1)
+
+
+def water_year_first_days(start_year:int, end_year:int, water_year_month:int=1) -> np.ndarray:
+    # First day of water_year_month in each year start_year..end_year
+    months = (np.arange(start_year, end_year + 1) - 1970) * 12 + (water_year_month - 1)
+    return months.astype('datetime64[M]').astype('datetime64[D]')
+
+
+storage_delta_dtype = [('year', 'i'), ('begin_date', 'datetime64[D]'), ('end_date', 'datetime64[D]'),
+                       ('begin', 'f8'), ('end', 'f8'), ('delta', 'f8'),
+                       ('begin_missing', '?'), ('end_missing', '?')]
+
+
+def storage_deltas(a, start_year:int, end_year:int, water_year_month:int=1) -> np.ndarray:
+    """
+    Storage on the first and last boundary day of every year start_year..end_year and the change
+    between them, year y runs from the first of water_year_month in y to the first of that month in
+    y+1.  A boundary day missing from the daily storage array a is flagged in begin_missing or
+    end_missing and its storage and the delta are NaN.
+    """
+    boundaries = water_year_first_days(start_year, end_year + 1, water_year_month)
+    rows = day_indices(a['dt'], boundaries)
+    storage = np.where(rows >= 0, np.asarray(a['val'], dtype=np.float64)[np.maximum(rows, 0)] if len(a) else np.nan,
+                       np.nan)
+    result = np.zeros(end_year - start_year + 1, storage_delta_dtype)
+    result['year'] = np.arange(start_year, end_year + 1)
+    result['begin_date'] = boundaries[:-1]
+    result['end_date'] = boundaries[1:]
+    result['begin'] = storage[:-1]
+    result['end'] = storage[1:]
+    result['delta'] = storage[1:] - storage[:-1]
+    result['begin_missing'] = rows[:-1] < 0
+    result['end_missing'] = rows[1:] < 0
+    return result
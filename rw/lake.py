@@ -19,9 +19,8 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from datetime import datetime
-import numpy as np
 from rw.util import annual_zeroed_for_years
+from rw import date_range
 
 
 class Lake(object):
@@ -63,32 +62,17 @@ class Lake(object):
     def lake_by_name(name):
         return Lake.lakes[name]
 
-    @staticmethod
-    def ___convert_to_datetime(d):
-        return datetime.strptime(np.datetime_as_string(d, unit='s'), '%Y-%m-%dT%H:%M:%S')
-
     def storage_delta(self):
         delta = []
-        date_time_format = "%Y-%m-%d"
         daily_storage = self.storage
         if daily_storage is not None:
-            for year in range(Lake.year_begin, Lake.year_end+1):
-                storage_begin = None
-                storage_end = None
-                water_year_month_str = '-' + str(self.water_year_month) + '-'
-                date_begin = datetime.strptime(str(year) + water_year_month_str + '1', date_time_format).date()
-                date_end = datetime.strptime(str(year+1) + water_year_month_str + '1', date_time_format).date()
-                for l in daily_storage:
-                    date = self.___convert_to_datetime(l[0]).date()
-                    if date == date_begin:
-                        storage_begin = l[1]
-                    elif date == date_end:
-                        storage_end = l[1]
-                        break
-                if storage_begin and storage_end:
-                    delta.append(storage_end - storage_begin)
+            deltas = date_range.storage_deltas(daily_storage, Lake.year_begin, Lake.year_end, self.water_year_month)
+            for year in deltas:
+                if year['begin_missing'] or year['end_missing']:
+                    missing = [str(year[name + '_date']) for name in ('begin', 'end') if year[name + '_missing']]
+                    print(self.name, 'storage_delta failed', year['year'], 'no storage on', ', '.join(missing))
                 else:
-                    print(self.name, 'storage_delta failed')
+                    delta.append(float(year['delta']))
         else:
             # print(self.name + " storage delta not implemented")
             for year in range(Lake.year_begin, Lake.year_end+1):
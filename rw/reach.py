@@ -20,8 +20,9 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 from rw.util import af_as_str, number_as_str, percent_as_str, right_justified, left_justified, generate_year_header
-from rw.util import add_annual, subtract_annual, subtract_vector_from_annual, annual_as_str, vector_as_str
+from rw.util import subtract_vector_from_annual, annual_as_str, vector_as_str
 from rw.util import annual_is_zero, annual_zeroed_for_years, vector_is_zero, vector_zeroed_for_years
+from rw.annual import AnnualSeries
 from rw.state import state_by_abbreviation
 
 debug = True
@@ -105,11 +106,11 @@ class Reach(object):
         self.reach_inflow = self.upper_lake.release
         self.reach_inflow_note = self.upper_lake.release_note
         self.upper_lake_bypass = self.upper_lake.bypass
+        # Inflow and delta accumulate in place, converted back to annual arrays once at the end
+        reach_total_inflow = AnnualSeries.from_annual(self.reach_inflow)
         if self.upper_lake_bypass is not None:
             self.upper_lake_bypass_note = self.upper_lake.bypass_note
-            self.reach_total_inflow = add_annual(self.reach_inflow, self.upper_lake_bypass)
-        else:
-            self.reach_total_inflow = self.reach_inflow
+            reach_total_inflow.add(self.upper_lake_bypass)
 
         if self.lower_lake:
             self.loss_evaporation = self.lower_lake.evaporation
@@ -127,14 +128,15 @@ class Reach(object):
         if self._24_month_side_inflows is not None:
             self.reach_side_inflows = self._24_month_side_inflows
             self.reach_side_inflows_note = self.lower_lake.side_inflow_note
-            self.reach_total_inflow = add_annual(self.reach_total_inflow, self.reach_side_inflows)
+            reach_total_inflow.add(self.reach_side_inflows)
         elif self.lower_lake and self.lower_lake.inflow is not None:
             self.lower_lake_inflow = self.lower_lake.inflow
-            self.reach_side_inflows = subtract_annual(self.reach_total_inflow, self.lower_lake_inflow)
+            self.reach_side_inflows = reach_total_inflow.copy().subtract(self.lower_lake_inflow).to_annual()
             self.reach_side_inflows_note = 'Estimated from reach inflow and lower lake inflow'
-            self.reach_total_inflow = add_annual(self.reach_total_inflow, self.reach_side_inflows)
+            reach_total_inflow.add(self.reach_side_inflows)
         else:
             pass
+        self.reach_total_inflow = reach_total_inflow.to_annual()
 
         # Total user consumptive use
         #
@@ -147,13 +149,9 @@ class Reach(object):
             self.in_reach_cu_avg = int(sum(self.reach_cu) / len(self.reach_cu))
             self.reach_cu_note = self.name + ' Total User CU, USBR Annual Report'
 
-        self.inflow_outflow_delta = subtract_vector_from_annual(self.reach_total_inflow, self.reach_cu)
-        if self.lower_lake_release is not None:
-            self.inflow_outflow_delta = subtract_annual(self.inflow_outflow_delta, self.lower_lake_release)
-        if self.loss_evaporation is not None:
-            self.inflow_outflow_delta = subtract_annual(self.inflow_outflow_delta, self.loss_evaporation)
-        if self.lower_lake_bypass is not None:
-            self.inflow_outflow_delta = subtract_annual(self.inflow_outflow_delta, self.lower_lake_bypass)
+        inflow_outflow_delta = reach_total_inflow.subtract_vector(self.reach_cu)
+        inflow_outflow_delta.subtract(self.lower_lake_release, self.loss_evaporation, self.lower_lake_bypass)
+        self.inflow_outflow_delta = inflow_outflow_delta.to_annual()
 
         if debug:
             print('\n==', self.name + ',', self.upper_lake.name, 'to', self.lower_lake.name)
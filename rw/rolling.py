@@ -0,0 +1,149 @@
+"""
+Copyright (c) 2022 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+
+# Trailing window statistics for annual and daily series.  Sums and means for every window come from
+# cumulative sums of the values restarted every window length, so rounding does not build up along a
+# long series, and one cumulative sum of the valid (non NaN) flags, min, max and percentiles from
+# sorting a strided window view.  A window ending at index i covers i-window+1..i, near the start it holds
+# fewer values, and a result is NaN unless the window has at least min_periods valid values.
+#
+# Annual and daily arrays are placed on a dense year or day axis first, so a missing year or day is a
+# gap in the window rather than the window silently reaching further back.
+
+default_windows = (5, 10, 20, 30)
+
+
+def window_sums(values, starts, ends, block:int) -> np.ndarray:
+    """
+    Sums of values[starts:ends] for windows no longer than block.  The cumulative sum restarts at every
+    block boundary, a window lies in one block or straddles two, so each sum differences partial sums
+    of at most block values no matter how long the series is.
+    """
+    n = len(values)
+    padded = np.zeros(-(-n // block) * block)
+    padded[:n] = values
+    partial = np.cumsum(padded.reshape(-1, block), axis=1)
+    block_totals = partial[:, -1]
+    # partial_before[p] is the sum from the start of p's block up to, but not including, p
+    partial_before = np.concatenate(([0.0], partial.ravel()))[:n + 1]
+    partial_before[::block] = 0.0
+    start_blocks = starts // block
+    straddles = start_blocks != ends // block
+    sums = partial_before[ends] - partial_before[starts]
+    sums[straddles] += block_totals[start_blocks[straddles]]
+    return sums
+
+
+def rolling(values, windows=default_windows, stats=('mean',), percentiles=(10, 90), min_periods:int=1) -> dict:
+    """
+    Trailing window statistics of a 1-D float series with NaN for missing values.
+    stats: 'mean', 'sum', 'count', 'min', 'max' and 'percentile', the last adds one result per entry
+    in percentiles keyed 'p10', 'p90' etc.  Returns {(stat, window): array the length of values}.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    valid_counts = np.concatenate(([0], np.cumsum(valid)))
+    ends = np.arange(1, n + 1)
+
+    result = {}
+    for window in windows:
+        starts = np.maximum(ends - window, 0)
+        counts = valid_counts[ends] - valid_counts[starts]
+        enough = counts >= max(min_periods, 1)
+        if 'count' in stats:
+            result[('count', window)] = counts
+        if 'sum' in stats or 'mean' in stats:
+            sums = window_sums(filled, starts, ends, max(window, 1))
+            if 'sum' in stats:
+                result[('sum', window)] = np.where(enough, sums, np.nan)
+            if 'mean' in stats:
+                result[('mean', window)] = np.where(enough, sums / np.maximum(counts, 1), np.nan)
+        if 'min' in stats or 'max' in stats or 'percentile' in stats:
+            # Sorted windows have their NaNs last, the valid values are the first counts of each row
+            padded = np.concatenate((np.full(window - 1, np.nan), values))
+            if n:
+                ordered = np.sort(np.lib.stride_tricks.sliding_window_view(padded, window), axis=1)
+            else:
+                ordered = np.empty((0, window))
+            last = np.maximum(counts - 1, 0)
+            if 'min' in stats:
+                result[('min', window)] = np.where(enough, ordered[:, 0], np.nan)
+            if 'max' in stats:
+                result[('max', window)] = np.where(enough, ordered[np.arange(n), last], np.nan)
+            if 'percentile' in stats:
+                for percentile in percentiles:
+                    # Linear interpolation between ranks, as np.percentile does
+                    rank = last * (percentile / 100.0)
+                    below = np.floor(rank).astype(np.int64)
+                    above = np.minimum(below + 1, last)
+                    fraction = rank - below
+                    low = ordered[np.arange(n), below]
+                    band = low + (ordered[np.arange(n), above] - low) * fraction
+                    result[('p' + str(percentile), window)] = np.where(enough, band, np.nan)
+    return result
+
+
+def dense_axis(a, unit:str='Y'):
+    """
+    Offsets of each (dt, val) row on a dense year ('Y') or day ('D') axis and that axis' length.
+    Annual arrays have integer years, daily arrays datetime64 dates.
+    """
+    dt = a['dt']
+    if unit == 'Y' and np.issubdtype(dt.dtype, np.integer):
+        positions = dt.astype(np.int64)
+    else:
+        positions = dt.astype('datetime64[' + unit + ']').astype(np.int64)
+    if not len(positions):
+        return positions, 0
+    positions = positions - positions.min()
+    return positions, int(positions.max()) + 1
+
+
+def rolling_series(a, windows=default_windows, stats=('mean',), percentiles=(10, 90), min_periods:int=1,
+                   unit:str='Y') -> dict:
+    # rolling() over an annual (unit='Y') or daily (unit='D') array, one result per row of a
+    positions, length = dense_axis(a, unit)
+    values = np.full(length, np.nan)
+    values[positions] = a['val']
+    result = rolling(values, windows=windows, stats=stats, percentiles=percentiles, min_periods=min_periods)
+    return {key: stat[positions] for key, stat in result.items()}
+
+
+def running_average(a, window:int, min_periods:int=1) -> np.ndarray:
+    # Trailing mean of an annual or daily (dt, val) array as an array of the same layout
+    unit = 'Y' if np.issubdtype(a['dt'].dtype, np.integer) else 'D'
+    means = rolling_series(a, windows=(window,), min_periods=min_periods, unit=unit)[('mean', window)]
+    result = np.zeros(len(a), a.dtype)
+    result['dt'] = a['dt']
+    result['val'] = means
+    return result
+
+
+def moving_average(values, window:int) -> list:
+    # Means of every full window of a plain list, the first one ends at values[window - 1]
+    if len(values) < window:
+        return []
+    means = rolling(np.asarray(values, dtype=np.float64), windows=(window,), min_periods=window)
+    return means[('mean', window)][window - 1:].tolist()
@@ -2,6 +2,8 @@ import numpy as np
 import datetime
 from dateutil.relativedelta import relativedelta
 from graph.water import WaterGraph
+from rw.annual import AnnualSeries
+from rw import rolling
 
 debug = False
 current_last_year = 2021
@@ -79,13 +81,8 @@ def state_total_vs_user_total_graph(state_abbreviation, data, y_formatter='maf')
 
 
 def subtract_annual(minuend, subtrahend, start_year=0, end_year=0):
-    subtrahend = reshape_annual_range_to(subtrahend, minuend)
-    difference = np.zeros(len(minuend), [('dt', 'i'), ('val', 'f')])
-    difference['dt'] = minuend['dt']
-    difference['val'] = minuend['val'] - subtrahend['val']
-    if start_year and end_year:
-        difference = reshape_annual_range(difference, start_year, end_year)
-    return difference
+    difference = AnnualSeries.from_annual(minuend).subtract(subtrahend)
+    return difference.to_annual(start_year, end_year)
 
 
 def subtract_vector_from_annual(minuend, subtrahend):
@@ -99,29 +96,28 @@ def subtract_vector_from_annual(minuend, subtrahend):
 
 
 def flow_for_year(a, year):
-    for target in a:
-        if target['dt'] == year:
-            return target['val']
+    if isinstance(a, AnnualSeries):
+        return a.value(year)
+    if len(a) == 0:
+        return 0
+    # Annual arrays are almost always one entry per year, try the offset before searching
+    offset = year - a['dt'][0]
+    if 0 <= offset < len(a) and a['dt'][offset] == year:
+        return a['val'][offset]
+    found = np.flatnonzero(a['dt'] == year)
+    if len(found):
+        return a['val'][found[0]]
     return 0
 
 
 def multiply_annual(a, multiplier, start_year=0, end_year=0):
-    result = np.zeros(len(a), [('dt', 'i'), ('val', 'f')])
-    result['dt'] = a['dt']
-    result['val'] = a['val'] * multiplier
-    if start_year and end_year:
-        result = reshape_annual_range(result, start_year, end_year)
-    return result
+    result = AnnualSeries.from_annual(a).multiply(multiplier)
+    return result.to_annual(start_year, end_year)
 
 
 def add_annuals(arrays):
     if len(arrays) > 1:
-        result = add_annual(arrays[0], arrays[1])
-        n = 2
-        while n < len(arrays):
-            result = add_annual(result, arrays[n])
-            n += 1
-        return result
+        return AnnualSeries.sum(arrays).to_annual()
     elif len(arrays):
         return arrays[0]
     else:
@@ -130,32 +126,21 @@ def add_annuals(arrays):
 
 
 def add_annual(augend, addend, start_year=0, end_year=0):
-    addend = reshape_annual_range_to(addend, augend)
-    summation = np.zeros(len(augend), [('dt', 'i'), ('val', 'f')])
-    summation['dt'] = augend['dt']
-    summation['val'] = augend['val'] + addend['val']
-    if start_year and end_year:
-        summation = reshape_annual_range(summation, start_year, end_year)
-    return summation
+    summation = AnnualSeries.from_annual(augend).add(addend)
+    return summation.to_annual(start_year, end_year)
 
 
 def add3_annual(augend, addend, addend2, start_year=0, end_year=0):
-    summation = np.zeros(len(augend), [('dt', 'i'), ('val', 'f')])
-    summation['dt'] = augend['dt']
-    summation['val'] = augend['val'] + addend['val']
-    summation['val'] = summation['val'] + addend2['val']
-
-    if start_year and end_year:
-        summation = reshape_annual_range(summation, start_year, end_year)
-    return summation
+    summation = AnnualSeries.from_annual(augend).add(addend, addend2)
+    return summation.to_annual(start_year, end_year)
 
 
 def annual_is_zero(a):
-    if a is not None:
-        for value in a:
-            if value['val'] != 0:
-                return False
-    return True
+    if a is None:
+        return True
+    if isinstance(a, AnnualSeries):
+        return a.is_zero()
+    return not np.any(a['val'] != 0)
 
 
 def vector_is_zero(a):
@@ -167,41 +152,22 @@ def vector_is_zero(a):
 
 
 def replace_annual(a, b):
-    for source in b:
-        source_dt = source['dt']
-        for target in a:
-            if target['dt'] == source_dt:
-                target['val'] = source['val']
-                break
+    # In place, each year of b overwrites the first entry in a with that year
+    if not len(a) or not len(b):
+        return
+    order = np.argsort(a['dt'], kind='stable')
+    years = a['dt'][order]
+    found = np.minimum(np.searchsorted(years, b['dt']), len(years) - 1)
+    match = years[found] == b['dt']
+    a['val'][order[found[match]]] = b['val'][match]
 
 
 def running_average(annual_af, window):
-    result = np.zeros(len(annual_af), [('dt', 'i'), ('val', 'f')])
-
-    total = 0.0
-    n = 0
-    for x in annual_af:
-        result[n]['dt'] = x['dt']
-        if n >= window:
-            total -= annual_af[n - window]['val']
-            total += x['val']
-            result[n]['val'] = total / window
-        else:
-            total += x['val']
-            result[n]['val'] = total / (n+1)
-        n += 1
-
-    return result
+    return rolling.running_average(annual_af, window)
 
 
 def annual_zeroed_for_years(year_min, year_max):
-    years = year_max - year_min + 1
-    a = np.zeros(years, [('dt', 'i'), ('val', 'f')])
-    for year in range(year_min, year_max + 1):
-        year_index = year - year_min
-        a[year_index][0] = year
-        a[year_index][1] = 0
-    return a
+    return AnnualSeries.zeros(year_min, year_max).to_annual()
 
 
 def vector_zeroed_for_years(year_min, year_max):
@@ -211,13 +177,7 @@ def vector_zeroed_for_years(year_min, year_max):
 
 
 def annual_set_to_constant_for_years(year_min, year_max, constant):
-    years = year_max - year_min + 1
-    a = np.zeros(years, [('dt', 'i'), ('val', 'f')])
-    for year in range(year_min, year_max + 1):
-        year_index = year - year_min
-        a[year_index][0] = year
-        a[year_index][1] = constant
-    return a
+    return AnnualSeries.constant(year_min, year_max, constant).to_annual()
 
 
 def avg_annual(a):
@@ -307,12 +267,7 @@ def reshape_annual_range_to(a, to):
 
 
 def reshape_annual_range(a, year_min, year_max):
-    b = annual_zeroed_for_years(year_min, year_max)
-    for year_val in a:
-        year = year_val[0]
-        if year_min <= year <= year_max:
-            b[year - year_min][1] = year_val[1]
-    return b
+    return AnnualSeries.from_annual(a, year_min, year_max).to_annual()
 
 
 def daily_to_calendar_year(a):
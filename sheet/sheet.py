@@ -29,12 +29,13 @@ from openpyxl.styles import Alignment, Font, PatternFill, Side, Border
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.worksheet import Worksheet
 import pandas as pd
-from source.usgs_gage import USGSGage, daily_to_water_year, usgs_csv_summary
+from source.usgs_gage import USGSGage, daily_to_water_year, usgs_csv_summary, water_year_last_values, water_year_totals
 from source.water_year_info import WaterYearInfo
 from typing import Optional
 from graph.water import WaterGraph
 from source import usbr_rise
 import numpy as np
+from rw import rolling
 from typing import List, Tuple, Any, Dict, Union
 import colorado.lb as lb
 import colorado.ub as ub
@@ -535,15 +536,7 @@ def moving_average_10yr(data):
     Returns only the averages (starting from index 9 / 10th element).
     If fewer than 10 values, returns empty list.
     """
-    if len(data) < 10:
-        return []
-
-    result = []
-    for i in range(9, len(data)):
-        window = data[i - 9: i + 1]  # 10 elements
-        result.append(sum(window) / 10)
-
-    return result
+    return rolling.moving_average(data, 10)
 
 def write_column(
         ws,
@@ -649,11 +642,41 @@ def upper_basin_cul_from_excel(df:pd.DataFrame):
             df.loc[7: 7 + len(values) - 1, ub.AZ_CU] = values
 
 
+def usgs_period_of_record_gage(gage_id, start_year, end_year, parameter_cd='00060', stat_cd='00003', month=1,
+                               export_water_years=False):
+    if month != 1:
+        ts = pd.Timestamp(f'{end_year-1}-{month}-01 00:00:00')
+    else:
+        ts = pd.Timestamp(f'{end_year}-{month}-01 00:00:00')
+    water_year_info = WaterYearInfo.get_water_year(ts, month=month)
+    gage = USGSGage(gage_id, water_year_info)
+    daily = gage.period_of_record(parameterCd=parameter_cd, statCd=stat_cd)
+    if daily is not None and export_water_years:
+        gage.export_water_years(start_year, end_year, water_year_month=month, parameterCd=parameter_cd, statCd=stat_cd)
+    return daily
+
+
 def usgs_annuals(df, gage_id, start_year, end_year, title='', parameter_cd='00060', stat_cd='00003',
-                 month=1, offset=0, divisor=1_000_000):
+                 month=1, offset=0, divisor=1_000_000, period_of_record=False, export_water_years=False):
     annuals = []
     values = []
 
+    if period_of_record:
+        daily_cfs = usgs_period_of_record_gage(gage_id, start_year, end_year, parameter_cd=parameter_cd,
+                                               stat_cd=stat_cd, month=month, export_water_years=export_water_years)
+        if daily_cfs is None:
+            print(f'usgs_annuals no period of record {gage_id}')
+            return values
+        totals = water_year_totals(daily_cfs, start_year, end_year, water_year_month=month)
+        # Zero for years without a positive total, as the per year path appends
+        values = list(np.where(totals > 0, totals, 0) / divisor)
+        if title:
+            if len(values) != len(df[title]):
+                insert_values_from_year(df, title, start_year, values, offset=offset)
+            else:
+                df[title] = values
+        return values
+
     for year in range(start_year, end_year+1):
         if month != 1:
             ts = pd.Timestamp(f'{year-1}-{month}-01 00:00:00')
@@ -693,10 +716,22 @@ def usgs_annuals(df, gage_id, start_year, end_year, title='', parameter_cd='0006
 
     return values
 
-def usgs_value(df, gage_id, start_year, end_year, title='', parameterCd='00060', statCd='00003', month=1):
+def usgs_value(df, gage_id, start_year, end_year, title='', parameterCd='00060', statCd='00003', month=1,
+               period_of_record=False, export_water_years=False):
     years = []
     annuals = []
     values = []
+    if period_of_record:
+        daily = usgs_period_of_record_gage(gage_id, start_year, end_year, parameter_cd=parameterCd, stat_cd=statCd,
+                                           month=month, export_water_years=export_water_years)
+        if daily is None:
+            print(f'usgs_value no period of record {gage_id}')
+            return values
+        values = list(water_year_last_values(daily, start_year, end_year, water_year_month=month, missing=np.nan))
+        if title:
+            insert_values_from_year(df, title, start_year, values)
+        return values
+
     for year in range(start_year, end_year+1):
         if month != 1:
             ts = pd.Timestamp(f'{year-1}-{month}-01 00:00:00')
@@ -723,30 +758,24 @@ def usgs_value(df, gage_id, start_year, end_year, title='', parameterCd='00060',
     return values
 
 def usbr_get_last_value(gage_id, year, cfs_to_af=False, month=1)-> float:
-    if month != 1:
-        ts = pd.Timestamp(f'{year-1}-{month}-01 00:00:00')
-    else:
-        ts = pd.Timestamp(f'{year}-{month}-01 00:00:00')
-
-    water_year_info = WaterYearInfo.get_water_year(ts, month=month)
+    info, daily = usbr_rise.load_range(gage_id, year, year, month=month)
+    af = water_year_last_values(daily, year, year, water_year_month=month)[0]
     if cfs_to_af:
-        info, daily_cfs = usbr_rise.load(gage_id, water_year_info=water_year_info)
-        daily_af = WaterGraph.convert_cfs_to_af_per_day(daily_cfs)
-    else:
-        info, daily_af = usbr_rise.load(gage_id, water_year_info=water_year_info)
-
-    af = daily_af[-1]
-    return af
+        af *= 1.983459
+    return float(af)
 
 def usbr_last_value(df, gage_id, start_year, end_year, title='', cfs_to_af=False, month=1, divisor=1_000_000):
     years = []
     annuals = []
     values = []
-    for year in range(start_year, end_year+1):
-        af:float = usbr_get_last_value(gage_id, year, cfs_to_af=cfs_to_af, month=month)
+    info, daily = usbr_rise.load_range(gage_id, start_year, end_year, month=month)
+    last_values = water_year_last_values(daily, start_year, end_year, water_year_month=month)
+    if cfs_to_af:
+        last_values *= 1.983459
+    for year, af in zip(range(start_year, end_year+1), last_values):
         years.append(year + 1)
-        values.append(af[1] / divisor)
-        annuals.append(af)
+        values.append(af / divisor)
+        annuals.append((year, af))
 
     # if title:
     #    print(title)
@@ -768,33 +797,17 @@ def usbr_last_value(df, gage_id, start_year, end_year, title='', cfs_to_af=False
 def usbr_annuals(df, gage_id, start_year, end_year, title='', cfs_to_af=False, month=1, divisor=1_000_000, offset=0):
     annuals = []
     values = []
-    for year in range(start_year, end_year+1):
-        if month != 1:
-            ts = pd.Timestamp(f'{year-1}-{month}-01 00:00:00')
-        else:
-            ts = pd.Timestamp(f'{year}-{month}-01 00:00:00')
-        water_year_info = WaterYearInfo.get_water_year(ts, month=month)
-        if cfs_to_af:
-            info, daily_cfs = usbr_rise.load(gage_id, water_year_info=water_year_info)
-            daily_af = WaterGraph.convert_cfs_to_af_per_day(daily_cfs)
-        else:
-            info, daily_af = usbr_rise.load(gage_id, water_year_info=water_year_info)
-
-        # total = daily_release_ft['val'].sum()
-        try:
-            annual_af = WaterGraph.daily_to_water_year(daily_af, water_year_month=month)
-            if len(annual_af) == 1:
-                values.append(annual_af[0][1] / divisor)
-                annuals.append(annual_af[0])
-            elif annual_af is None:
-                print(f'usbr_annuals No years returned {gage_id} {year}')
-            elif len(annual_af) == 0:
-                print(f'usbr_annuals no years returned  {gage_id} {year}')
-                values.append(0)
-            else:
-                print(f'Multiple years returned {gage_id} {year}')
-        except Exception as e:
-            print(f"usbr_annuals {gage_id}  error: {e}")
+    info, daily = usbr_rise.load_range(gage_id, start_year, end_year, month=month)
+    if cfs_to_af:
+        multiplier = 1.983459
+    else:
+        multiplier = 1
+    totals = water_year_totals(daily, start_year, end_year, water_year_month=month, multiplier=multiplier)
+    for year, annual_af in zip(range(start_year, end_year+1), totals):
+        if not annual_af:
+            print(f'usbr_annuals no years returned  {gage_id} {year}')
+        values.append(annual_af / divisor)
+        annuals.append((year, annual_af))
 
     # if title:
     #    print(title)
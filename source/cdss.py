@@ -36,10 +36,12 @@ SOFTWARE.
 # https://dwr.state.co.us/Rest/GET/Help/Api/GET-api-v2-surfacewater-surfacewatertswateryear
 # 'api/v2/surfacewater/surfacewatertswateryear'
 import copy
+from datetime import datetime
 import json
 import requests
 from pathlib import Path
 import numpy as np
+from source import fetch, manifest, sidecar, store
 from source.water_year_info import WaterYearInfo
 
 
@@ -50,7 +52,7 @@ def structure_info(wdid):
     url = f"{base_url}?wdid={wdid}"
     try:
         print(f'CDSS structure info:  {url}')
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()  # Raise exception for bad status codes
         json_data = response.json()
         if json_data["ResultList"]:
@@ -68,7 +70,7 @@ def water_class_info(wdid, water_class_num:str=''):
         url += f'&waterClassNum={water_class_num}'
     try:
         print(f'CDSS water class info:  {url}')
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()  # Raise exception for bad status codes
         json_data = response.json()
         if json_data["ResultList"]:
@@ -86,7 +88,7 @@ def telemetry_station_info(wdid):
     url = f"{base_url}?wdid={wdid}"
     try:
         print(f'CDSS telemetry info:  {url}')
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()  # Raise exception for bad status codes
         json_data = response.json()
         if json_data["ResultList"]:
@@ -110,18 +112,29 @@ def cache_file_name(name:str, meas_type:str='', water_class_num='', water_year_s
 
 
 def write_json(file_path:Path, response:requests.Response):
-    data = response.json()
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False, sort_keys=True)
+    # The response body is already JSON, write it as is rather than parsing and pretty printing it again
+    with open(file_path, "wb") as f:
+        f.write(response.content)
 
 
 def load_json(file_path, value_name='value', date_name='measDate',
               water_class_num='', analyze=False):
+    if water_class_num:
+        # Class partitions are built once per file, a class is then a row of the class x day matrix
+        partitions = water_class_partitions(file_path, value_name=value_name, date_name=date_name)
+        if analyze:
+            partitions.print_catalog()
+        return partitions.series(water_class_num)
+
     f = file_path.open(mode='r')
     data = json.load(f)
     if analyze:
         analyze_water_class(data)
-    return data_from_json(data, value_name=value_name, date_name=date_name, water_class_num=water_class_num)
+    time_series = data_from_json(data, value_name=value_name, date_name=date_name, water_class_num=water_class_num)
+    # A file filtered to one water class doesn't describe the whole file
+    if not water_class_num and manifest.entry(file_path) is None:
+        manifest.record(file_path, time_series)
+    return time_series
 
 def print_last_value(abbrev, a, alias=''):
     if a is not None and len(a['dt']) and len(a['val']):
@@ -131,6 +144,48 @@ def print_last_value(abbrev, a, alias=''):
     else:
         print(f'\tCDSS no data - {abbrev} {alias}')
 
+def load_stored(source:str, series_id:str, parameter:str, stat:str, water_year_info):
+    # A past water year already in the local time series store, None if it has to be loaded or fetched
+    if water_year_info is None or water_year_info.is_current_water_year:
+        return None
+    time_series = store.load(source, series_id, parameter or '', stat or '', water_year_info.start_date,
+                             water_year_info.end_date, dtype=[('dt', 'datetime64[D]'), ('val', float)])
+    # Loaders return None for a year without records
+    if time_series is None or not len(time_series):
+        return None
+    return time_series
+
+
+def load_if_fresh(file_name:Path, water_year_info, load):
+    """
+    The time series in cache file file_name, load() parses it, or None when it has to be fetched.
+    Only a current water year goes stale, 48 hours after its last day.  The cache manifest decides
+    without loading the file, the loaded time series only when the manifest doesn't know the file.
+    """
+    if not file_name.exists():
+        return None
+    stale = False
+    if water_year_info is not None and water_year_info.is_current_water_year:
+        stale = manifest.is_stale(file_name, hours_offset=48)
+        if stale:
+            return None
+    time_series = load()
+    if stale is None:
+        if time_series is None or not len(time_series):
+            return None
+        if WaterYearInfo.is_current_datetime_greater(time_series[-1][0], hours_offset=48):
+            return None
+    return time_series
+
+
+def write_stored(source:str, series_id:str, parameter:str, stat:str, water_year_info, time_series):
+    # Only a fetch that returned days is stored, an empty or failed one is fetched again next time
+    if water_year_info is not None and not water_year_info.is_current_water_year and time_series is not None \
+            and len(time_series):
+        store.write(source, series_id, parameter or '', stat or '', time_series, water_year_info.start_date,
+                    water_year_info.end_date)
+
+
 class WaterClass:
     def __init__(self, number:str, identifier:str,  start_date:str):
         self.number:str = number
@@ -150,28 +205,7 @@ class WaterClass:
 def analyze_water_class(json_data, date_name:str='dataMeasDate'):
     measurements = json_data["ResultList"]
     if measurements:
-        water_classes = {}
-        for measurement in measurements:
-                date = measurement.get(date_name)
-                number = measurement.get('waterClassNum')
-                identifier = measurement.get('wcIdentifier')
-                if number is not None:
-                    if number in water_classes:
-                        water_class = water_classes[number]
-                        if identifier == water_class.identifier:
-                            if date > water_class.end_date:
-                                water_class.end_date = date
-                                water_class.num_samples += 1
-                                # water_classes[number] = water_class
-                            else:
-                                pass
-                        else:
-                            pass
-                    else:
-                        water_classes[number] = WaterClass(number, identifier, date)
-        for number, water_class in water_classes.items():
-            print(water_class)
-        pass
+        WaterClassPartitions.from_columns(*divrec_columns(measurements, date_name=date_name)).print_catalog()
 
 def data_from_json(json_data, value_name:str='value', date_name:str='measDate', water_class_num:str=''):
     measurements = json_data["ResultList"]
@@ -199,6 +233,127 @@ def data_from_json(json_data, value_name:str='value', date_name:str='measDate',
     return None
 
 
+def divrec_columns(measurements, value_name:str='dataValue', date_name:str='dataMeasDate'):
+    # Records reduced to columns: dates, values, water class numbers (-1 when none) and class identifiers
+    dates = np.array([(measurement.get(date_name) or '')[:10] or 'NaT' for measurement in measurements],
+                     dtype='datetime64[D]')
+    values = np.array([measurement.get(value_name) for measurement in measurements], dtype=float)
+    class_nums = np.array([-1 if measurement.get('waterClassNum') is None else measurement.get('waterClassNum')
+                           for measurement in measurements], dtype=np.int64)
+    identifiers = [measurement.get('wcIdentifier') or '' for measurement in measurements]
+    return dates, values, class_nums, identifiers
+
+
+water_class_dtype = [('num', np.int64), ('identifier', 'U128'), ('first', 'datetime64[D]'),
+                     ('last', 'datetime64[D]'), ('count', np.int64)]
+
+
+class WaterClassPartitions:
+    """
+    Divrec records of one structure partitioned by water class: a class catalog and a dense class x day
+    matrix starting at start_date with NaN on days a class has no value.
+    """
+    sidecar_names = ['classes', 'matrix', 'start']
+
+    def __init__(self, classes:np.ndarray, start_date:np.datetime64, matrix:np.ndarray):
+        self.classes = classes
+        self.start_date = np.datetime64(start_date, 'D')
+        self.matrix = matrix
+        self.indices = {str(num): index for index, num in enumerate(classes['num'])}
+
+    @staticmethod
+    def from_columns(dates, values, class_nums, identifiers):
+        valid = (class_nums >= 0) & ~np.isnat(dates)
+        nums, class_indices = np.unique(class_nums[valid], return_inverse=True)
+        valid_dates = dates[valid]
+        if len(valid_dates):
+            start_date = valid_dates.min()
+            num_days = (valid_dates.max() - start_date).astype(int) + 1
+        else:
+            start_date = np.datetime64('1900-01-01', 'D')
+            num_days = 0
+        days = (valid_dates - start_date).astype(int)
+        matrix = np.full((len(nums), num_days), np.nan)
+        matrix[class_indices, days] = values[valid]
+
+        classes = np.zeros(len(nums), water_class_dtype)
+        classes['num'] = nums
+        valid_identifiers = [identifier for identifier, is_valid in zip(identifiers, valid) if is_valid]
+        for index in range(len(nums)):
+            in_class = np.flatnonzero(class_indices == index)
+            classes['identifier'][index] = valid_identifiers[in_class[0]]
+            classes['first'][index] = valid_dates[in_class].min()
+            classes['last'][index] = valid_dates[in_class].max()
+            classes['count'][index] = len(in_class)
+        return WaterClassPartitions(classes, start_date, matrix)
+
+    @staticmethod
+    def load(file_path:Path):
+        arrays = sidecar.load(file_path, WaterClassPartitions.sidecar_names)
+        if arrays is None:
+            return None
+        return WaterClassPartitions(arrays['classes'], arrays['start'][0], arrays['matrix'])
+
+    def save(self, file_path:Path):
+        sidecar.save(file_path, {'classes': self.classes, 'matrix': self.matrix,
+                                 'start': np.array([self.start_date])})
+
+    def day_range(self, start_date=None, end_date=None):
+        first = 0 if start_date is None else max((np.datetime64(start_date, 'D') - self.start_date).astype(int), 0)
+        last = self.matrix.shape[1] if end_date is None else \
+            min((np.datetime64(end_date, 'D') - self.start_date).astype(int) + 1, self.matrix.shape[1])
+        return first, max(first, last)
+
+    def dense(self, water_class_num:str, start_date=None, end_date=None) -> np.ndarray|None:
+        # One class as a daily array view, NaN on days without a value
+        index = self.indices.get(str(water_class_num))
+        if index is None:
+            return None
+        first, last = self.day_range(start_date, end_date)
+        return self.matrix[index, first:last]
+
+    def series(self, water_class_num:str, start_date=None, end_date=None) -> np.ndarray|None:
+        # Days a class has a value as a (dt, val) array, like data_from_json() with water_class_num
+        dense = self.dense(water_class_num, start_date, end_date)
+        if dense is None:
+            return None
+        days = np.flatnonzero(~np.isnan(dense))
+        if not len(days):
+            return None
+        first, last = self.day_range(start_date, end_date)
+        time_series = np.zeros(len(days), [('dt', 'datetime64[D]'), ('val', float)])
+        time_series['dt'] = self.start_date + first + days
+        time_series['val'] = dense[days]
+        return time_series
+
+    def class_matrix(self, water_class_nums:list[str]|None=None, start_date=None, end_date=None):
+        """
+        (dates, matrix) for every class, or the classes in water_class_nums in that order, one row per class
+        """
+        first, last = self.day_range(start_date, end_date)
+        dates = self.start_date + np.arange(first, last)
+        if water_class_nums is None:
+            return dates, self.matrix[:, first:last]
+        rows = [self.indices[str(num)] for num in water_class_nums]
+        return dates, self.matrix[rows, first:last]
+
+    def print_catalog(self):
+        for water_class in self.classes:
+            print(f"  {water_class['num']:8d} {water_class['count']:4d} {water_class['first']} {water_class['last']}  "
+                  f"'{water_class['identifier']}'")
+
+
+def water_class_partitions(file_path:Path, value_name:str='dataValue', date_name:str='dataMeasDate'):
+    # Partitions of a divrec JSON cache file, from its sidecars when they are current
+    partitions = WaterClassPartitions.load(file_path)
+    if partitions is None:
+        with file_path.open(mode='r') as f:
+            measurements = json.load(f).get('ResultList') or []
+        partitions = WaterClassPartitions.from_columns(*divrec_columns(measurements, value_name, date_name))
+        partitions.save(file_path)
+    return partitions
+
+
 def telemetry_station_time_series(logger, abbrev, parameter, water_year_info=None, update=False, alias='',
                                   start_date=None, end_date=None):
     time_series = None
@@ -207,19 +362,21 @@ def telemetry_station_time_series(logger, abbrev, parameter, water_year_info=Non
         water_year_string = '_' + str(water_year_info.year)
         start_date = str(water_year_info.start_date)
         end_date = str(water_year_info.end_date)
-        if water_year_info.is_current_water_year:
-            update = True
     else:
         water_year_string = ''
 
+    if not update:
+        time_series = load_stored('cdss_telemetry', abbrev, parameter, '', water_year_info)
+        if time_series is not None:
+            print_last_value(abbrev, time_series, alias=alias)
+            return time_series
+
     file_name = cache_file_name(abbrev, water_year_string=water_year_string)
-    if file_name.exists() and not update:
-        time_series = load_json(file_name, value_name='measValue')
-        if water_year_info is not None and water_year_info.is_current_water_year:
-            last_date = time_series[-1][0]
-            update = WaterYearInfo.is_current_datetime_greater(last_date, hours_offset=48)
-        print_last_value(abbrev, time_series, alias=alias)
-        if not update:
+    if not update:
+        time_series = load_if_fresh(file_name, water_year_info, lambda: load_json(file_name, value_name='measValue'))
+        if time_series is not None:
+            print_last_value(abbrev, time_series, alias=alias)
+            write_stored('cdss_telemetry', abbrev, parameter, '', water_year_info, time_series)
             return time_series
 
     # api_key = None  # Replace with your CDSS API key (optional for limited queries)
@@ -239,13 +396,15 @@ def telemetry_station_time_series(logger, abbrev, parameter, water_year_info=Non
     #     'https://dwr.state.co.us/Rest/GET/api/v2/telemetrystations/telemetrytimeseriesday/?fields=measDate%2CmeasValue%2Cmodified&abbrev=GRORESCO&parameter=STORAGE&startDate=11%2F01%2F2024'
     try:
         print(f'CDSS telemetry:  {url}')
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()  # Raise exception for bad status codes
         json_data = response.json()
         if json_data["ResultList"]:
             write_json(file_name, response)
             time_series = data_from_json(json_data, value_name='measValue')
+            manifest.record(file_name, time_series, url=url)
             print_last_value(abbrev, time_series, alias=alias)
+            write_stored('cdss_telemetry', abbrev, parameter, '', water_year_info, time_series)
     except requests.exceptions.RequestException as e:
         msg = f"Error querying CDSS telemetry station {abbrev} info: {e}"
         logger.log_message(msg)
@@ -272,7 +431,7 @@ def request_surface_waters_day(logger, abbrev, file_name, start_date=None, end_d
     url = url[:-1]
     try:
         print(f'CDSS surface:  {url}')
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()  # Raise exception for bad status codes
         json_data = response.json()
         if json_data["ResultList"]:
@@ -280,6 +439,7 @@ def request_surface_waters_day(logger, abbrev, file_name, start_date=None, end_d
             measurements = json_data["ResultList"]
             if measurements:
                 time_series = data_from_json(json_data, value_name='value')
+                manifest.record(file_name, time_series, url=url)
                 print_last_value(abbrev, time_series, alias=alias)
 
                 '''
@@ -304,35 +464,33 @@ def surface_waters_day(logger, abbrev, water_year_info, meas_type=None, update=F
         start_date = str(water_year_info.start_date)
         end_date = str(water_year_info.end_date)
         # cdss_start_date = pd.Timestamp(start_datetime64).strftime('%m-%d-%Y')
-        if water_year_info.is_current_water_year:
-            update = True
     else:
         logger.log_message(f'CDSS surface water request has no info: {abbrev}')
         return None
 
+    if not update:
+        time_series = load_stored('cdss_surface', abbrev, meas_type, '', water_year_info)
+        if time_series is not None:
+            print_last_value(abbrev, time_series, alias=alias)
+            return time_series
+
     file_name = cache_file_name(abbrev, meas_type=meas_type, water_year_string=water_year_string, file_prefix=file_prefix)
-    if file_name.exists() and not update:
-        time_series = load_json(file_name, value_name='value')
-        if water_year_info is not None and water_year_info.is_current_water_year:
-            last_date = time_series[-1][0]
-            update = WaterYearInfo.is_current_datetime_greater(last_date, hours_offset=48)
-        print_last_value(abbrev, time_series, alias=alias)
-        if not update:
+    if not update:
+        time_series = load_if_fresh(file_name, water_year_info, lambda: load_json(file_name, value_name='value'))
+        if time_series is not None:
+            print_last_value(abbrev, time_series, alias=alias)
+            write_stored('cdss_surface', abbrev, meas_type, '', water_year_info, time_series)
             return time_series
 
     time_series = request_surface_waters_day(logger, abbrev, file_name, start_date=start_date, end_date=end_date,
                                              meas_type=meas_type, alias=alias)
+    write_stored('cdss_surface', abbrev, meas_type, '', water_year_info, time_series)
     return time_series
 
 
 # https://dwr.state.co.us/Rest/GET/api/v2/structures/divrec/stagevolume?wdid=3203602
-def request_structures_divrec(logger, wdid, file_name:Path, start_date:str|None=None, end_date:str|None=None,
-                              meas_type:str|None=None, water_class_num:str|None=None, alias=None, analyze=False):
-    time_series = None
-
-    # Historical diversion records is a very spartan API.  you get the whole record
-    # and have to clip it yourself
-
+def divrec_url(wdid, meas_type:str|None=None, start_date:str|None=None, end_date:str|None=None,
+               page_size:int=0, page_index:int=0) -> str:
     # api_key = None  # Replace with your CDSS API key (optional for limited queries)
     base_url = "https://dwr.state.co.us/Rest/GET/api/v2/structures/divrec/"
     if meas_type is not None:
@@ -346,6 +504,19 @@ def request_structures_divrec(logger, wdid, file_name:Path, start_date:str|None=
         url += f'&min-dataMeasDate={start_date}'
     if end_date:
         url += f'&max-dataMeasDate={end_date}'
+    if page_size:
+        url += f'&pageSize={page_size}&pageIndex={page_index}'
+    return url
+
+
+def request_structures_divrec(logger, wdid, file_name:Path, start_date:str|None=None, end_date:str|None=None,
+                              meas_type:str|None=None, water_class_num:str|None=None, alias=None, analyze=False):
+    time_series = None
+
+    # Historical diversion records is a very spartan API.  you get the whole record
+    # and have to clip it yourself
+
+    url = divrec_url(wdid, meas_type, start_date=start_date, end_date=end_date)
 
     if meas_type == 'divrecday':
         # fields = ['dataMeasDate', 'dataValue', 'measUnits', 'modified', 'approvalStatus', 'obsCode']
@@ -366,20 +537,28 @@ def request_structures_divrec(logger, wdid, file_name:Path, start_date:str|None=
 
     try:
         print(f'CDSS divrec:  {url}')
-        response = requests.get(url)
+        response = fetch.get(url)
         response.raise_for_status()  # Raise exception for bad status codes
         json_data = response.json()
         if json_data["ResultList"]:
             write_json(file_name, response)
             measurements = json_data["ResultList"]
             if measurements:
-                if meas_type == 'divrecday':
+                if meas_type == 'divrecday' and water_class_num:
+                    partitions = WaterClassPartitions.from_columns(*divrec_columns(measurements))
+                    partitions.save(file_name)
+                    if analyze:
+                        partitions.print_catalog()
+                    time_series = partitions.series(water_class_num)
+                elif meas_type == 'divrecday':
                     if analyze:
                         analyze_water_class(json_data)
                     time_series = data_from_json(json_data, value_name='dataValue', date_name='dataMeasDate',
                                                  water_class_num=water_class_num)
                 elif meas_type == 'stagevolume':
                     time_series = data_from_json(json_data, date_name='dataMeasDate', value_name='volume')
+                if not water_class_num:
+                    manifest.record(file_name, time_series, url=url)
                 # print_last_value(wdid, time_series, alias=alias)
 
     except requests.exceptions.RequestException as e:
@@ -396,12 +575,15 @@ def structures_divrec(logger, wdid:str, water_year_info, meas_type:str='divrecda
         start_date = str(water_year_info.start_date)
         end_date = str(water_year_info.end_date)
         # cdss_start_date = pd.Timestamp(start_datetime64).strftime('%m-%d-%Y')
-        if water_year_info.is_current_water_year:
-            update = True
     else:
         logger.log_message(f'CDSS structure divrec request has no info: {wdid}')
         return None
 
+    if not update and not analyze:
+        time_series = load_stored('cdss_divrec', wdid, meas_type, water_class_num, water_year_info)
+        if time_series is not None:
+            return time_series
+
     file_name = cache_file_name(wdid, meas_type=meas_type, water_year_string=water_year_string, file_prefix=file_prefix)
     if file_name.exists() and not update:
         if meas_type == 'stagevolume':
@@ -411,15 +593,108 @@ def structures_divrec(logger, wdid:str, water_year_info, meas_type:str='divrecda
         else:
             print(f'cdss structures_divrec unknown meas_type: {meas_type}')
             return None
-        time_series = load_json(file_name, value_name=value_name, date_name='dataMeasDate',
-                                water_class_num=water_class_num, analyze=analyze)
-        if water_year_info is not None and water_year_info.is_current_water_year:
-            last_date = time_series[-1][0]
-            update = WaterYearInfo.is_current_datetime_greater(last_date, hours_offset=48)
+        time_series = load_if_fresh(file_name, water_year_info,
+                                    lambda: load_json(file_name, value_name=value_name, date_name='dataMeasDate',
+                                                      water_class_num=water_class_num, analyze=analyze))
         # print_last_value(wdid, time_series, alias=alias)
-        if not update:
+        if time_series is not None:
+            write_stored('cdss_divrec', wdid, meas_type, water_class_num, water_year_info, time_series)
             return time_series
 
     time_series = request_structures_divrec(logger, wdid, file_name, start_date=start_date, end_date=end_date,
                                              meas_type=meas_type, water_class_num=water_class_num, alias=alias, analyze=analyze)
-    return time_series
\ No newline at end of file
+    write_stored('cdss_divrec', wdid, meas_type, water_class_num, water_year_info, time_series)
+    return time_series
+
+divrec_page_size = 10000
+divrec_value_names = {'divrecday': 'dataValue', 'stagevolume': 'volume'}
+
+
+def divrec_page_columns(url:str, value_name:str):
+    """
+    Fetch one page of diversion records and reduce it to columns: dates, values, water class numbers
+    (-1 when a record has none) and class identifiers.  Returns (page_count, columns) or (0, None).
+    """
+    print(f'CDSS divrec page:  {url}')
+    response = fetch.get(url)
+    response.raise_for_status()
+    json_data = response.json()
+    return json_data.get('PageCount', 1), divrec_columns(json_data.get('ResultList') or [], value_name)
+
+
+def ingest_structures_divrec(logger, wdid:str, start_year:int, end_year:int, month:int=1,
+                             meas_type:str='divrecday') -> dict[str, np.ndarray]:
+    """
+    One paged pass over the diversion record for water years start_year..end_year.  Pages are fetched
+    concurrently and reduced to columns as they arrive, then split by water class and stored per
+    water year in the local time series store, where structures_divrec() finds them without another
+    request.  All records are also stored under water class '' when there is one record per day.
+    Returns {water_class_num: daily array} over the whole range.
+    """
+    value_name = divrec_value_names.get(meas_type)
+    if value_name is None:
+        print(f'cdss ingest_structures_divrec unknown meas_type: {meas_type}')
+        return {}
+    water_year_infos = []
+    for year in range(start_year, end_year + 1):
+        if month != 1:
+            water_year_infos.append(WaterYearInfo.get_water_year(datetime(year - 1, month, 1), month=month))
+        else:
+            water_year_infos.append(WaterYearInfo.get_water_year(datetime(year, 1, 1), month=month))
+    past_infos = [water_year_info for water_year_info in water_year_infos if not water_year_info.is_current_water_year]
+    start_date = str(water_year_infos[0].start_date)
+    end_date = str(water_year_infos[-1].end_date)
+
+    try:
+        page_count, columns = divrec_page_columns(divrec_url(wdid, meas_type, start_date, end_date,
+                                                             divrec_page_size, 1), value_name)
+        urls = [divrec_url(wdid, meas_type, start_date, end_date, divrec_page_size, page_index)
+                for page_index in range(2, page_count + 1)]
+        pages = [columns] + [page for page_count, page in fetch.run_all(lambda url: divrec_page_columns(url, value_name),
+                                                                        urls)]
+    except requests.exceptions.RequestException as e:
+        logger.log_message(f"Error querying CDSS diversion records {wdid}: {e}")
+        return {}
+
+    dates = np.concatenate([page[0] for page in pages])
+    values = np.concatenate([page[1] for page in pages])
+    class_nums = np.concatenate([page[2] for page in pages])
+    identifiers = [identifier for page in pages for identifier in page[3]]
+
+    partitions = WaterClassPartitions.from_columns(dates, values, class_nums, identifiers)
+    classes = {}
+    names = {}
+    for water_class in partitions.classes:
+        water_class_num = str(water_class['num'])
+        classes[water_class_num] = partitions.series(water_class_num)
+        names[water_class_num] = water_class['identifier']
+
+    # Unfiltered records are stored under '' like structures_divrec() with no water class returns them,
+    # only when there is one record per day, otherwise '' would be several classes interleaved
+    if len(dates) and len(np.unique(dates)) == len(dates):
+        order = np.argsort(dates, kind='stable')
+        time_series = np.zeros(len(order), [('dt', 'datetime64[D]'), ('val', float)])
+        time_series['dt'] = dates[order]
+        time_series['val'] = values[order]
+        classes[''] = time_series
+
+    for water_class_num, time_series in classes.items():
+        if past_infos and time_series is not None and len(time_series):
+            store.write('cdss_divrec', wdid, meas_type, water_class_num, time_series, past_infos[0].start_date,
+                        past_infos[-1].end_date, name=names.get(water_class_num) or None)
+    return classes
+
+
+def structures_divrec_classes(logger, wdid:str, water_year_info, meas_type:str='divrecday', file_prefix=''):
+    """
+    Water class partitions of a structure's diversion records for one water year, every class at once
+    through WaterClassPartitions.class_matrix().  The water year is fetched if it isn't cached.
+    """
+    water_year_string = '_' + str(water_year_info.year)
+    file_name = cache_file_name(wdid, meas_type=meas_type, water_year_string=water_year_string, file_prefix=file_prefix)
+    if not file_name.exists():
+        request_structures_divrec(logger, wdid, file_name, start_date=str(water_year_info.start_date),
+                                  end_date=str(water_year_info.end_date), meas_type=meas_type)
+        if not file_name.exists():
+            return None
+    return water_class_partitions(file_name, value_name=divrec_value_names.get(meas_type, 'dataValue'))
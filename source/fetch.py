@@ -0,0 +1,145 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared HTTP fetcher for USGS NWIS, USBR RISE and CDSS.  One pooled session per host, a limit on
+# concurrent requests per host, retry with exponential backoff on 429 and 5xx, and identical URLs
+# already in flight are fetched once.  get() runs in the calling thread so loaders run with map()
+# can call it without tying up the pool.
+
+connect_timeout_secs = 10
+read_timeout_secs = 300
+retries = 5
+backoff_factor = 1.0
+retry_status_codes = [429, 500, 502, 503, 504]
+
+max_workers = 8
+default_host_limit = 4
+host_limits = {
+    'waterservices.usgs.gov': 4,
+    'data.usbr.gov': 4,
+    'dwr.state.co.us': 2,
+}
+
+
+class FetchScheduler(object):
+    def __init__(self, workers:int=max_workers, limits:dict[str, int]|None=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch')
+        self.limits = dict(host_limits if limits is None else limits)
+        self.lock = threading.Lock()
+        self.sessions: dict[str, requests.Session] = {}
+        self.semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self.in_flight: dict[str, Future] = {}
+        # Set in the pool's own threads, so nested submit() and map() calls run inline instead of
+        # waiting on pool threads that may all be busy waiting on them
+        self.local = threading.local()
+
+    def host_limit(self, host:str) -> int:
+        return self.limits.get(host, default_host_limit)
+
+    def session(self, host:str) -> requests.Session:
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=retry_status_codes,
+                              allowed_methods=['GET'], respect_retry_after_header=True, raise_on_status=False)
+                adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=self.host_limit(host))
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self.sessions[host] = session
+                self.semaphores[host] = threading.BoundedSemaphore(self.host_limit(host))
+            return session
+
+    def get(self, url:str, timeout=None) -> requests.Response:
+        with self.lock:
+            future = self.in_flight.get(url)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.in_flight[url] = future
+        if not owner:
+            return future.result()
+
+        try:
+            host = urlparse(url).netloc
+            session = self.session(host)
+            if timeout is None:
+                timeout = (connect_timeout_secs, read_timeout_secs)
+            with self.semaphores[host]:
+                response = session.get(url, timeout=timeout)
+            future.set_result(response)
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.in_flight.pop(url, None)
+        return future.result()
+
+    def in_pool_thread(self) -> bool:
+        return getattr(self.local, 'in_pool', False)
+
+    def run_in_pool(self, fn:Callable[..., Any], item:Any) -> Any:
+        self.local.in_pool = True
+        try:
+            return fn(item)
+        finally:
+            self.local.in_pool = False
+
+    def submit(self, url:str) -> Future:
+        if self.in_pool_thread():
+            future = Future()
+            try:
+                future.set_result(self.get(url))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self.executor.submit(self.run_in_pool, self.get, url)
+
+    def map(self, fn:Callable[..., Any], items:Iterable[Any]) -> list[Any]:
+        # Run fn over items concurrently, results in the order of items.  Called from fn itself the
+        # items run inline in that pool thread.
+        if self.in_pool_thread():
+            return [fn(item) for item in items]
+        futures = [self.executor.submit(self.run_in_pool, fn, item) for item in items]
+        return [future.result() for future in futures]
+
+
+scheduler = FetchScheduler()
+
+
+def get(url:str, timeout=None) -> requests.Response:
+    return scheduler.get(url, timeout=timeout)
+
+
+def submit(url:str) -> Future:
+    return scheduler.submit(url)
+
+
+def run_all(fn:Callable[..., Any], items:Iterable[Any]) -> list[Any]:
+    return scheduler.map(fn, items)
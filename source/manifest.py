@@ -0,0 +1,139 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from source.water_year_info import WaterYearInfo
+
+# Persistent manifest of the text cache files, one row per file with its first and last observation
+# dates, record count, content hash, fetch time and source URL.  An entry is valid while the file's
+# size and mtime match the ones recorded, so freshness of a current water year file is a stat()
+# and a dict lookup instead of loading and parsing the file.
+
+manifest_path = Path('cache/manifest.sqlite')
+
+schema = '''CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    first_date TEXT,
+    last_date TEXT,
+    count INTEGER,
+    sha1 TEXT,
+    fetched REAL,
+    url TEXT,
+    size INTEGER,
+    mtime_ns INTEGER)'''
+
+columns = ['path', 'first_date', 'last_date', 'count', 'sha1', 'fetched', 'url', 'size', 'mtime_ns']
+
+
+class Manifest(object):
+    def __init__(self, path:Path=manifest_path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(schema)
+        # Whole manifest is read once, lookups after that don't touch SQLite
+        self.entries = {row[0]: dict(zip(columns, row))
+                        for row in self.connection.execute(f'SELECT {", ".join(columns)} FROM files')}
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, file_path:Path, a:np.ndarray|None, url:str|None=None) -> dict|None:
+        """
+        Record file_path and the (dt, val) array loaded from it.  url is the request the file was
+        fetched with, when None the file's modification time is its fetch time.
+        """
+        file_path = Path(file_path)
+        try:
+            stat = file_path.stat()
+            sha1 = hashlib.sha1(file_path.read_bytes()).hexdigest()
+        except OSError:
+            return None
+        if a is not None and len(a):
+            first_date = str(np.datetime64(a['dt'][0], 's'))
+            last_date = str(np.datetime64(a['dt'][-1], 's'))
+            count = len(a)
+        else:
+            first_date = last_date = None
+            count = 0
+        fetched = time.time() if url is not None else stat.st_mtime
+        entry = dict(zip(columns, [str(file_path), first_date, last_date, count, sha1, fetched, url, stat.st_size,
+                                   stat.st_mtime_ns]))
+        with self.lock, self.connection:
+            self.connection.execute(f'INSERT OR REPLACE INTO files VALUES ({", ".join("?" * len(columns))})',
+                                    [entry[column] for column in columns])
+            self.entries[entry['path']] = entry
+        return entry
+
+    def entry(self, file_path:Path) -> dict|None:
+        # Entry for file_path if the file hasn't changed since it was recorded
+        entry = self.entries.get(str(file_path))
+        if entry is None:
+            return None
+        try:
+            stat = Path(file_path).stat()
+        except OSError:
+            return None
+        if stat.st_mtime_ns != entry['mtime_ns'] or stat.st_size != entry['size']:
+            return None
+        return entry
+
+    def is_stale(self, file_path:Path, hours_offset:int=48) -> bool|None:
+        """
+        True if the last observation in file_path is more than hours_offset old, None when the
+        manifest doesn't know the file and the caller has to load it to decide.
+        """
+        entry = self.entry(file_path)
+        if entry is None:
+            return None
+        if entry['last_date'] is None:
+            return True
+        return WaterYearInfo.is_current_datetime_greater(np.datetime64(entry['last_date']), hours_offset=hours_offset)
+
+
+default_manifest: Manifest|None = None
+default_manifest_lock = threading.Lock()
+
+
+def get_manifest() -> Manifest:
+    global default_manifest
+    with default_manifest_lock:
+        if default_manifest is None:
+            default_manifest = Manifest()
+        return default_manifest
+
+
+def record(file_path:Path, a:np.ndarray|None, url:str|None=None) -> dict|None:
+    return get_manifest().record(file_path, a, url=url)
+
+
+def entry(file_path:Path) -> dict|None:
+    return get_manifest().entry(file_path)
+
+
+def is_stale(file_path:Path, hours_offset:int=48) -> bool|None:
+    return get_manifest().is_stale(file_path, hours_offset=hours_offset)
@@ -0,0 +1,188 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import threading
+import time
+import warnings
+import numpy as np
+from pathlib import Path
+from source import sidecar
+
+# Elevation-area-capacity tables, loaded once per process into one sorted (elevation, area, capacity)
+# float64 array per reservoir and cached as a .npy sidecar under cache/, so later runs skip parsing
+# the text.  Lookups are np.interp over the table, a scalar or a whole daily series in one call.
+#
+# Tables come from the USGS CSV releases in data/Colorado_River.  The XML next to the Powell tables
+# is their FGDC metadata, it describes the columns but holds no table rows.
+
+table_dtype = [('elevation', 'f8'), ('area', 'f8'), ('capacity', 'f8')]
+
+# name: (csv path, elevation column, area column, capacity column)
+tables = {
+    'powell': ('data/Colorado_River/Lake_Powell_2018_ElevAreaCap_interp.csv',
+               'Elevation_ft_NAVD88', 'Area_acres', 'Capacity_acrefeet'),
+}
+
+
+class ReservoirGeometry(object):
+    def __init__(self, name:str, table:np.ndarray):
+        self.name = name
+        if np.any(np.diff(table['elevation']) < 0):
+            table = table[np.argsort(table['elevation'], kind='stable')]
+        self.table = table
+        self.elevation = np.ascontiguousarray(self.table['elevation'])
+        self.area = np.ascontiguousarray(self.table['area'])
+        self.capacity = np.ascontiguousarray(self.table['capacity'])
+        # Capacity is non-decreasing with elevation, capacity_to_elevation inverts the same table
+        self.capacity_sorted = np.maximum.accumulate(self.capacity)
+
+    def __str__(self):
+        return (f'{self.name} {len(self.table)} rows {self.elevation[0]:.2f}-{self.elevation[-1]:.2f} ft '
+                f'{self.capacity[-1]:,.0f} af')
+
+    @staticmethod
+    def from_csv(name:str, csv_path, elevation_column:str, area_column:str, capacity_column:str):
+        csv_path = Path(csv_path)
+        arrays = sidecar.load(csv_path, ['eac'])
+        if arrays is not None:
+            return ReservoirGeometry(name, np.asarray(arrays['eac']))
+        with open(csv_path) as f:
+            header = f.readline().strip().split(',')
+        columns = [header.index(column) for column in (elevation_column, area_column, capacity_column)]
+        values = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=columns, ndmin=2)
+        values = values[~np.isnan(values[:, 0]) & ~np.isnan(values[:, 2])]
+        table = np.zeros(len(values), table_dtype)
+        table['elevation'] = values[:, 0]
+        table['area'] = values[:, 1]
+        table['capacity'] = values[:, 2]
+        sidecar.save(csv_path, {'eac': table})
+        return ReservoirGeometry(name, table)
+
+    def check_range(self, x, bounds:np.ndarray, units:str):
+        x = np.asarray(x, dtype=np.float64)
+        outside = (x < bounds[0]) | (x > bounds[-1])
+        if np.any(outside):
+            first = x[outside].flat[0]
+            raise ValueError(f'{self.name} {first} {units} is outside table range '
+                             f'({bounds[0]:.2f} to {bounds[-1]:.2f} {units})')
+        return x
+
+    def lookup(self, x, xp:np.ndarray, fp:np.ndarray, units:str, bounds_error:bool):
+        # Scalars in, float out.  Out of range values raise, or are NaN when bounds_error is False
+        if bounds_error:
+            x = self.check_range(x, xp, units)
+            result = np.interp(x, xp, fp)
+        else:
+            x = np.asarray(x, dtype=np.float64)
+            result = np.interp(x, xp, fp, left=np.nan, right=np.nan)
+        if result.ndim == 0:
+            return float(result)
+        return result
+
+    def elevation_to_capacity(self, feet, bounds_error:bool=True):
+        return self.lookup(feet, self.elevation, self.capacity, 'ft', bounds_error)
+
+    def elevation_to_area(self, feet, bounds_error:bool=True):
+        return self.lookup(feet, self.elevation, self.area, 'ft', bounds_error)
+
+    def capacity_to_elevation(self, af, bounds_error:bool=True):
+        return self.lookup(af, self.capacity_sorted, self.elevation, 'af', bounds_error)
+
+
+geometries = {}
+geometries_lock = threading.Lock()
+
+
+def register(name:str, csv_path, elevation_column:str, area_column:str, capacity_column:str):
+    with geometries_lock:
+        tables[name] = (csv_path, elevation_column, area_column, capacity_column)
+        geometries.pop(name, None)
+
+
+def get_geometry(name:str='powell') -> ReservoirGeometry:
+    with geometries_lock:
+        geometry = geometries.get(name)
+        if geometry is None:
+            csv_path, elevation_column, area_column, capacity_column = tables[name]
+            geometry = ReservoirGeometry.from_csv(name, csv_path, elevation_column, area_column, capacity_column)
+            geometries[name] = geometry
+        return geometry
+
+
+def get_lake_powell_capacity(
+    elevation_ft,
+    csv_path: str = "data/Colorado_River/Lake_Powell_2018_ElevAreaCap_interp.csv",
+    elev_col: str = "Elevation_ft_NAVD88",
+    cap_col: str = "Capacity_acrefeet",
+    navd88: bool = True
+):
+    """
+    Returns active storage capacity in acre-feet for a given elevation (ft NAVD 88), or an array of
+    them for an array of elevations, using the USGS 2018 Lake Powell elevation-area-capacity table.
+
+    Example usage:
+        capacity = get_lake_powell_capacity(3650.5)
+        print(f"At 3650.5 ft: {capacity:,.0f} af")
+    """
+    if not navd88:
+        warnings.warn("Elevations should be in NAVD 88 datum per 2018 USGS data.")
+    name = 'powell'
+    if (csv_path, elev_col, cap_col) != (tables[name][0], tables[name][1], tables[name][3]):
+        name = f'{csv_path}:{elev_col}:{cap_col}'
+        if name not in tables:
+            register(name, csv_path, elev_col, 'Area_acres', cap_col)
+    return get_geometry(name).elevation_to_capacity(elevation_ft)
+
+
+def benchmark(name:str='powell', iterations:int=10, days:int=365 * 40):
+    """
+    Time a capacity lookup the way the sheets used to do it, pandas read_csv and a scipy interp1d
+    per call, against a cached scalar lookup and a vectorized lookup of a whole daily series.
+    """
+    import pandas as pd
+    from scipy.interpolate import interp1d
+
+    csv_path, elevation_column, area_column, capacity_column = tables[name]
+    geometry = get_geometry(name)
+    elevation = (geometry.elevation[0] + geometry.elevation[-1]) / 2
+    series = np.random.default_rng(0).uniform(geometry.elevation[0], geometry.elevation[-1], days)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        df = pd.read_csv(csv_path).sort_values(elevation_column)
+        reference = float(interp1d(df[elevation_column], df[capacity_column], kind='linear')(elevation))
+    per_call_secs = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations * 1000):
+        cached = geometry.elevation_to_capacity(elevation)
+    cached_secs = (time.perf_counter() - start) / (iterations * 1000)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        capacities = geometry.elevation_to_capacity(series)
+    series_secs = (time.perf_counter() - start) / iterations
+
+    if not np.isclose(reference, cached, rtol=1e-12):
+        print(f'reservoir_geometry benchmark mismatch {reference} {cached}')
+    print(f'{geometry}\n  read_csv + interp1d: {per_call_secs * 1000:8.2f} ms  cached: {cached_secs * 1e6:8.2f} us'
+          f'  {days} days: {series_secs * 1000:8.2f} ms ({series_secs / days * 1e9:.1f} ns/day)')
+    return per_call_secs, cached_secs, series_secs
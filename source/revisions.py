@@ -0,0 +1,78 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import numpy as np
+from datetime import datetime
+from pathlib import Path
+from source.sidecar import cache_file_path
+
+# Append only revision history of a cache file, kept under the sidecar cache directory.  Each refresh that changes or removes
+# days already in the cache appends one fixed size record per changed day: when the refresh
+# happened, the day, the cached value and the new value (NaN when the day was removed).  New days
+# appended to the end of a series are not revisions and are not recorded.
+
+revision_dtype = np.dtype([('refresh', 'datetime64[s]'), ('dt', 'datetime64[s]'), ('old', 'f'), ('new', 'f')])
+
+
+def revision_path(file_path:Path) -> Path:
+    return cache_file_path(file_path, '.rev')
+
+
+def append(file_path:Path, changed:np.ndarray, removed:np.ndarray, refresh:datetime|None=None) -> int:
+    """
+    Record changed (dt, old, new) and removed (dt, old, new) days of one refresh of file_path.
+    Returns the number of revisions written.
+    """
+    if refresh is None:
+        refresh = datetime.now()
+    count = len(changed) + len(removed)
+    if not count:
+        return 0
+    a = np.zeros(count, revision_dtype)
+    a['refresh'] = np.datetime64(refresh, 's')
+    a['dt'][:len(changed)] = changed['dt']
+    a['old'][:len(changed)] = changed['old']
+    a['new'][:len(changed)] = changed['new']
+    a['dt'][len(changed):] = removed['dt']
+    a['old'][len(changed):] = removed['old']
+    a['new'][len(changed):] = np.nan
+    path = revision_path(file_path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'ab') as f:
+            a.tofile(f)
+    except OSError as e:
+        print(f'revisions append failed {path} {e}')
+        return 0
+    return count
+
+
+def load(file_path:Path) -> np.ndarray:
+    # Every revision of file_path in the order recorded, empty if it has never been revised
+    path = revision_path(file_path)
+    if not path.exists():
+        return np.zeros(0, revision_dtype)
+    return np.fromfile(path, dtype=revision_dtype)
+
+
+def revised_days(file_path:Path) -> np.ndarray:
+    # Days revised at least once, e.g. provisional values later approved with a different value
+    return np.unique(load(file_path)['dt'])
@@ -0,0 +1,243 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from source import fetch
+from source.usbr_rise import request_catalog_pages
+
+# Local index of USBR RISE catalog records and items in SQLite with a full text index over titles,
+# parameter names, units and timesteps.  update() fetches catalog pages and items concurrently and
+# only fetches items that are new or whose catalog record changed, so lookups like
+# item_id('Lake Powell / Storage / daily') resolve without the network.  A record's update date is only
+# advanced once all of its items were fetched, and records and items that left the catalog are removed
+# when every catalog page was read.
+
+catalog_path = Path('cache/USBR_RISE/catalog.sqlite')
+rise_url = 'https://data.usbr.gov'
+
+unified_region_upper_colorado = 7
+unified_region_lower_colorado = 8
+theme_water = 1
+
+schema = [
+    '''CREATE TABLE IF NOT EXISTS records (
+        record_id INTEGER PRIMARY KEY,
+        title TEXT,
+        unified_region_id INTEGER,
+        theme_id INTEGER,
+        update_date TEXT,
+        fetched REAL,
+        attributes TEXT)''',
+    '''CREATE TABLE IF NOT EXISTS items (
+        item_id INTEGER PRIMARY KEY,
+        record_id INTEGER,
+        title TEXT,
+        parameter_name TEXT,
+        parameter_unit TEXT,
+        parameter_timestep TEXT,
+        temporal_start_date TEXT,
+        temporal_end_date TEXT,
+        fetched REAL,
+        attributes TEXT)''',
+    'CREATE INDEX IF NOT EXISTS items_record_id ON items (record_id)',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        record_title, title, parameter_name, parameter_unit, parameter_timestep)''',
+]
+
+
+def catalog_id(path:str) -> int:
+    # '/rise/api/catalog-item/509' -> 509
+    return int(path.rstrip('/').rsplit('/', 1)[-1])
+
+
+def request_catalog_item(item_path:str) -> dict|None:
+    url = rise_url + item_path
+    r = fetch.get(url)
+    if r.status_code == 200:
+        try:
+            return json.loads(r.content.decode('utf-8'))['data']['attributes']
+        except (ValueError, KeyError):
+            print('rise_catalog item json error: ', url)
+    else:
+        print('rise_catalog item request failed with response: ', r.status_code, ' ', r.reason)
+    return None
+
+
+def fts_query(query:str) -> str:
+    # 'Lake Powell / Storage / daily' -> '"Lake Powell" "Storage" "daily"', every part must match
+    parts = [part.strip().replace('"', '""') for part in query.split('/')]
+    return ' '.join(f'"{part}"' for part in parts if part)
+
+
+class RiseCatalog(object):
+    def __init__(self, path:Path=catalog_path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            for statement in schema:
+                self.connection.execute(statement)
+        self.lookups: dict[tuple, list] = {}
+
+    def close(self):
+        self.connection.close()
+
+    def update(self, unified_region_id:int, theme_id:int=0, refresh:bool=False) -> int:
+        """
+        Fetch the catalog records of a region and every item not yet indexed, or of records whose
+        updateDate changed since the last update.  refresh=True refetches every item.
+        Returns the number of items fetched.
+        """
+        records, complete = request_catalog_pages(self.path, unified_region_id, theme_id)
+        now = time.time()
+
+        with self.lock:
+            previous = {row['record_id']: row['update_date']
+                        for row in self.connection.execute('SELECT record_id, update_date FROM records')}
+            indexed = {row['item_id'] for row in self.connection.execute('SELECT item_id FROM items')}
+
+        item_paths = []
+        record_titles = {}
+        record_ids = {}
+        record_rows = {}
+        for record in records:
+            try:
+                attributes = record['attributes']
+                record_id = int(attributes['_id'])
+                item_refs = record['relationships']['catalogItems']['data']
+            except (KeyError, TypeError, ValueError):
+                print('rise_catalog record key error: ', record.get('id'))
+                complete = False
+                continue
+            update_date = attributes.get('updateDate')
+            changed = refresh or previous.get(record_id, '') != update_date
+            for item_ref in item_refs:
+                item_id = catalog_id(item_ref['id'])
+                record_titles[item_id] = attributes.get('recordTitle', '')
+                record_ids[item_id] = record_id
+                if changed or item_id not in indexed:
+                    item_paths.append(item_ref['id'])
+            record_rows[record_id] = [record_id, attributes.get('recordTitle', ''), unified_region_id, theme_id,
+                                      update_date, now, json.dumps(attributes)]
+
+        items = fetch.run_all(request_catalog_item, item_paths)
+
+        with self.lock, self.connection:
+            fetched = 0
+            for item_path, attributes in zip(item_paths, items):
+                item_id = catalog_id(item_path)
+                if attributes is None:
+                    # Keep the record's previous update date so the next update fetches its items again
+                    record_rows[record_ids[item_id]][4] = previous.get(record_ids[item_id])
+                    continue
+                row = (item_id, record_ids[item_id], attributes.get('itemTitle', ''), attributes.get('parameterName', ''),
+                       attributes.get('parameterUnit', ''), attributes.get('parameterTimestep', ''),
+                       attributes.get('temporalStartDate'), attributes.get('temporalEndDate'), now,
+                       json.dumps(attributes))
+                self.connection.execute('INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+                self.connection.execute('DELETE FROM items_fts WHERE rowid = ?', (item_id,))
+                self.connection.execute('INSERT INTO items_fts (rowid, record_title, title, parameter_name, '
+                                        'parameter_unit, parameter_timestep) VALUES (?, ?, ?, ?, ?, ?)',
+                                        (item_id, record_titles[item_id], row[2], row[3], row[4], row[5]))
+                fetched += 1
+            self.connection.executemany('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                        [tuple(row) for row in record_rows.values()])
+            if complete:
+                self.prune(unified_region_id, theme_id, set(record_rows), set(record_ids))
+            self.lookups.clear()
+        return fetched
+
+    def prune(self, unified_region_id:int, theme_id:int, record_ids:set[int], item_ids:set[int]):
+        # Remove the region's records and items no longer in the catalog, caller holds the lock and transaction
+        region_records = [row['record_id'] for row in self.connection.execute(
+            'SELECT record_id FROM records WHERE unified_region_id = ? AND theme_id = ?', (unified_region_id, theme_id))]
+        removed_records = [(record_id,) for record_id in region_records if record_id not in record_ids]
+        region_record_ids = set(region_records) | record_ids
+        removed_items = [(row['item_id'],) for row in self.connection.execute('SELECT item_id, record_id FROM items')
+                         if row['record_id'] in region_record_ids and row['item_id'] not in item_ids]
+        self.connection.executemany('DELETE FROM records WHERE record_id = ?', removed_records)
+        self.connection.executemany('DELETE FROM items WHERE item_id = ?', removed_items)
+        self.connection.executemany('DELETE FROM items_fts WHERE rowid = ?', removed_items)
+        if removed_records or removed_items:
+            print(f'rise_catalog removed {len(removed_records)} records {len(removed_items)} items')
+
+    def find(self, query:str, limit:int=20) -> list[dict]:
+        """
+        Items matching every '/' separated part of query, best match first, e.g. 'Lake Powell / Storage / daily'.
+        Results are memoized until the next update().
+        """
+        key = (query, limit)
+        result = self.lookups.get(key)
+        if result is None:
+            with self.lock:
+                rows = self.connection.execute(
+                    'SELECT items.item_id, items_fts.record_title, items.title, items.parameter_name, '
+                    'items.parameter_unit, items.parameter_timestep, items.temporal_start_date, '
+                    'items.temporal_end_date FROM items_fts JOIN items ON items.item_id = items_fts.rowid '
+                    'WHERE items_fts MATCH ? ORDER BY rank LIMIT ?', (fts_query(query), limit)).fetchall()
+            result = [dict(row) for row in rows]
+            self.lookups[key] = result
+        return result
+
+    def item_id(self, query:str) -> int|None:
+        items = self.find(query, limit=1)
+        if items:
+            return items[0]['item_id']
+        return None
+
+    def item(self, item_id:int) -> dict|None:
+        with self.lock:
+            row = self.connection.execute('SELECT * FROM items WHERE item_id = ?', (item_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(row)
+
+
+default_catalog: RiseCatalog|None = None
+
+
+def get_catalog() -> RiseCatalog:
+    global default_catalog
+    if default_catalog is None:
+        default_catalog = RiseCatalog()
+    return default_catalog
+
+
+def update(refresh:bool=False) -> int:
+    # Index the Upper and Lower Colorado water catalogs the basins and sheets use
+    rise_catalog = get_catalog()
+    fetched = rise_catalog.update(unified_region_upper_colorado, theme_water, refresh=refresh)
+    fetched += rise_catalog.update(unified_region_lower_colorado, theme_water, refresh=refresh)
+    return fetched
+
+
+def find(query:str, limit:int=20) -> list[dict]:
+    return get_catalog().find(query, limit=limit)
+
+
+def item_id(query:str) -> int|None:
+    return get_catalog().item_id(query)
@@ -0,0 +1,206 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Any
+
+# In process cache of loaded series, shared by every sheet and model in a run so a gage or RISE item
+# loaded by several of them is parsed once.  Entries are keyed by (source, series id, parameter, stat,
+# range, units), where range is a date range, a water year range or the cache file a series was
+# read from, and units also tells apart array layouts of the same values.  Each entry remembers the mtime of the files it was loaded from and is dropped when any
+# of them changes.  Least recently used entries are evicted once the arrays held exceed
+# budget_bytes.
+#
+# Arrays are handed out read only, a consumer that needs to modify one copies it first.  Arrays memory
+# mapped from a read only sidecar are cached as they are, not copied, and don't count against the budget,
+# the OS pages them in and out.  Arrays in meta, such as qualification codes, are frozen and counted the
+# same way.
+
+enabled = True
+budget_bytes = 512 * 1024 * 1024
+
+
+def series_key(source:str, series_id, parameter:str='', stat:str='', start='', end='', units:str='') -> tuple:
+    return source, str(series_id), parameter or '', stat or '', str(start), str(end), units or ''
+
+
+def file_mtime(path) -> int|None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def read_only(a:np.ndarray) -> np.ndarray:
+    # A view of a read only array, it can't be made writable again
+    view = a.view()
+    view.flags.writeable = False
+    return view
+
+
+def is_mapped(a:np.ndarray) -> bool:
+    while a is not None:
+        if isinstance(a, np.memmap):
+            return True
+        a = getattr(a, 'base', None)
+    return False
+
+
+def freeze(a:np.ndarray) -> tuple[np.ndarray, int]:
+    # (read only array nothing else can write into, heap bytes it holds)
+    if is_mapped(a) and not a.flags.writeable:
+        return a, 0
+    if a.flags.writeable:
+        a = a.copy()
+        a.flags.writeable = False
+    return a, a.nbytes
+
+
+def freeze_meta(meta) -> tuple[Any, int]:
+    # meta with every array in it frozen, and the bytes they hold
+    if isinstance(meta, np.ndarray):
+        return freeze(meta)
+    if isinstance(meta, (tuple, list)):
+        frozen = [freeze_meta(value) for value in meta]
+        return type(meta)(value for value, nbytes in frozen), sum(nbytes for value, nbytes in frozen)
+    if isinstance(meta, dict):
+        frozen = {key: freeze_meta(value) for key, value in meta.items()}
+        return {key: value for key, (value, nbytes) in frozen.items()}, sum(nbytes for value, nbytes in frozen.values())
+    return meta, 0
+
+
+class SeriesCache(object):
+    def __init__(self, budget:int=budget_bytes):
+        self.budget = budget
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key:tuple):
+        """
+        (array, meta) for key, or (None, None) if it isn't cached or one of the files it was loaded
+        from has changed since.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+            a, meta, mtimes, nbytes = entry
+            for path, mtime in mtimes:
+                if file_mtime(path) != mtime:
+                    self.remove(key)
+                    self.invalidations += 1
+                    self.misses += 1
+                    return None, None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return read_only(a), meta
+
+    def put(self, key:tuple, a:np.ndarray, meta=None, paths=()) -> np.ndarray:
+        # Cache a, loaded from paths, and return the read only view consumers should use in its place
+        if a is None:
+            return a
+        # Nothing else may write into the cached arrays
+        a, nbytes = freeze(np.asarray(a))
+        meta, meta_nbytes = freeze_meta(meta)
+        nbytes += meta_nbytes
+        if nbytes > self.budget:
+            return read_only(a)
+        mtimes = [(str(path), file_mtime(path)) for path in paths]
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (a, meta, mtimes, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.budget:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+        return read_only(a)
+
+    def remove(self, key:tuple):
+        a, meta, mtimes, nbytes = self.entries.pop(key)
+        self.nbytes -= nbytes
+
+    def invalidate(self, source:str|None=None, series_id=None):
+        # Drop every entry of a series, or of a whole source, or everything
+        with self.lock:
+            for key in list(self.entries):
+                if (source is None or key[0] == source) and (series_id is None or key[1] == str(series_id)):
+                    self.remove(key)
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'entries': len(self.entries), 'bytes': self.nbytes, 'budget': self.budget,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'invalidations': self.invalidations, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"series cache {s['entries']} series {s['bytes'] / 1e6:.1f}/{s['budget'] / 1e6:.0f} MB "
+              f"hits {s['hits']} misses {s['misses']} ({s['hit_rate'] * 100:.0f}%) "
+              f"evictions {s['evictions']} invalidations {s['invalidations']}")
+
+
+default_cache: SeriesCache|None = None
+default_cache_lock = threading.Lock()
+
+
+def get_cache() -> SeriesCache:
+    global default_cache
+    with default_cache_lock:
+        if default_cache is None:
+            default_cache = SeriesCache()
+        return default_cache
+
+
+def get(key:tuple):
+    if not enabled:
+        return None, None
+    return get_cache().get(key)
+
+
+def put(key:tuple, a:np.ndarray, meta=None, paths=()) -> np.ndarray:
+    if not enabled:
+        return a
+    return get_cache().put(key, a, meta=meta, paths=paths)
+
+
+def invalidate(source:str|None=None, series_id=None):
+    if default_cache is not None:
+        default_cache.invalidate(source, series_id)
+
+
+def stats() -> dict:
+    return get_cache().stats()
+
+
+def print_stats():
+    get_cache().print_stats()
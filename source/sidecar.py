@@ -0,0 +1,99 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import os
+import numpy as np
+from pathlib import Path
+
+# Binary .npy sidecars of a text cache file (USGS RDB, USBR RISE JSON).  A sidecar is current when it
+# is at least as new as the text file, so appending to or replacing the text file invalidates it.
+# Sidecars are memory mapped read only, reads are zero copy and a caller that needs to modify an array
+# copies it first.
+#
+# Generated files (sidecars, the store, the manifest, revision histories) live under cache_path, which
+# git ignores, mirroring the data/ directory of the file they were generated from.
+
+cache_path = Path('cache')
+
+
+def cache_file_path(file_path:Path, suffix:str) -> Path:
+    # data/USGS/09380000.rdb -> cache/USGS/09380000<suffix>
+    file_path = Path(file_path)
+    if file_path.is_absolute():
+        try:
+            file_path = file_path.relative_to(Path.cwd())
+        except ValueError:
+            file_path = Path(*file_path.parts[1:])
+    parts = file_path.parent.parts
+    if parts and parts[0] == 'data':
+        parts = parts[1:]
+    return cache_path.joinpath(*parts, file_path.stem + suffix)
+
+
+def sidecar_path(file_path:Path, name:str='') -> Path:
+    if name:
+        return cache_file_path(file_path, f'_{name}.npy')
+    return cache_file_path(file_path, '.npy')
+
+
+def is_current(file_path:Path, names:list[str]) -> bool:
+    file_path = Path(file_path)
+    try:
+        text_mtime = file_path.stat().st_mtime_ns
+        for name in names:
+            if sidecar_path(file_path, name).stat().st_mtime_ns < text_mtime:
+                return False
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def load(file_path:Path, names:list[str]) -> dict[str, np.ndarray] | None:
+    if not is_current(file_path, names):
+        return None
+    arrays = {}
+    try:
+        for name in names:
+            arrays[name] = np.load(sidecar_path(file_path, name), mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError) as e:
+        print(f'sidecar load failed {file_path} {e}')
+        return None
+    return arrays
+
+
+def save(file_path:Path, arrays:dict[str, np.ndarray]) -> None:
+    for name, a in arrays.items():
+        path = sidecar_path(file_path, name)
+        # Write then rename so a reader never maps a partially written sidecar
+        tmp_path = path.with_name(path.name + '.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(a), allow_pickle=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'sidecar save failed {path} {e}')
+            tmp_path.unlink(missing_ok=True)
+
+
+def remove(file_path:Path, names:list[str]) -> None:
+    for name in names:
+        sidecar_path(file_path, name).unlink(missing_ok=True)
@@ -0,0 +1,285 @@
+"""
+Copyright (c) 2026 Ed Millard
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute copies of the Software, and
+to permit persons to whom the Software is furnished to do so, subject to the
+following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+import sqlite3
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from source import series_cache
+
+# Local daily time series store shared by usgs_gage, usbr_rise and cdss.  A series is keyed by
+# (source, series id, parameter, stat) and held as calendar year chunks of 366 float64 values and a
+# presence mask, so a day the source didn't report is distinguishable from a NaN it did report.
+# The coverage table records the date ranges that were fetched whole, a range read is served from
+# the store only when the union of those ranges includes it, and then costs one indexed query over the
+# chunks.  Only a fetch that returned days in its range is recorded, so a failed or empty fetch is
+# fetched again next time.  Overlapping and adjacent ranges are coalesced as they are written.
+
+store_path = Path('cache/store.sqlite')
+enabled = True
+chunk_days = 366
+
+schema = [
+    '''CREATE TABLE IF NOT EXISTS series (
+        series_key INTEGER PRIMARY KEY AUTOINCREMENT,
+        source TEXT NOT NULL,
+        series_id TEXT NOT NULL,
+        parameter TEXT NOT NULL,
+        stat TEXT NOT NULL,
+        name TEXT,
+        info TEXT,
+        first_date TEXT,
+        last_date TEXT,
+        updated REAL,
+        UNIQUE (source, series_id, parameter, stat))''',
+    '''CREATE TABLE IF NOT EXISTS chunks (
+        series_key INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        vals BLOB NOT NULL,
+        present BLOB NOT NULL,
+        PRIMARY KEY (series_key, year)) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS coverage (
+        series_key INTEGER NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        PRIMARY KEY (series_key, start_date, end_date)) WITHOUT ROWID''',
+]
+
+default_dtype = [('dt', 'datetime64[s]'), ('val', 'f')]
+
+
+def year_start(year:int) -> np.datetime64:
+    return np.datetime64(f'{year:04d}-01-01', 'D')
+
+
+def day(date) -> np.datetime64:
+    # date, datetime, 'YYYY-MM-DD' or datetime64 of any unit as a day
+    return np.datetime64(date, 'D')
+
+
+def coalesce(ranges:list[tuple[np.datetime64, np.datetime64]]) -> list[tuple[np.datetime64, np.datetime64]]:
+    # Merge overlapping and adjacent day ranges, inclusive ends
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class TimeSeriesStore(object):
+    def __init__(self, path:Path=store_path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            for statement in schema:
+                self.connection.execute(statement)
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(series)')]
+            if 'info' not in columns:
+                self.connection.execute('ALTER TABLE series ADD COLUMN info TEXT')
+
+    def close(self):
+        self.connection.close()
+
+    def series_key(self, source:str, series_id:str, parameter:str='', stat:str='', create:bool=False) -> int|None:
+        key = (source, str(series_id), parameter or '', stat or '')
+        row = self.connection.execute('SELECT series_key FROM series WHERE source = ? AND series_id = ? '
+                                      'AND parameter = ? AND stat = ?', key).fetchone()
+        if row is None and create:
+            cursor = self.connection.execute('INSERT INTO series (source, series_id, parameter, stat) '
+                                             'VALUES (?, ?, ?, ?)', key)
+            return cursor.lastrowid
+        return row[0] if row is not None else None
+
+    def metadata(self, source:str, series_id:str, parameter:str='', stat:str='') -> dict|None:
+        # name, info (source metadata, i.e. RISE item info JSON), first_date, last_date (last observed day)
+        # and updated (seconds since epoch) of a series
+        with self.lock:
+            row = self.connection.execute('SELECT name, info, first_date, last_date, updated FROM series '
+                                          'WHERE source = ? AND series_id = ? AND parameter = ? AND stat = ?',
+                                          (source, str(series_id), parameter or '', stat or '')).fetchone()
+        if row is None:
+            return None
+        return {'name': row[0], 'info': row[1], 'first_date': row[2], 'last_date': row[3], 'updated': row[4]}
+
+    def covers(self, source:str, series_id:str, parameter:str, stat:str, start_date, end_date) -> bool:
+        """
+        True if the ranges fetched for the series together include start_date..end_date.  An open
+        (None) bound is the start or end of what was fetched, so the stored ranges must be contiguous.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT start_date, end_date FROM coverage JOIN series USING (series_key) WHERE source = ? '
+                'AND series_id = ? AND parameter = ? AND stat = ?',
+                (source, str(series_id), parameter or '', stat or '')).fetchall()
+        if not rows:
+            return False
+        ranges = coalesce([(day(row[0]), day(row[1])) for row in rows])
+        start = day(start_date) if start_date is not None else ranges[0][0]
+        end = day(end_date) if end_date is not None else ranges[-1][1]
+        return any(range_start <= start and end <= range_end for range_start, range_end in ranges)
+
+    def read(self, source:str, series_id:str, parameter:str='', stat:str='', start_date=None, end_date=None,
+             dtype=None) -> np.ndarray:
+        """
+        Days the source reported between start_date and end_date inclusive, as a (dt, val) array
+        of dtype, the usgs_gage/usbr_rise array layout by default.
+        """
+        start = np.datetime64(start_date, 'D') if start_date is not None else np.datetime64('0001-01-01', 'D')
+        end = np.datetime64(end_date, 'D') if end_date is not None else np.datetime64('9999-12-31', 'D')
+        start_year = start.astype(object).year
+        end_year = end.astype(object).year
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT year, vals, present FROM chunks JOIN series USING (series_key) WHERE source = ? '
+                'AND series_id = ? AND parameter = ? AND stat = ? AND year BETWEEN ? AND ? ORDER BY year',
+                (source, str(series_id), parameter or '', stat or '', start_year, end_year)).fetchall()
+
+        dates = []
+        values = []
+        for year, vals, present in rows:
+            mask = np.frombuffer(present, dtype=bool)
+            days = np.flatnonzero(mask)
+            dates.append(year_start(year) + days)
+            values.append(np.frombuffer(vals, dtype=np.float64)[days])
+        a = np.zeros(sum(len(d) for d in dates), dtype if dtype is not None else default_dtype)
+        if len(a):
+            dates = np.concatenate(dates)
+            values = np.concatenate(values)
+            in_range = (dates >= start) & (dates <= end)
+            a = a[:np.count_nonzero(in_range)]
+            a['dt'] = dates[in_range]
+            a['val'] = values[in_range]
+        return a
+
+    def load(self, source:str, series_id:str, parameter:str='', stat:str='', start_date=None, end_date=None,
+             dtype=None) -> np.ndarray|None:
+        # read() if the whole range has been stored, otherwise None and the caller fetches it
+        if not enabled:
+            return None
+        key = series_cache.series_key(source, series_id, parameter, stat, start_date, end_date,
+                                      str(np.dtype(dtype if dtype is not None else default_dtype)))
+        a, meta = series_cache.get(key)
+        if a is not None:
+            return a
+        if not self.covers(source, series_id, parameter, stat, start_date, end_date):
+            return None
+        a = self.read(source, series_id, parameter, stat, start_date, end_date, dtype=dtype)
+        return series_cache.put(key, a)
+
+    def write(self, source:str, series_id:str, parameter:str, stat:str, a:np.ndarray, start_date=None,
+              end_date=None, name:str|None=None, info:str|None=None):
+        """
+        Store the days in a, replacing whatever was stored between start_date and end_date (the range
+        that was fetched, a's first and last days by default) and record the range as covered.
+        Appending newer days rewrites only the chunks they fall in.  Nothing is stored if a has no days
+        in the range, i.e. a failed fetch or NWIS 'No sites found', so the range is fetched again.
+        """
+        if not enabled or a is None or not len(a):
+            return
+        dates = np.asarray(a['dt']).astype('datetime64[D]')
+        values = np.asarray(a['val'], dtype=np.float64)
+        start = day(start_date) if start_date is not None else dates[0]
+        end = day(end_date) if end_date is not None else dates[-1]
+        in_range = (dates >= start) & (dates <= end)
+        if not np.any(in_range):
+            return
+        series_cache.invalidate(source, series_id)
+        dates = dates[in_range]
+        values = values[in_range]
+        years = dates.astype('datetime64[Y]').astype(int) + 1970
+
+        with self.lock, self.connection:
+            series_key = self.series_key(source, series_id, parameter, stat, create=True)
+            for year in range(start.astype(object).year, end.astype(object).year + 1):
+                row = self.connection.execute('SELECT vals, present FROM chunks WHERE series_key = ? AND year = ?',
+                                              (series_key, year)).fetchone()
+                if row is not None:
+                    vals = np.frombuffer(row[0], dtype=np.float64).copy()
+                    present = np.frombuffer(row[1], dtype=bool).copy()
+                else:
+                    vals = np.full(chunk_days, np.nan)
+                    present = np.zeros(chunk_days, dtype=bool)
+                base = year_start(year)
+                first = max(start, base)
+                last = min(end, year_start(year + 1) - 1)
+                present[(first - base).astype(int):(last - base).astype(int) + 1] = False
+                in_year = years == year
+                days = (dates[in_year] - base).astype(int)
+                vals[days] = values[in_year]
+                present[days] = True
+                self.connection.execute('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)',
+                                        (series_key, year, vals.tobytes(), present.tobytes()))
+            ranges = [(day(row[0]), day(row[1])) for row in self.connection.execute(
+                'SELECT start_date, end_date FROM coverage WHERE series_key = ?', (series_key,))]
+            self.connection.execute('DELETE FROM coverage WHERE series_key = ?', (series_key,))
+            self.connection.executemany('INSERT INTO coverage VALUES (?, ?, ?)',
+                                        [(series_key, str(range_start), str(range_end))
+                                         for range_start, range_end in coalesce(ranges + [(start, end)])])
+
+            first_date, last_date = self.connection.execute(
+                'SELECT first_date, last_date FROM series WHERE series_key = ?', (series_key,)).fetchone()
+            if len(dates):
+                if first_date is None or str(dates[0]) < first_date:
+                    first_date = str(dates[0])
+                if last_date is None or str(dates[-1]) > last_date:
+                    last_date = str(dates[-1])
+            self.connection.execute('UPDATE series SET name = COALESCE(?, name), info = COALESCE(?, info), '
+                                    'first_date = ?, last_date = ?, updated = ? WHERE series_key = ?',
+                                    (name, info, first_date, last_date, time.time(), series_key))
+
+
+default_store: TimeSeriesStore|None = None
+default_store_lock = threading.Lock()
+
+
+def get_store() -> TimeSeriesStore:
+    global default_store
+    with default_store_lock:
+        if default_store is None:
+            default_store = TimeSeriesStore()
+        return default_store
+
+
+def load(source:str, series_id:str, parameter:str='', stat:str='', start_date=None, end_date=None, dtype=None):
+    if not enabled:
+        return None
+    return get_store().load(source, series_id, parameter, stat, start_date, end_date, dtype=dtype)
+
+
+def write(source:str, series_id:str, parameter:str, stat:str, a:np.ndarray, start_date=None, end_date=None,
+          name:str|None=None, info:str|None=None):
+    if enabled:
+        get_store().write(source, series_id, parameter, stat, a, start_date, end_date, name=name, info=info)
+
+
+def covers(source:str, series_id:str, parameter:str, stat:str, start_date, end_date) -> bool:
+    return enabled and get_store().covers(source, series_id, parameter, stat, start_date, end_date)
+
+
+def metadata(source:str, series_id:str, parameter:str='', stat:str='') -> dict|None:
+    return get_store().metadata(source, series_id, parameter, stat)
@@ -23,6 +23,7 @@ import datetime
 import numpy as np
 from pathlib import Path
 import calendar
+from rw import aggregate
 from rw.util import multiply_annual, reshape_annual_range, subtract_annual
 from graph.water import WaterGraph
 
@@ -271,78 +272,13 @@ def positive_values(a):
 
 
 def monthly_to_water_year(a, water_year_month=10):
-    dt = datetime.date(1, water_year_month, 1)
-    total = None
-    result = []
-    for o in a:
-        obj = o['dt'].astype(object)
-        if obj.month == water_year_month:
-            if total is not None:
-                result.append([dt, total])
-                total = 0
-            dt = datetime.date(obj.year+1, water_year_month, 1)
-        elif dt.year == 1:
-            if obj.month < water_year_month:
-                dt = datetime.date(obj.year, water_year_month, 1)
-            else:
-                dt = datetime.date(obj.year+1, water_year_month, 1)
-
-        if total:
-            total += o['val']
-        else:
-            total = o['val']
-
-    if total is not None:
-        result.append([dt, total])
-
-    a = np.zeros(len(result), [('dt', 'i'), ('val', 'f')])
-    year = 0
-    if water_year_month == 1:
-        offset = 1
-    else:
-        offset = 0
-    for l in result:
-        # a[day][0] = np.datetime64(l[0])
-        a[year][0] = l[0].year - offset
-        a[year][1] = l[1]
-        year += 1
-
-    return a
+    years, totals = aggregate.monthly_to_water_year(a['dt'], a['val'], water_year_month)
+    return aggregate.to_annual(years, totals)
 
 
 def monthly_to_calendar_year(a):
-    dt = datetime.date(1, 1, 1)
-    total = 0
-    result = []
-    previous_year = 1
-    wrote_year = 1
-    current_year = 1
-    for o in a:
-        obj = o['dt'].astype(object)
-        current_year = obj.year
-        if previous_year == 1:
-            previous_year = current_year
-            dt = datetime.date(current_year, 12, 31)
-        elif previous_year != current_year:
-            result.append([dt, total])
-            wrote_year = previous_year
-            total = 0
-            dt = datetime.date(current_year, 12, 31)
-            previous_year = current_year
-        total += o['val']
-
-    if current_year != wrote_year:
-        result.append([dt, total])
-
-    a = np.zeros(len(result), [('dt', 'i'), ('val', 'f')])
-    year = 0
-
-    for l in result:
-        a[year][0] = l[0].year
-        a[year][1] = l[1]
-        year += 1
-
-    return a
+    years, totals = aggregate.monthly_to_water_year(a['dt'], a['val'], 1)
+    return aggregate.to_annual(years, totals)
 
 
 def diversion_vs_consumptive(state, name, state_name,
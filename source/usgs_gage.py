@@ -20,11 +20,13 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 import datetime
-import requests
+from io import StringIO
+import time
 import numpy as np
 from pathlib import Path
 import pandas as pd
-from source import usbr_report
+from source import fetch, manifest, series_cache, sidecar, store, usbr_report
+from rw import aggregate
 from rw.util import reshape_annual_range
 from source.water_year_info import WaterYearInfo
 
@@ -41,6 +43,20 @@ current_last_year = 2023
 debug = True
 update_gages = False
 
+# Value column flags NWIS writes in place of a number, i.e. ice affected or equipment malfunction
+usgs_value_flags = ['Ice', 'Eqp', 'Bkw', 'Ssn', 'Dis', 'Mnt', 'Rat', 'Fld', 'Pr', 'Tst', 'ZFl', '***', '--']
+
+# Binary sidecars next to each RDB file: daily values, qualification codes and site name
+sidecar_names = ['', 'cd', 'site']
+
+# NWIS daily values service, point this at a local server to stand in for NWIS
+nwis_dv_url = 'https://waterservices.usgs.gov/nwis/dv'
+nwis_max_sites_per_request = 100
+
+# Period of record requests ask for everything NWIS has for a site
+period_of_record_start_date = '1880-01-01'
+period_of_record_path = Path('data/USGS_Gages/POR')
+
 
 def print_last_value(abbrev, a, alias=''):
     # last_date = a['dt'][-1]
@@ -82,6 +98,7 @@ class USGSGage(object):
         self.color = color
 
         self.daily_discharge_cfs = ''
+        self.daily_discharge_codes = None
     # def __del__(self):
 
     @staticmethod
@@ -116,30 +133,44 @@ class USGSGage(object):
     def monthly_af(self, start_year=0, end_year=0):
         return daily_cfs_to_monthly_af(self.daily_discharge(update=update_gages), start_year, end_year)
 
-    def daily_discharge(self, water_year_info=None, update=update_gages, alias='', parameterCd='00060', statCd='00003'):
+    def cache_file_path(self, water_year_info=None) -> Path:
         if water_year_info is not None:
             water_year_string = '_' + str(water_year_info.year)
+        else:
+            water_year_string = ''
+        if water_year_info is not None and water_year_info.is_water_year:
+            file_path = Path('data/USGS_Gages/WY')
+        else:
+            file_path = Path('data/USGS_Gages/')
+        return file_path.joinpath(self.site + water_year_string + '.csv')
+
+    def daily_discharge(self, water_year_info=None, update=update_gages, alias='', parameterCd='00060', statCd='00003'):
+        if water_year_info is not None:
             self.start_date = water_year_info.start_date
             self.end_date = water_year_info.end_date
             if water_year_info.is_current_water_year:
                 update = True
-        else:
-            water_year_string = ''
+            elif not update:
+                stored = store.load('usgs', self.site, parameterCd, statCd, self.start_date, self.end_date)
+                if stored is not None:
+                    metadata = store.metadata('usgs', self.site, parameterCd, statCd)
+                    if metadata['name']:
+                        self.site_name = metadata['name']
+                    self.daily_discharge_cfs = stored
+                    print_last_value(self.site, stored, alias=alias)
+                    return stored
 
         previous_data = None
         new_data = None
-        if water_year_info.is_water_year:
-            file_path = Path('data/USGS_Gages/WY')
-        else:
-            file_path = Path('data/USGS_Gages/')
-
-        file_path = file_path.joinpath(self.site + water_year_string +'.csv')
+        file_path = self.cache_file_path(water_year_info)
         if file_path.exists():
             previous_data = self.load_daily_discharge(file_path, water_year_info, update, parameterCd=parameterCd, statCd=statCd)
             if previous_data is not None and len(previous_data):
                 if water_year_info is not None and water_year_info.is_current_water_year:
-                    last_date = previous_data[-1][0]
-                    update = WaterYearInfo.is_current_datetime_greater(last_date, hours_offset=48)
+                    update = manifest.is_stale(file_path, hours_offset=48)
+                    if update is None:
+                        last_date = previous_data[-1][0]
+                        update = WaterYearInfo.is_current_datetime_greater(last_date, hours_offset=48)
             else:
                 update = True
                 previous_data = None
@@ -162,6 +193,11 @@ class USGSGage(object):
         else:
             daily_discharge = new_data
 
+        # Only a fetch that returned days is stored, an empty or failed one is fetched again next time
+        if water_year_info is not None and daily_discharge is not None and len(daily_discharge) \
+                and self.site_name and not water_year_info.is_current_water_year:
+            store.write('usgs', self.site, parameterCd, statCd, daily_discharge, self.start_date, self.end_date,
+                        name=self.site_name)
         print_last_value(self.site, daily_discharge, alias=alias)
 
         # value_column = f'{parameterCd}_{statCd}'
@@ -173,7 +209,37 @@ class USGSGage(object):
 
         return daily_discharge
 
+    def load_time_series(self, file_path:Path, parameterCd:str ='00060', statCd:str ='00003', url:str|None=None):
+        # url is the request file_path was just fetched with, recorded in the cache manifest
+        key = series_cache.series_key('usgs', self.site, parameterCd, statCd, file_path, units='cfs')
+        a, meta = series_cache.get(key)
+        if a is not None and url is None:
+            self.site_name, self.daily_discharge_codes = meta
+            return a
+        arrays = sidecar.load(file_path, sidecar_names)
+        if arrays is not None:
+            self.site_name = str(arrays['site'][0])
+            self.daily_discharge_codes = arrays['cd']
+            a = arrays['']
+        else:
+            a = self.load_time_series_csv(file_path, parameterCd=parameterCd, statCd=statCd)
+            sidecar.save(file_path, {'': a, 'cd': self.daily_discharge_codes, 'site': np.array([self.site_name])})
+        if url is not None or manifest.entry(file_path) is None:
+            manifest.record(file_path, a, url=url)
+        return series_cache.put(key, a, meta=(self.site_name, self.daily_discharge_codes), paths=[file_path])
+
     def load_time_series_csv(self, filename:str, parameterCd:str ='00060', statCd:str ='00003'):
+        with open(filename) as f:
+            content = f.read()
+        site_name, a, codes = parse_rdb(content, parameterCd=parameterCd, statCd=statCd)
+        if site_name is None:
+            print(f"No sites found matching all criteria {filename}")
+        elif site_name:
+            self.site_name = site_name
+        self.daily_discharge_codes = codes
+        return a
+
+    def load_time_series_csv_per_row(self, filename:str, parameterCd:str ='00060', statCd:str ='00003'):
         date_time_format = "%Y-%m-%d"
 
         f = open(filename, )
@@ -242,18 +308,9 @@ class USGSGage(object):
         return a
 
     def request_daily_discharge(self, file_path, start_date, end_date, append=False, parameterCd='00060', statCd='00003'):
-        url = 'https://waterservices.usgs.gov/nwis/dv?format=rdb&sites='
-        url += self.site
-        url += '&startDT='
-        url += str(start_date)
-        url += '&endDT='
-        url += str(end_date)
-        url += '&parameterCd='
-        url += str(parameterCd)
-        url += '&statCd='
-        url += str(statCd)
+        url = nwis_daily_values_url([self.site], start_date, end_date, parameterCd=parameterCd, statCd=statCd)
         print(f'USGS daily: {file_path} {url}')
-        r = requests.get(url)
+        r = fetch.get(url)
         if r.status_code == 200:
             if r.text.startswith('<!DOCTYPE html>'):
                 print("USGS gage request got HTML response, site number is probably wrong", self.site)
@@ -273,10 +330,12 @@ class USGSGage(object):
                         f = open(file_path, 'w')
                         f.write(r.content.decode("utf-8"))
                     f.close()
+                    return url
                 except FileNotFoundError:
                     print("usgs_get_gage_discharge cache file open failed for site: ", self.site)
         else:
             print('usgs_get_gage_discharge failed with response: ', r.status_code, ' ', r.reason)
+        return None
 
     @staticmethod
     def daily_year_valid(daily_discharge_cfs, water_year_info:WaterYearInfo, file_path:Path|str)-> bool:
@@ -296,12 +355,13 @@ class USGSGage(object):
             if not file_path.exists():
                 print('USGS path doesn\'t exist: ', file_path)
                 return None
-            self.daily_discharge_cfs = self.load_time_series_csv(file_path, parameterCd=parameterCd, statCd=statCd)
+            self.daily_discharge_cfs = self.load_time_series(file_path, parameterCd=parameterCd, statCd=statCd)
             if not self.daily_year_valid(self.daily_discharge_cfs, water_year_info, file_path):
                 print('Gage updating from USGS: ', self.site_name, ' ', water_year_info.start_date, ' to ', water_year_info.end_date)
-                self.request_daily_discharge(file_path, str(water_year_info.start_date), str(water_year_info.end_date), append=False,
-                                             parameterCd=parameterCd, statCd=statCd)
-                self.daily_discharge_cfs = self.load_time_series_csv(file_path)
+                url = self.request_daily_discharge(file_path, str(water_year_info.start_date), str(water_year_info.end_date),
+                                                   append=False, parameterCd=parameterCd, statCd=statCd)
+                self.daily_discharge_cfs = self.load_time_series(file_path, parameterCd=parameterCd, statCd=statCd,
+                                                                 url=url)
                 return self.daily_discharge_cfs
             end_datetime64 = self.daily_discharge_cfs[-1]['dt']
             end_date = end_datetime64.astype(datetime.datetime).date()
@@ -310,9 +370,10 @@ class USGSGage(object):
                 print(end_date, self.end_date, yesterdays_date)
                 end_date += datetime.timedelta(days=1)
                 print('Gage updating from USGS: ', self.site_name, ' ', end_date, ' to ', yesterdays_date)
-                self.request_daily_discharge(file_path, str(end_date), str(yesterdays_date), append=True,
-                                             parameterCd=parameterCd, statCd=statCd)
-                self.daily_discharge_cfs = self.load_time_series_csv(file_path)
+                url = self.request_daily_discharge(file_path, str(end_date), str(yesterdays_date), append=True,
+                                                   parameterCd=parameterCd, statCd=statCd)
+                self.daily_discharge_cfs = self.load_time_series(file_path, parameterCd=parameterCd, statCd=statCd,
+                                                                 url=url)
 
             # daily_discharge_af = convert_cfs_to_af_per_day(self.daily_discharge_cfs)
         else:
@@ -321,6 +382,181 @@ class USGSGage(object):
         return self.daily_discharge_cfs
 
 
+    def period_of_record_file_path(self, parameterCd='00060', statCd='00003') -> Path:
+        return period_of_record_path.joinpath(f'{self.site}_{parameterCd}_{statCd}.csv')
+
+    def period_of_record(self, update=update_gages, parameterCd='00060', statCd='00003'):
+        """
+        Whole record for the gage in one cache file and one NWIS request, water years are sliced
+        from it in memory with water_year_totals() or water_year_last_values().  The tail of the
+        record is appended at most once a day when the last day cached is older than yesterday.
+        """
+        file_path = self.period_of_record_file_path(parameterCd=parameterCd, statCd=statCd)
+        yesterdays_date = datetime.date.today() - datetime.timedelta(days=1)
+        fetched = False
+        url = None
+        if not file_path.exists():
+            fetched = True
+            url = self.request_daily_discharge(file_path, period_of_record_start_date, str(yesterdays_date),
+                                               parameterCd=parameterCd, statCd=statCd)
+            if not file_path.exists():
+                return None
+
+        a = self.load_time_series(file_path, parameterCd=parameterCd, statCd=statCd, url=url)
+        if len(a) and self.site_name:
+            end_date = a['dt'][-1].astype('datetime64[D]').astype(datetime.date)
+            file_age = datetime.datetime.now() - datetime.datetime.fromtimestamp(file_path.stat().st_mtime)
+            if end_date < yesterdays_date and (update or file_age > datetime.timedelta(days=1)):
+                print('Gage updating from USGS: ', self.site_name, ' ', end_date, ' to ', yesterdays_date)
+                url = self.request_daily_discharge(file_path, str(end_date + datetime.timedelta(days=1)),
+                                                   str(yesterdays_date), append=True, parameterCd=parameterCd,
+                                                   statCd=statCd)
+                # Record the attempt even if NWIS had nothing new, i.e. a discontinued gage
+                file_path.touch()
+                fetched = True
+                a = self.load_time_series(file_path, parameterCd=parameterCd, statCd=statCd, url=url)
+
+        if len(a) and (fetched or store.metadata('usgs', self.site, parameterCd, statCd) is None):
+            store.write('usgs', self.site, parameterCd, statCd, a, period_of_record_start_date, a['dt'][-1],
+                        name=self.site_name)
+        self.daily_discharge_cfs = a
+        return a
+
+    def export_water_years(self, start_year, end_year, water_year_month=1, parameterCd='00060', statCd='00003'):
+        """
+        Compatibility export of the period of record to the per water year files daily_discharge() uses
+        """
+        file_path = self.period_of_record_file_path(parameterCd=parameterCd, statCd=statCd)
+        if not file_path.exists():
+            print(f'USGS export_water_years no period of record: {file_path}')
+            return
+        with open(file_path) as f:
+            lines = f.read().split('\n')
+        head_lines = []
+        data_lines = []
+        for line in lines:
+            if line.startswith('USGS'):
+                data_lines.append(line)
+            elif line and not data_lines:
+                head_lines.append(line)
+        years = water_year_ids(np.array([line.split('\t')[2] for line in data_lines], dtype='datetime64[D]'),
+                               water_year_month)
+
+        if water_year_month != 1:
+            export_path = Path('data/USGS_Gages/WY')
+        else:
+            export_path = Path('data/USGS_Gages/')
+        export_path.mkdir(parents=True, exist_ok=True)
+        for year in range(start_year, end_year + 1):
+            indices = np.flatnonzero(years == year)
+            if len(indices):
+                year_path = export_path.joinpath(f'{self.site}_{year}.csv')
+                with open(year_path, 'w') as f:
+                    f.write('\n'.join(head_lines + [data_lines[i] for i in indices]) + '\n')
+
+
+def nwis_daily_values_url(sites:list[str], start_date, end_date, parameterCd='00060', statCd='00003') -> str:
+    url = nwis_dv_url + '?format=rdb&sites='
+    url += ','.join(sites)
+    url += '&startDT='
+    url += str(start_date)
+    url += '&endDT='
+    url += str(end_date)
+    url += '&parameterCd='
+    url += str(parameterCd)
+    url += '&statCd='
+    url += str(statCd)
+    return url
+
+
+def split_multi_site_rdb(content:str) -> dict[str, str]:
+    """
+    Split a multi-site NWIS RDB response into one RDB document per site.  Each site gets the
+    shared comment block, with the site list trimmed to that site so parse_rdb() finds its name,
+    followed by that site's '# Data provided for site' section, header, format line and days.
+    """
+    lines = content.split('\n')
+    section_starts = [i for i, line in enumerate(lines) if line.startswith('# Data provided for site')]
+    if not section_starts:
+        # Single site response
+        for line in lines:
+            if line.startswith('USGS'):
+                return {line.split('\t')[1]: content}
+        return {}
+
+    preamble = lines[:section_starts[0]]
+    section_starts.append(len(lines))
+    documents = {}
+    for start, end in zip(section_starts[:-1], section_starts[1:]):
+        site = lines[start].split()[-1]
+        if site in documents:
+            print(f'split_multi_site_rdb multiple time series for site {site}, using the first')
+            continue
+        site_preamble = [line for line in preamble
+                         if not line.startswith('#    USGS ') or line.startswith(f'#    USGS {site} ')]
+        section = [line for line in lines[start:end] if line]
+        documents[site] = '\n'.join(site_preamble + section) + '\n'
+    return documents
+
+
+def request_daily_discharge_batch(gages:list[USGSGage], water_year_info:WaterYearInfo|None=None,
+                                  start_date=None, end_date=None, period_of_record:bool=False,
+                                  parameterCd='00060', statCd='00003') -> dict[str, bool]:
+    """
+    Fetch daily values for many gages with as few NWIS requests as possible.  Gages sharing a date
+    range are requested together, nwis_max_sites_per_request at a time, and the response is fanned
+    out to each gage's usual cache file: the period of record file, the water year file or the
+    gage's own file.  Returns site -> True if NWIS returned days for that site.
+    """
+    groups: dict[tuple, list[USGSGage]] = {}
+    for gage in gages:
+        if period_of_record:
+            gage_start = period_of_record_start_date
+            gage_end = datetime.date.today() - datetime.timedelta(days=1)
+        elif water_year_info is not None:
+            gage_start = water_year_info.start_date
+            gage_end = water_year_info.end_date
+        else:
+            gage_start = start_date if start_date else gage.start_date
+            gage_end = end_date if end_date else gage.end_date
+        groups.setdefault((str(gage_start), str(gage_end)), []).append(gage)
+
+    results = {gage.site: False for gage in gages}
+    for (group_start, group_end), group in groups.items():
+        for chunk_start in range(0, len(group), nwis_max_sites_per_request):
+            chunk = group[chunk_start:chunk_start + nwis_max_sites_per_request]
+            url = nwis_daily_values_url([gage.site for gage in chunk], group_start, group_end,
+                                        parameterCd=parameterCd, statCd=statCd)
+            print(f'USGS daily batch: {len(chunk)} sites {url}')
+            r = fetch.get(url)
+            if r.status_code != 200:
+                print('usgs request_daily_discharge_batch failed with response: ', r.status_code, ' ', r.reason)
+                continue
+            if r.text.startswith('<!DOCTYPE html>'):
+                print('usgs request_daily_discharge_batch got HTML response, a site number is probably wrong')
+                continue
+
+            documents = split_multi_site_rdb(r.content.decode('utf-8'))
+            for gage in chunk:
+                document = documents.get(gage.site)
+                if document is None:
+                    print(f'usgs request_daily_discharge_batch no data for site: {gage.site}')
+                    continue
+                if period_of_record:
+                    file_path = gage.period_of_record_file_path(parameterCd=parameterCd, statCd=statCd)
+                else:
+                    file_path = gage.cache_file_path(water_year_info)
+                try:
+                    file_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(file_path, 'w') as f:
+                        f.write(document)
+                    results[gage.site] = True
+                except OSError as e:
+                    print(f'usgs request_daily_discharge_batch cache file write failed {file_path} {e}')
+
+    return results
+
+
 def usgs_discharge_mean_column(headers, parameterCd='00060', statCd='00003'):
     discharge_mean_index = 0
     for header in headers:
@@ -347,81 +583,130 @@ def usgs_discharge_mean_code_column(headers, parameterCd='00060', statCd='00003'
     return discharge_mean_index
 
 
-def daily_to_water_year(a, water_year_month=1):
-    dt = datetime.date(1, water_year_month, 1)
-    total = 0
-    result = []
-    for o in a:
-        obj = o['dt'].astype(object)
-        if obj.month == water_year_month and obj.day == 1:
-            if total > 0:
-                result.append([dt, total*1.983459])
-                total = 0
-            dt = datetime.date(obj.year, water_year_month, 1)
-        elif dt.year == 1:
-            if obj.month < water_year_month:
-                dt = datetime.date(obj.year, water_year_month, 1)
-            else:
-                dt = datetime.date(obj.year+1, water_year_month, 1)
+def parse_rdb(content:str, parameterCd:str='00060', statCd:str='00003'):
+    """
+    Parse a USGS NWIS daily values RDB document in a single pass with the pandas C reader.
 
-        if not np.isnan(o['val']):
-            total += o['val']
-        elif debug:
-            print('daily_to_water_year not a number:', o)
+    Returns (site_name, a, codes) where a is a [('dt','datetime64[s]'),('val','f')] array with
+    missing or non-numeric values ('Ice', 'Eqp', '') set to 0.0, the same as the per row parser,
+    and codes is the matching array of qualification codes ('A', 'P', 'A:e'...).
+    site_name is None if NWIS found no sites.
+    """
+    if content.startswith('#  No sites found matching all criteria'):
+        a = np.zeros(1, [('dt', 'datetime64[s]'), ('val', 'f')])
+        return None, a, np.zeros(1, dtype='U1')
+
+    # Comment block is only at the head of the file, appended days start with 'USGS'
+    site_name = ''
+    header_start = 0
+    while content.startswith('#', header_start):
+        line_end = content.find('\n', header_start)
+        if line_end < 0:
+            line_end = len(content)
+        if content.startswith('#    USGS', header_start):
+            site_name = content[header_start:line_end].replace('#    USGS', '')
+        header_start = line_end + 1
+
+    header_end = content.find('\n', header_start)
+    if header_end < 0:
+        header_end = len(content)
+    headers = content[header_start:header_end].split('\t')
+    value_index = usgs_discharge_mean_column(headers, parameterCd=parameterCd, statCd=statCd)
+    code_index = usgs_discharge_mean_code_column(headers, parameterCd=parameterCd, statCd=statCd)
+    if 'datetime' not in headers or value_index >= len(headers):
+        print(f'parse_rdb column not found {parameterCd}_{statCd} {headers}')
+        return site_name, np.zeros(0, [('dt', 'datetime64[s]'), ('val', 'f')]), np.zeros(0, dtype='U1')
+
+    use_columns = ['datetime', headers[value_index]]
+    if code_index < len(headers):
+        use_columns.append(headers[code_index])
+
+    # Skip the RDB field format line ('5s 15s 20d 14n 10s') following the header
+    text_columns = {column: str for column in use_columns if column != headers[value_index]}
+    df = pd.read_csv(StringIO(content[header_start:]), sep='\t', skiprows=[1], usecols=use_columns,
+                     dtype=text_columns, na_values=usgs_value_flags, engine='c')
+
+    values = df[headers[value_index]]
+    if not pd.api.types.is_numeric_dtype(values):
+        # Non-numeric flags like 'Ice' or 'Eqp' in the value column
+        values = pd.to_numeric(values, errors='coerce')
+
+    a = np.zeros(len(df), [('dt', 'datetime64[s]'), ('val', 'f')])
+    a['dt'] = df['datetime'].to_numpy().astype('datetime64[s]')
+    a['val'] = values.fillna(0.0).to_numpy()
+    if len(use_columns) > 2:
+        codes = df[use_columns[2]].fillna('').to_numpy(dtype=str)
+    else:
+        codes = np.full(len(df), '', dtype='U1')
+    return site_name, a, codes
+
+
+def benchmark_rdb_parsers(file_path:Path|str, iterations:int=10, parameterCd:str='00060', statCd:str='00003'):
+    gage = USGSGage('', None, start_date='1900-01-01', end_date='2100-12-31')
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        per_row = gage.load_time_series_csv_per_row(file_path, parameterCd=parameterCd, statCd=statCd)
+    per_row_secs = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        vectorized = gage.load_time_series_csv(file_path, parameterCd=parameterCd, statCd=statCd)
+    vectorized_secs = (time.perf_counter() - start) / iterations
+
+    if not np.array_equal(per_row['dt'], vectorized['dt']) or not np.array_equal(per_row['val'], vectorized['val']):
+        print(f'benchmark_rdb_parsers {file_path} parsers differ')
+    print(f'{file_path} {len(vectorized)} days  per row: {per_row_secs * 1000:8.2f} ms'
+          f'  vectorized: {vectorized_secs * 1000:8.2f} ms  {per_row_secs / vectorized_secs:5.1f}x')
+    return per_row_secs, vectorized_secs
+
+
+def water_year_ids(dates:np.ndarray, water_year_month:int=1) -> np.ndarray:
+    # Water years are named for the calendar year they end in, calendar years for themselves
+    return aggregate.water_year_ids(dates, water_year_month)
+
+
+def water_year_totals(a, start_year:int, end_year:int, water_year_month:int=1, multiplier:float=1.983459) -> np.ndarray:
+    """
+    Sum daily values into water years start_year..end_year in one pass, cfs to af by default.
+    NaN days are skipped and years without data are zero, matching daily_to_water_year() on per year files.
+    """
+    return aggregate.water_year_range(a['dt'], a['val'], start_year, end_year, water_year_month, multiplier=multiplier)
 
-    if total > 0:
-        result.append([dt, total*1.983459])
 
-    a = np.zeros(len(result), [('dt', 'i'), ('val', 'f')])
-    year = 0
-    for l in result:
-        # a[day][0] = np.datetime64(l[0])
-        a[year][0] = l[0].year
-        a[year][1] = l[1]
-        year += 1
+def water_year_last_values(a, start_year:int, end_year:int, water_year_month:int=1, missing:float=0.0) -> np.ndarray:
+    # Value on the last day of each water year with data, missing for years without data
+    years = water_year_ids(a['dt'], water_year_month)
+    wanted = np.arange(start_year, end_year + 1)
+    last_indices = np.searchsorted(years, wanted, side='right') - 1
+    result = np.full(len(wanted), missing, dtype=np.float64)
+    valid = last_indices >= 0
+    valid[valid] = years[last_indices[valid]] == wanted[valid]
+    result[valid] = a['val'][last_indices[valid]]
+    return result
 
-    return a
 
+def daily_to_water_year(a, water_year_month=1):
+    # Daily cfs to af per water year.  A water year beginning on its first day is labelled with the year it
+    # starts in, a partial first year by whether it starts before water_year_month
+    years, totals = aggregate.daily_to_water_year(a['dt'], a['val'], water_year_month,
+                                                  multiplier=aggregate.af_per_cfs_day)
+    if debug and np.isnan(a['val']).any():
+        print('daily_to_water_year not a number:', a[np.isnan(a['val'])])
+    if water_year_month != 1:
+        years = years - 1
+    if len(years):
+        first = a['dt'][0].astype(object)
+        if not (first.month == water_year_month and first.day == 1):
+            years[0] = first.year if first.month < water_year_month else first.year + 1
+    positive = totals > 0
+    return aggregate.to_annual(years[positive], totals[positive])
 
-def daily_cfs_to_monthly_af(a, start_year=0, end_year=0):
-    obj = a[0]['dt'].astype(object)
-    dt = datetime.date(obj.year, obj.month, obj.day)
-    month = obj.month
-    year = obj.year
-
-    total = 0
-    result = []
-    for o in a:
-        obj = o['dt'].astype(object)
-        if obj.month != month:
-            if start_year == 0 and end_year == 0:
-                result.append([dt, round(total)])
-            else:
-                if start_year <= year <= end_year:
-                    result.append([dt, round(total)])
-            total = 0
-            month = obj.month
-        if obj.year != year:
-            year = obj.year
-        af = o['val'] * 1.983459
-        total += af
-        dt = datetime.date(obj.year, obj.month, obj.day)
-
-    if total > 0:
-        if start_year == 0 and end_year == 0:
-            result.append([dt, round(total)])
-        else:
-            if start_year <= obj.year <= end_year:
-                result.append([dt, round(total)])
 
-    a = np.empty(len(result), [('dt', 'datetime64[s]'), ('val', 'f')])
-    month = 0
-    for l in result:
-        a[month][0] = l[0]
-        a[month][1] = l[1]
-        month += 1
+def daily_cfs_to_monthly_af(a, start_year=0, end_year=0):
+    # Monthly af dated by the last day of each month with data, rounded to whole af
+    return aggregate.daily_to_monthly_af(a, start_year, end_year, multiplier=aggregate.af_per_cfs_day)
 
-    return a
 
 def convert_cfs_to_af_per_day(cfs):
     af = np.empty(len(cfs), [('dt', 'datetime64[s]'), ('val', 'f')])
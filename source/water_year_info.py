@@ -20,13 +20,25 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 import calendar
-from datetime import date, datetime, timedelta
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import pytz
+import threading
 from typing import List, Tuple, Union, Any
+from zoneinfo import ZoneInfo
+from source import revisions
 
+# (dt, old, new) rows returned by WaterYearInfo.diff_arrays()
+diff_dtype = np.dtype([('dt', 'datetime64[s]'), ('old', 'f'), ('new', 'f')])
+
+denver_tz = ZoneInfo('America/Denver')
+
+# Keep the full copy of a cache file that was revised, as diff_data always has.  Revisions are also recorded
+# in the revision history, set this False to keep only that
+keep_backups = True
 
 
 class WaterYearInfo:
@@ -171,21 +183,53 @@ class WaterYearInfo:
         Returns:
             bool: True if current datetime is greater than given datetime + 24 hours, False otherwise
         """
-        # Convert numpy.datetime64 to pandas Timestamp
-        given_date = pd.Timestamp(given_date)
-
-        # Convert to timezone-aware datetime in America/Denver
-        denver_tz = pytz.timezone('America/Denver')
-        given_date_tz = given_date.tz_localize(denver_tz)
+        # Naive datetime64 is local Denver time, compare in UTC so the offset is elapsed hours across DST changes
+        given_date = np.datetime64(given_date, 'us').astype(datetime).replace(tzinfo=denver_tz)
+        target_date = given_date.astimezone(timezone.utc) + timedelta(hours=hours_offset)
+        return datetime.now(timezone.utc) > target_date
 
-        # Add 24 hours
-        target_date = given_date_tz + timedelta(hours=hours_offset)
-
-        # Get current datetime in America/Denver
-        current_date = pd.Timestamp.now(tz=denver_tz)
+    @staticmethod
+    def diff_arrays(previous_data: np.ndarray, new_data: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compare two (dt, val) daily arrays by date without leaving numpy.
 
-        # Return comparison result
-        return current_date > target_date
+        Returns:
+            (changed, added, removed) arrays of diff_dtype (dt, old, new) in date order, changed holds days
+            in both arrays whose values differ, added days only in new_data and removed days only in
+            previous_data.  Missing values are NaN and NaN compares equal to NaN.
+        """
+        dates1 = np.asarray(previous_data['dt']).astype('datetime64[s]')
+        dates2 = np.asarray(new_data['dt']).astype('datetime64[s]')
+        values1 = np.asarray(previous_data['val'], dtype='f')
+        values2 = np.asarray(new_data['val'], dtype='f')
+
+        common, index1, index2 = np.intersect1d(dates1, dates2, return_indices=True)
+        old = values1[index1]
+        new = values2[index2]
+        differ = ~((old == new) | (np.isnan(old) & np.isnan(new)))
+
+        only1 = np.ones(len(dates1), dtype=bool)
+        only1[index1] = False
+        only2 = np.ones(len(dates2), dtype=bool)
+        only2[index2] = False
+
+        changed = np.zeros(np.count_nonzero(differ), diff_dtype)
+        changed['dt'] = common[differ]
+        changed['old'] = old[differ]
+        changed['new'] = new[differ]
+
+        added = np.zeros(np.count_nonzero(only2), diff_dtype)
+        added['dt'] = dates2[only2]
+        added['old'] = np.nan
+        added['new'] = values2[only2]
+        added.sort(order='dt')
+
+        removed = np.zeros(np.count_nonzero(only1), diff_dtype)
+        removed['dt'] = dates1[only1]
+        removed['old'] = values1[only1]
+        removed['new'] = np.nan
+        removed.sort(order='dt')
+        return changed, added, removed
 
     @staticmethod
     def compare_ndarray_containers(
@@ -193,77 +237,47 @@ class WaterYearInfo:
             container2: Any
     ) -> List[Tuple[str, Union[float, None], Union[float, None]]]:
         """
-        Compare two NdArrayItemContainers with (datetime64, float) tuples and return dates where
+        Compare two (datetime64, float) daily arrays and return dates where
         float values differ or one container has a datetime the other doesn't.
 
         Args:
-            container1: NdArrayItemContainer with (np.datetime64, float) tuples
-            container2: NdArrayItemContainer with (np.datetime64, float) tuples
+            container1: structured array with 'dt' and 'val' fields
+            container2: structured array with 'dt' and 'val' fields
 
         Returns:
             List of tuples (date_str, float1, float2) where float values differ or one is None
         """
+        changed, added, removed = WaterYearInfo.diff_arrays(container1, container2)
 
-        def extract_items(container: Any) -> dict:
-            """Extract datetime64 and float pairs into a dictionary, handling NdArrayItemContainer."""
-            items = {}
-            try:
-                for item in container:
-                    # Ensure item has two elements (datetime64, float)
-                    if len(item) != 2:
-                        continue  # Skip malformed items to avoid errors
-                    date, value = item
-                    # Convert to np.datetime64 if not already
-                    date = np.datetime64(date)
-                    # Ensure value is float or None
-                    value = float(value) if value is not None else None
-                    items[date] = value
-            except (TypeError, ValueError) as e:
-                # Log warning but continue processing
-                print(f"Warning: Error processing item in container: {e}")
-            return items
-
-        # Extract items from both containers
-        dict1 = extract_items(container1)
-        dict2 = extract_items(container2)
-
-        # Get all unique dates
-        all_dates = set(dict1.keys()).union(set(dict2.keys()))
-
-        # List to store differences
-        differences = []
-
-        for date in sorted(all_dates):
-            val1 = dict1.get(date, None)
-            val2 = dict2.get(date, None)
-
-            # Check if values differ or one is missing
-            if val1 != val2:
-                # Convert datetime64 to string, removing microseconds
-                date_str = str(pd.Timestamp(date)).split('.')[0]
-                differences.append((date_str, val1, val2))
+        def rows(diffs: np.ndarray, has_old: bool, has_new: bool) -> list:
+            dates = [str(pd.Timestamp(dt)).split('.')[0] for dt in diffs['dt']]
+            olds = diffs['old'].tolist() if has_old else [None] * len(diffs)
+            news = diffs['new'].tolist() if has_new else [None] * len(diffs)
+            return list(zip(dates, olds, news))
 
+        differences = rows(changed, True, True) + rows(added, False, True) + rows(removed, True, False)
+        differences.sort(key=lambda difference: difference[0])
         return differences
 
     @staticmethod
     def diff_data(previous_data, new_data, file_path, old_file_moved_path):
-        has_diffs = False
-        has_updates = False
-
-        diffs = WaterYearInfo.compare_ndarray_containers(previous_data, new_data)
-        if diffs:
-            for diff in diffs:
-                if diff[1] is not None:
-                    has_diffs = True
-                else:
-                    has_updates = True
-            if has_diffs:
-                print(f'\t{file_path} differ, backed up to {old_file_moved_path}: {diffs}')
-            else:
-                print(f'usbr rise load {file_path} updated: {diffs}')
-                if old_file_moved_path is not None and old_file_moved_path.exists():
-                    old_file_moved_path.unlink(missing_ok=True)
-        else:
+        """
+        Diff a refreshed cache file against its previous contents.  Changed and removed days are appended
+        to the file's revision history, the full copy backup in old_file_moved_path is kept only when
+        keep_backups is set.  Returns (has_diffs, has_updates).
+        """
+        changed, added, removed = WaterYearInfo.diff_arrays(previous_data, new_data)
+        has_diffs = len(changed) > 0 or len(removed) > 0
+        has_updates = len(added) > 0
+
+        if has_diffs:
+            revisions.append(file_path, changed, removed)
+            print(f'\t{file_path} {len(changed)} days revised, {len(removed)} removed, '
+                  f'recorded in {revisions.revision_path(file_path)}')
+        elif has_updates:
+            print(f'usbr rise load {file_path} updated: {len(added)} days through {added["dt"][-1]}')
+
+        if not (has_diffs and keep_backups):
             if old_file_moved_path is not None and old_file_moved_path.exists():
                 old_file_moved_path.unlink(missing_ok=True)
 
@@ -318,35 +332,139 @@ class WaterYearInfo:
 
     @staticmethod
     def index_for_month_day(datetime_arr, target_month, target_day):
-        dt_objects = [np.datetime64(dt).astype(object) for dt in datetime_arr]
-        months = np.array([dt.month for dt in dt_objects])
-        days = np.array([dt.day for dt in dt_objects])
-        match_idx = np.where((months == target_month) & (days == target_day))[0]
-        if len(match_idx) == 0:
-            idx = None
-        else:
-            idx = match_idx[0]
-        return idx
+        return WaterYearCalendar.for_dates(datetime_arr).index(target_month, target_day)
 
     @staticmethod
     def day_for_date(datetime_arr, date_str):
-        if date_str == 'Feb-29':
-            dt = datetime.strptime('Feb-28', '%b-%d')
-            day_of_month = 29
-        else:
-            dt = datetime.strptime(date_str, '%b-%d')
-            day_of_month = dt.day
-        month = dt.month
-        day = WaterYearInfo.index_for_month_day(datetime_arr, month, day_of_month)
-        if day is None:
-            day = len(datetime_arr)
-        return day
+        return WaterYearCalendar.for_dates(datetime_arr).day_for_label(date_str)
 
     @staticmethod
     def format_to_month_day(dt64, leading_zeroes=True):
+        if isinstance(dt64, np.datetime64):
+            month_start = dt64.astype('datetime64[M]')
+            day_of_month = int((dt64.astype('datetime64[D]') - month_start).astype(int)) + 1
+            month = int(month_start.astype(int)) % 12 + 1
+            return month_day_labels[(month, day_of_month, leading_zeroes)]
         ts = pd.to_datetime(dt64)
+        return format_month_day(ts.month, ts.day, leading_zeroes)
+
+
+def format_month_day(month:int, day:int, leading_zeroes:bool=True) -> str:
+    if leading_zeroes:
+        return f'{calendar.month_abbr[month]}-{day:02d}'
+    return f'{calendar.month_abbr[month]}-{day}'
+
+
+# 'Mon-DD' labels by (month, day, leading zeroes), format_to_month_day is called per day.  Built once for
+# every day of a leap year so it never grows
+month_day_labels = {(month, day, leading_zeroes): format_month_day(month, day, leading_zeroes)
+                    for month in range(1, 13) for day in range(1, calendar.monthrange(2000, month)[1] + 1)
+                    for leading_zeroes in (True, False)}
+
+
+def parse_month_day(label:str) -> tuple[int, int]:
+    # 'Oct-01' -> (10, 1), 'Feb-29' is valid whatever the year
+    month_str, _, day_str = label.strip().partition('-')
+    month = month_numbers.get(month_str.lower())
+    if month is None or not day_str.isdigit() or not 1 <= int(day_str) <= calendar.monthrange(2000, month)[1]:
+        raise ValueError(f"time data '{label}' does not match format '%b-%d'")
+    return month, int(day_str)
+
+
+month_numbers = {calendar.month_abbr[month].lower(): month for month in range(1, 13)}
+
+
+class WaterYearCalendar:
+    """
+    Day index <-> date <-> 'Mon-DD' label <-> day of water year for one array of dates, built once
+    with datetime64 arithmetic.  Feb-29 only has an index in a leap year, looking it up in any other
+    year gives None, or len(dates) from day_for_label() as day_for_date() always has.
+    """
+    # Least recently used calendars, oldest first, by date content and by the identity of the dates object
+    # passed.  An identity entry holds a reference to its dates so the id can't be reused while it is cached,
+    # dates are not modified once a calendar has been built for them.
+    cache = OrderedDict()
+    identities = OrderedDict()
+    cache_size = 64
+    cache_lock = threading.Lock()
+
+    def __init__(self, dates, water_year_month:int|None=None):
+        self.dates = np.asarray(dates).astype('datetime64[D]')
+        month_starts = self.dates.astype('datetime64[M]')
+        months_since_1970 = month_starts.astype(np.int64)
+        self.months = months_since_1970 % 12 + 1
+        self.days = (self.dates - month_starts).astype(np.int64) + 1
+        years = self.dates.astype('datetime64[Y]').astype(np.int64) + 1970
+        self.is_leap = (years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0))
+
+        if water_year_month is None:
+            water_year_month = int(self.months[0]) if len(self.dates) else 1
+        self.water_year_month = water_year_month
+        water_year_starts = months_since_1970 - (months_since_1970 - (water_year_month - 1)) % 12
+        self.day_of_water_year = (self.dates - water_year_starts.astype('datetime64[M]')).astype(np.int64)
+
+        abbreviations = np.array([''] + [calendar.month_abbr[month] for month in range(1, 13)])
+        days_str = self.days.astype(str)
+        self.labels = np.char.add(np.char.add(abbreviations[self.months], '-'), np.char.zfill(days_str, 2)).tolist()
+        self.labels_no_zeroes = np.char.add(np.char.add(abbreviations[self.months], '-'), days_str).tolist()
+
+        # First index of each month/day
+        month_days, first = np.unique(self.months * 100 + self.days, return_index=True)
+        self.first_index = dict(zip(month_days.tolist(), first.tolist()))
+        self.label_days = {}
+
+    @staticmethod
+    def content_key(dates, water_year_month:int|None):
+        days = np.asarray(dates).astype('datetime64[D]')
+        return days, (days.tobytes(), water_year_month)
+
+    @staticmethod
+    def for_dates(dates, water_year_month:int|None=None):
+        # Calendars are shared by every caller passing the same dates.  A dates object seen before is
+        # found by identity, only a new one is converted and hashed
+        identity_key = (id(dates), water_year_month)
+        with WaterYearCalendar.cache_lock:
+            entry = WaterYearCalendar.identities.get(identity_key)
+            if entry is not None and entry[0] is dates:
+                WaterYearCalendar.identities.move_to_end(identity_key)
+                if entry[2] in WaterYearCalendar.cache:
+                    WaterYearCalendar.cache.move_to_end(entry[2])
+                return entry[1]
+        days, key = WaterYearCalendar.content_key(dates, water_year_month)
+        with WaterYearCalendar.cache_lock:
+            found = WaterYearCalendar.cache.get(key)
+            if found is not None:
+                WaterYearCalendar.cache.move_to_end(key)
+        if found is None:
+            found = WaterYearCalendar(days, water_year_month)
+        with WaterYearCalendar.cache_lock:
+            WaterYearCalendar.cache[key] = found
+            WaterYearCalendar.cache.move_to_end(key)
+            WaterYearCalendar.identities[identity_key] = (dates, found, key)
+            WaterYearCalendar.identities.move_to_end(identity_key)
+            for cache in (WaterYearCalendar.cache, WaterYearCalendar.identities):
+                while len(cache) > WaterYearCalendar.cache_size:
+                    cache.popitem(last=False)
+        return found
+
+    def __len__(self):
+        return len(self.dates)
+
+    def index(self, month:int, day:int) -> int|None:
+        return self.first_index.get(month * 100 + day)
+
+    def day_for_label(self, label:str) -> int:
+        # Index of the first date with a 'Mon-DD' label, len(dates) when no date has it
+        day = self.label_days.get(label)
+        if day is None:
+            month, day_of_month = parse_month_day(label)
+            day = self.index(month, day_of_month)
+            if day is None:
+                day = len(self.dates)
+            self.label_days[label] = day
+        return day
+
+    def label(self, day:int, leading_zeroes:bool=True) -> str:
         if leading_zeroes:
-            string = f"{ts.strftime('%b')}-{ts.day:02d}"
-        else:
-            string = f"{ts.strftime('%b')}-{ts.day}"
-        return string
+            return self.labels[day]
+        return self.labels_no_zeroes[day]
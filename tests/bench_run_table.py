@@ -0,0 +1,41 @@
+import time
+
+import numpy as np
+
+from api.run_table import DRAIN, RunTable, merge_queue
+from tests.pool_runs import legacy_merge, random_queue
+
+# python -m tests.bench_run_table
+
+
+def benchmark(sizes:tuple=(60, 1000, 20000), iterations:int=5):
+    """
+    Time the PoolQueue drain merge against the table round trip build_pool_runs would need, from_runs,
+    merge_adjacent and to_queue, and against merge_adjacent alone on a table already built.  The queue
+    merge extends the paper drains of the runs it merges, each pass gets a freshly built queue.
+    """
+    for runs in sizes:
+        dates = [np.datetime64('2000-10-01') + day for day in range(max(366, runs * 5))]
+        repeat = max(iterations, 2000 // runs)
+        legacy_secs = round_trip_secs = merge_secs = 0.0
+        for _ in range(repeat):
+            pool_queue = random_queue(np.random.default_rng(runs), DRAIN, runs, dates)
+            start = time.perf_counter()
+            merge_queue(pool_queue)
+            round_trip_secs += time.perf_counter() - start
+
+            table = RunTable.from_runs(pool_queue)
+            start = time.perf_counter()
+            table.merge_adjacent()
+            merge_secs += time.perf_counter() - start
+
+            start = time.perf_counter()
+            legacy_merge(pool_queue)
+            legacy_secs += time.perf_counter() - start
+
+        print(f'run table {runs:6d} drain runs: queue merge {legacy_secs / repeat * 1000:8.3f} ms  '
+              f'round trip {round_trip_secs / repeat * 1000:8.3f} ms  table merge {merge_secs / repeat * 1000:8.3f} ms')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,17 @@
+import pytest
+from source import manifest, series_cache, store
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Cache files live under a relative data/ directory, the manifest and store under cache/, run each test
+    # in its own directory with fresh module defaults so nothing touches the repo's data
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(manifest, 'default_manifest', None)
+    monkeypatch.setattr(store, 'default_store', None)
+    monkeypatch.setattr(series_cache, 'default_cache', None)
+    yield tmp_path
+    if store.default_store is not None:
+        store.default_store.close()
+    if manifest.default_manifest is not None:
+        manifest.default_manifest.close()
@@ -0,0 +1,58 @@
+import contextlib
+import io
+
+from api.pool import DateValue, DrainRun, DrainType, EvapRun, FillRun, FillType, PoolQueue
+from api.run_table import DRAIN, FILL
+
+# Random fill, drain and evap queues shared by the RunTable tests and the run table benchmark
+
+
+def legacy_merge(pool_queue:PoolQueue)->PoolQueue:
+    # The queue's own merge_adjacent_*_runs for its kind, their printing discarded
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if pool_queue and isinstance(pool_queue[0], FillRun):
+            return pool_queue.merge_adjacent_fill_runs()
+        elif pool_queue and isinstance(pool_queue[0], DrainRun):
+            return pool_queue.merge_adjacent_drain_runs()
+        return pool_queue.merge_adjacent_evap_runs()
+
+
+def random_queue(rng, kind:int, runs:int, dates:list)->PoolQueue:
+    # runs random runs of kind FILL, DRAIN or EVAP, mostly following one another for the same variable
+    pool_queue = PoolQueue()
+    day = 0
+    names = ['A', 'B']
+    for _ in range(runs):
+        if rng.random() < 0.3:
+            day += int(rng.integers(0, 3))
+        variable_name = names[int(rng.integers(0, len(names)))] if rng.random() < 0.1 else names[0]
+        length = int(rng.integers(1, 4))
+        if kind == FILL:
+            run = FillRun(variable_name, [FillType.FILL, FillType.PAPER_FILL][int(rng.integers(0, 2))], day, dates)
+            run.target = float(rng.uniform(0, 100))
+            if run.fill_type == FillType.PAPER_FILL:
+                for _ in range(length):
+                    run.append_paper_fill(float(rng.uniform(0, 5)), f'd{day}')
+        elif kind == DRAIN:
+            run = DrainRun(variable_name, [DrainType.DRAIN, DrainType.PAPER_DRAIN, DrainType.TRANSFER][int(rng.integers(0, 3))], day, dates)
+            if run.drain_type != DrainType.DRAIN:
+                for _ in range(length):
+                    run.append_paper_drain(float(rng.uniform(0, 5)), f'd{day}')
+            if rng.random() < 0.2:
+                run.overdrafts.append(DateValue(f'd{day}', float(rng.uniform(-5, 0))))
+        else:
+            run = EvapRun(variable_name, day, dates)
+        run.end_day = day + length
+        run.complete_day = int(rng.integers(0, 365))
+        run.complete_remaining_cfs = float(rng.uniform(0, 10))
+        run.paper_start_cfs = float(rng.uniform(0, 10))
+        run.paper_end_cfs = float(rng.uniform(0, 10))
+        run.still_in_progress = bool(rng.random() < 0.1)
+        if kind == FILL and rng.random() < 0.2:
+            run.date_values.append(DateValue(f'd{day}', float(rng.uniform(0, 5))))
+        elif kind == DRAIN and run.drain_type == DrainType.TRANSFER:
+            run.transfer_to = names[int(rng.integers(0, len(names)))]
+        pool_queue.append(run)
+        day += length
+    return pool_queue
@@ -0,0 +1,310 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from graph.water import WaterGraph
+from rw import aggregate
+from source import usbr_report, usbr_rise, usgs_gage
+
+# The per record loops rw.aggregate replaced, kept here as the reference the vectorized versions must match
+
+
+def legacy_annual(result, offset=0):
+    a = np.zeros(len(result), [('dt', 'i'), ('val', 'f')])
+    for year, l in enumerate(result):
+        a[year][0] = l[0].year - offset
+        a[year][1] = l[1]
+    return a
+
+
+def legacy_monthly(result):
+    a = np.empty(len(result), [('dt', 'datetime64[s]'), ('val', 'f')])
+    for month, l in enumerate(result):
+        a[month][0] = l[0]
+        a[month][1] = l[1]
+    return a
+
+
+def legacy_daily_to_water_year(a, water_year_month, multiplier, split_month=None, next_year=False):
+    # usgs_gage and usbr_rise daily_to_water_year differ only in the month they split on and
+    # how a year beginning on its first day is labelled
+    split_month = split_month or water_year_month
+    dt = datetime.date(1, water_year_month, 1)
+    total = 0
+    result = []
+    for o in a:
+        obj = o['dt'].astype(object)
+        if obj.month == split_month and obj.day == 1:
+            if total > 0:
+                result.append([dt, total * multiplier])
+                total = 0
+            year = obj.year + 1 if next_year else obj.year
+            dt = datetime.date(year, water_year_month, 1)
+        elif dt.year == 1:
+            if obj.month < water_year_month:
+                dt = datetime.date(obj.year, water_year_month, 1)
+            else:
+                dt = datetime.date(obj.year + 1, water_year_month, 1)
+        if not np.isnan(o['val']):
+            total += o['val']
+    if total > 0:
+        result.append([dt, total * multiplier])
+    return legacy_annual(result)
+
+
+def legacy_graph_daily_to_water_year(a, water_year_month):
+    dt = datetime.date(1, water_year_month, 1)
+    total = 0
+    result = []
+    for o in a:
+        obj = o['dt'].astype(object)
+        if obj.month == water_year_month and obj.day == 1:
+            if total > 0:
+                result.append([dt, total])
+                total = 0
+            if water_year_month == 1:
+                dt = datetime.date(obj.year, water_year_month, 1)
+            else:
+                dt = datetime.date(obj.year + 1, water_year_month, 1)
+        elif dt.year == 1:
+            if obj.month < water_year_month or water_year_month == 1:
+                dt = datetime.date(obj.year, water_year_month, 1)
+            else:
+                dt = datetime.date(obj.year + 1, water_year_month, 1)
+        if not np.isnan(o['val']):
+            total += o['val']
+    if total > 0:
+        result.append([dt, total])
+    return legacy_annual(result)
+
+
+def legacy_daily_to_calendar_year(a):
+    dt = datetime.date(1, 1, 1)
+    total = 0
+    result = []
+    for o in a:
+        obj = o['dt'].astype(object)
+        y = o['val']
+        if np.isnan(y):
+            y = 0
+        if dt.year != obj.year:
+            if total > 0:
+                result.append([dt, total])
+                total = 0
+            dt = datetime.date(obj.year, 12, 31)
+        total += y
+    if total > 0:
+        result.append([dt, total])
+    return legacy_annual(result)
+
+
+def legacy_daily_to_monthly_af(a, start_year, end_year, multiplier, skip_nan):
+    obj = a[0]['dt'].astype(object)
+    dt = datetime.date(obj.year, obj.month, obj.day)
+    month = obj.month
+    year = obj.year
+    total = 0
+    result = []
+    for o in a:
+        obj = o['dt'].astype(object)
+        if obj.month != month:
+            if (start_year == 0 and end_year == 0) or start_year <= year <= end_year:
+                result.append([dt, round(total)])
+            total = 0
+            month = obj.month
+        if obj.year != year:
+            year = obj.year
+        af = o['val'] * multiplier
+        if not (skip_nan and np.isnan(af)):
+            total += af
+        dt = datetime.date(obj.year, obj.month, obj.day)
+    if total > 0:
+        if (start_year == 0 and end_year == 0) or start_year <= obj.year <= end_year:
+            result.append([dt, round(total)])
+    return legacy_monthly(result)
+
+
+def legacy_monthly_to_water_year(a, water_year_month):
+    dt = datetime.date(1, water_year_month, 1)
+    total = None
+    result = []
+    for o in a:
+        obj = o['dt'].astype(object)
+        if obj.month == water_year_month:
+            if total is not None:
+                result.append([dt, total])
+                total = 0
+            dt = datetime.date(obj.year + 1, water_year_month, 1)
+        elif dt.year == 1:
+            if obj.month < water_year_month:
+                dt = datetime.date(obj.year, water_year_month, 1)
+            else:
+                dt = datetime.date(obj.year + 1, water_year_month, 1)
+        if total:
+            total += o['val']
+        else:
+            total = o['val']
+    if total is not None:
+        result.append([dt, total])
+    return legacy_annual(result, offset=1 if water_year_month == 1 else 0)
+
+
+def legacy_monthly_to_calendar_year(a):
+    dt = datetime.date(1, 1, 1)
+    total = 0
+    result = []
+    previous_year = 1
+    wrote_year = 1
+    current_year = 1
+    for o in a:
+        obj = o['dt'].astype(object)
+        current_year = obj.year
+        if previous_year == 1:
+            previous_year = current_year
+            dt = datetime.date(current_year, 12, 31)
+        elif previous_year != current_year:
+            result.append([dt, total])
+            wrote_year = previous_year
+            total = 0
+            dt = datetime.date(current_year, 12, 31)
+            previous_year = current_year
+        total += o['val']
+    if current_year != wrote_year:
+        result.append([dt, total])
+    return legacy_annual(result)
+
+
+def random_daily(rng, nan_fraction=0.05):
+    start = np.datetime64('1990-01-01') + rng.integers(0, 365 * 20)
+    days = start + np.arange(rng.integers(1, 2000))
+    a = np.zeros(len(days), [('dt', 'datetime64[s]'), ('val', 'f')])
+    a['dt'] = days
+    a['val'] = rng.uniform(0.0, 5000.0, len(days))
+    a['val'][rng.random(len(days)) < nan_fraction] = np.nan
+    return a
+
+
+def random_monthly(rng, nan_fraction=0.0):
+    start = np.datetime64('1990-01') + rng.integers(0, 12 * 20)
+    months = start + np.arange(rng.integers(1, 120))
+    a = np.zeros(len(months), [('dt', 'datetime64[s]'), ('val', 'f')])
+    a['dt'] = months.astype('datetime64[D]')
+    a['val'] = rng.uniform(1.0, 50000.0, len(months))
+    a['val'][rng.random(len(months)) < nan_fraction] = np.nan
+    return a
+
+
+def assert_annual_equal(actual, expected):
+    assert actual.dtype == expected.dtype
+    np.testing.assert_array_equal(actual['dt'], expected['dt'])
+    np.testing.assert_allclose(actual['val'], expected['val'], rtol=1e-5)
+
+
+def assert_monthly_equal(actual, expected):
+    np.testing.assert_array_equal(actual['dt'], expected['dt'])
+    # Totals are rounded to whole af, a float32 accumulation can land on the other side of .5
+    np.testing.assert_allclose(actual['val'], expected['val'], rtol=1e-5, atol=1.0)
+
+
+seeds = range(40)
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_usgs_gage_daily_to_water_year(seed):
+    rng = np.random.default_rng(seed)
+    a = random_daily(rng)
+    for water_year_month in (1, 10):
+        expected = legacy_daily_to_water_year(a, water_year_month, 1.983459)
+        assert_annual_equal(usgs_gage.daily_to_water_year(a, water_year_month), expected)
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_usbr_rise_daily_to_water_year(seed):
+    rng = np.random.default_rng(seed)
+    a = random_daily(rng)
+    for water_year_month in (1, 10):
+        expected = legacy_daily_to_water_year(a, water_year_month, 1.0, split_month=10,
+                                              next_year=True)
+        assert_annual_equal(usbr_rise.daily_to_water_year(a, water_year_month), expected)
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_graph_daily_to_water_year(seed):
+    rng = np.random.default_rng(seed)
+    a = random_daily(rng)
+    for water_year_month in (1, 10):
+        expected = legacy_graph_daily_to_water_year(a, water_year_month)
+        assert_annual_equal(WaterGraph.daily_to_water_year(a, water_year_month), expected)
+    assert_annual_equal(WaterGraph.daily_to_calendar_year(a), legacy_daily_to_calendar_year(a))
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_daily_to_monthly_af(seed):
+    rng = np.random.default_rng(seed)
+    a = random_daily(rng)
+    first_year = a['dt'][0].astype(object).year
+    for start_year, end_year in ((0, 0), (first_year + 1, first_year + 2)):
+        expected = legacy_daily_to_monthly_af(a, start_year, end_year, 1.0, skip_nan=True)
+        assert_monthly_equal(usbr_rise.daily_af_to_monthly_af(a, start_year, end_year), expected)
+    # usgs_gage never skipped NaN days, compare on a series without them
+    a = random_daily(rng, nan_fraction=0.0)
+    first_year = a['dt'][0].astype(object).year
+    for start_year, end_year in ((0, 0), (first_year + 1, first_year + 2)):
+        expected = legacy_daily_to_monthly_af(a, start_year, end_year, 1.983459, skip_nan=False)
+        assert_monthly_equal(usgs_gage.daily_cfs_to_monthly_af(a, start_year, end_year), expected)
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_monthly_to_year(seed):
+    rng = np.random.default_rng(seed)
+    a = random_monthly(rng, nan_fraction=0.02)
+    for water_year_month in (1, 10):
+        expected = legacy_monthly_to_water_year(a, water_year_month)
+        assert_annual_equal(usbr_report.monthly_to_water_year(a, water_year_month), expected)
+    assert_annual_equal(usbr_report.monthly_to_calendar_year(a), legacy_monthly_to_calendar_year(a))
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_water_year_range_matches_per_year_sums(seed):
+    rng = np.random.default_rng(seed)
+    a = random_daily(rng)
+    years = aggregate.water_year_ids(a['dt'], 10)
+    start_year, end_year = int(years[0]) - 1, int(years[-1]) + 1
+    totals = usgs_gage.water_year_totals(a, start_year, end_year, water_year_month=10)
+    expected = [np.nansum(a['val'][years == year].astype(np.float64)) * 1.983459
+                for year in range(start_year, end_year + 1)]
+    np.testing.assert_allclose(totals, expected, rtol=1e-9)
+
+
+def per_year_slices(a, start_year, end_year, water_year_month):
+    # What usgs_annuals and usgs_value read one water year file at a time
+    years = aggregate.water_year_ids(a['dt'], water_year_month)
+    return [(year, a[years == year]) for year in range(start_year, end_year + 1)]
+
+
+def test_usgs_period_of_record_matches_per_year_path():
+    days = np.arange(np.datetime64('2015-10-01'), np.datetime64('2021-10-01'))
+    a = np.zeros(len(days), [('dt', 'datetime64[s]'), ('val', 'f')])
+    a['dt'] = days
+    a['val'] = np.random.default_rng(0).uniform(100.0, 5000.0, len(days))
+    years = aggregate.water_year_ids(a['dt'], 10)
+    a['val'][years == 2017] = 0.0
+    a['val'][years == 2018] = -10.0
+    a = a[years != 2020]
+    start_year, end_year = 2016, 2021
+
+    totals = usgs_gage.water_year_totals(a, start_year, end_year, water_year_month=10)
+    period_annuals = np.where(totals > 0, totals, 0)
+    period_last = usgs_gage.water_year_last_values(a, start_year, end_year, water_year_month=10, missing=np.nan)
+
+    for i, (year, daily) in enumerate(per_year_slices(a, start_year, end_year, 10)):
+        annual_af = usgs_gage.daily_to_water_year(daily, water_year_month=10)
+        expected = annual_af[0][1] if len(annual_af) == 1 else 0
+        assert period_annuals[i] == pytest.approx(expected, rel=1e-5)
+        if len(daily):
+            assert period_last[i] == daily[-1][1]
+        else:
+            assert np.isnan(period_last[i])
+    assert list(period_annuals[1:3]) == [0, 0]
+    assert period_annuals[4] == 0 and np.isnan(period_last[4])
@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+
+from rw import util
+from rw.annual import AnnualSeries
+
+# The rw.util helpers as they were before AnnualSeries, kept here as the reference
+
+
+def legacy_annual_zeroed_for_years(year_min, year_max):
+    years = year_max - year_min + 1
+    a = np.zeros(years, [('dt', 'i'), ('val', 'f')])
+    for year in range(year_min, year_max + 1):
+        year_index = year - year_min
+        a[year_index][0] = year
+        a[year_index][1] = 0
+    return a
+
+
+def legacy_reshape_annual_range(a, year_min, year_max):
+    b = legacy_annual_zeroed_for_years(year_min, year_max)
+    for year_val in a:
+        year = year_val[0]
+        if year_min <= year <= year_max:
+            b[year - year_min][1] = year_val[1]
+    return b
+
+
+def legacy_reshape_annual_range_to(a, to):
+    if len(a) == 0:
+        return legacy_annual_zeroed_for_years(to[0][0], to[-1][0])
+    if a['dt'][0] == to['dt'][0] and a['dt'][-1] == to['dt'][-1]:
+        return a
+    return legacy_reshape_annual_range(a, to['dt'][0], to['dt'][-1])
+
+
+def legacy_subtract_annual(minuend, subtrahend, start_year=0, end_year=0):
+    subtrahend = legacy_reshape_annual_range_to(subtrahend, minuend)
+    difference = np.zeros(len(minuend), [('dt', 'i'), ('val', 'f')])
+    difference['dt'] = minuend['dt']
+    difference['val'] = minuend['val'] - subtrahend['val']
+    if start_year and end_year:
+        difference = legacy_reshape_annual_range(difference, start_year, end_year)
+    return difference
+
+
+def legacy_add_annual(augend, addend, start_year=0, end_year=0):
+    addend = legacy_reshape_annual_range_to(addend, augend)
+    summation = np.zeros(len(augend), [('dt', 'i'), ('val', 'f')])
+    summation['dt'] = augend['dt']
+    summation['val'] = augend['val'] + addend['val']
+    if start_year and end_year:
+        summation = legacy_reshape_annual_range(summation, start_year, end_year)
+    return summation
+
+
+def legacy_add3_annual(augend, addend, addend2, start_year=0, end_year=0):
+    summation = np.zeros(len(augend), [('dt', 'i'), ('val', 'f')])
+    summation['dt'] = augend['dt']
+    summation['val'] = augend['val'] + addend['val']
+    summation['val'] = summation['val'] + addend2['val']
+    if start_year and end_year:
+        summation = legacy_reshape_annual_range(summation, start_year, end_year)
+    return summation
+
+
+def legacy_multiply_annual(a, multiplier, start_year=0, end_year=0):
+    result = np.zeros(len(a), [('dt', 'i'), ('val', 'f')])
+    result['dt'] = a['dt']
+    result['val'] = a['val'] * multiplier
+    if start_year and end_year:
+        result = legacy_reshape_annual_range(result, start_year, end_year)
+    return result
+
+
+def legacy_add_annuals(arrays):
+    result = legacy_add_annual(arrays[0], arrays[1])
+    for a in arrays[2:]:
+        result = legacy_add_annual(result, a)
+    return result
+
+
+def legacy_replace_annual(a, b):
+    for source in b:
+        for target in a:
+            if target['dt'] == source['dt']:
+                target['val'] = source['val']
+                break
+
+
+def legacy_flow_for_year(a, year):
+    for target in a:
+        if target['dt'] == year:
+            return target['val']
+    return 0
+
+
+def annual(years, rng):
+    a = np.zeros(len(years), [('dt', 'i'), ('val', 'f')])
+    a['dt'] = years
+    a['val'] = rng.uniform(-1e6, 1e6, len(years))
+    return a
+
+
+def random_annual(rng, gaps=False):
+    start_year = int(rng.integers(1950, 2000))
+    years = np.arange(start_year, start_year + int(rng.integers(1, 40)))
+    if gaps and len(years) > 2:
+        keep = rng.random(len(years)) < 0.7
+        keep[0] = keep[-1] = True
+        years = years[keep]
+    return annual(years, rng)
+
+
+def assert_annual_equal(actual, expected):
+    np.testing.assert_array_equal(actual['dt'], expected['dt'])
+    np.testing.assert_allclose(actual['val'], expected['val'], rtol=1e-6, atol=1e-2)
+
+
+seeds = range(30)
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_add_subtract_multiply_match_legacy(seed):
+    rng = np.random.default_rng(seed)
+    a = random_annual(rng)
+    b = random_annual(rng)
+    start_year, end_year = int(a['dt'][0]) - 3, int(a['dt'][-1]) + 3
+    for year_range in ((0, 0), (start_year, end_year)):
+        assert_annual_equal(util.add_annual(a, b, *year_range), legacy_add_annual(a, b, *year_range))
+        assert_annual_equal(util.subtract_annual(a, b, *year_range), legacy_subtract_annual(a, b, *year_range))
+        assert_annual_equal(util.multiply_annual(a, 0.75, *year_range), legacy_multiply_annual(a, 0.75, *year_range))
+        assert_annual_equal(util.reshape_annual_range(a, *year_range) if year_range[0] else a,
+                            legacy_reshape_annual_range(a, *year_range) if year_range[0] else a)
+    c = annual(a['dt'], rng)
+    d = annual(a['dt'], rng)
+    assert_annual_equal(util.add3_annual(a, c, d), legacy_add3_annual(a, c, d))
+    assert_annual_equal(util.add_annuals([a, b, c]), legacy_add_annuals([a, b, c]))
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_gaps_keep_their_years(seed):
+    rng = np.random.default_rng(seed)
+    a = random_annual(rng, gaps=True)
+    same_years = annual(a['dt'], rng)
+    assert_annual_equal(util.add_annual(a, same_years), legacy_add_annual(a, same_years))
+    assert_annual_equal(util.subtract_annual(a, same_years), legacy_subtract_annual(a, same_years))
+    assert_annual_equal(util.multiply_annual(a, 2.0), legacy_multiply_annual(a, 2.0))
+    start_year, end_year = int(a['dt'][0]) - 2, int(a['dt'][-1]) + 2
+    assert_annual_equal(util.reshape_annual_range(a, start_year, end_year),
+                        legacy_reshape_annual_range(a, start_year, end_year))
+    assert_annual_equal(AnnualSeries.from_annual(a).to_annual(), a)
+    vector = rng.uniform(-1e5, 1e5, len(a))
+    assert_annual_equal(AnnualSeries.from_annual(a).subtract_vector(vector).to_annual(),
+                        util.subtract_vector_from_annual(a, vector))
+
+
+@pytest.mark.parametrize('seed', seeds)
+def test_lookups_match_legacy(seed):
+    rng = np.random.default_rng(seed)
+    a = random_annual(rng, gaps=seed % 2 == 1)
+    b = random_annual(rng)
+    for year in range(int(a['dt'][0]) - 2, int(a['dt'][-1]) + 2):
+        assert util.flow_for_year(a, year) == legacy_flow_for_year(a, year)
+    replaced, expected = a.copy(), a.copy()
+    util.replace_annual(replaced, b)
+    legacy_replace_annual(expected, b)
+    assert_annual_equal(replaced, expected)
+
+
+def test_subtract_vector_length_mismatch_gives_zeros():
+    a = annual(np.arange(2000, 2010), np.random.default_rng(0))
+    vector = np.ones(5)
+    assert (util.subtract_vector_from_annual(a, vector)['val'] == 0).all()
+    assert (AnnualSeries.from_annual(a).subtract_vector(vector).to_annual()['val'] == 0).all()
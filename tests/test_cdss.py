@@ -0,0 +1,115 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from source import cdss, manifest, store
+from source.water_year_info import WaterYearInfo
+
+
+def current_water_year():
+    today = date.today()
+    year = today.year + 1 if today.month >= 10 else today.year
+    return WaterYearInfo(year, date(year - 1, 10, 1), date(year, 9, 30))
+
+
+def daily(last_day):
+    days = np.arange(np.datetime64(last_day - timedelta(days=2)), np.datetime64(last_day + timedelta(days=1)))
+    return np.array([(np.datetime64(day, 's'), 1.0) for day in days], dtype=[('dt', 'datetime64[s]'), ('val', 'f')])
+
+
+class Loader(object):
+    def __init__(self, time_series):
+        self.time_series = time_series
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.time_series
+
+
+def test_missing_file_is_not_loaded(data_dir):
+    loader = Loader(daily(date.today()))
+    assert cdss.load_if_fresh(data_dir / 'missing.json', current_water_year(), loader) is None
+    assert loader.calls == 0
+
+
+def test_past_water_year_loads_once(data_dir):
+    file_name = data_dir / 'past.json'
+    file_name.write_text('[]')
+    time_series = daily(date(2020, 9, 30))
+    loader = Loader(time_series)
+    water_year_info = WaterYearInfo(2020, date(2019, 10, 1), date(2020, 9, 30))
+    assert cdss.load_if_fresh(file_name, water_year_info, loader) is time_series
+    assert loader.calls == 1
+
+
+def test_stale_manifest_entry_skips_load(data_dir):
+    file_name = data_dir / 'stale.json'
+    file_name.write_text('[]')
+    manifest.record(file_name, daily(date.today() - timedelta(days=10)))
+    loader = Loader(daily(date.today()))
+    assert cdss.load_if_fresh(file_name, current_water_year(), loader) is None
+    assert loader.calls == 0
+
+
+def test_unknown_file_decided_by_its_data(data_dir):
+    file_name = data_dir / 'unknown.json'
+    file_name.write_text('[]')
+    fresh = Loader(daily(datetime.now().date()))
+    assert cdss.load_if_fresh(file_name, current_water_year(), fresh) is fresh.time_series
+    assert fresh.calls == 1
+
+    stale = Loader(daily(date.today() - timedelta(days=10)))
+    assert cdss.load_if_fresh(file_name, current_water_year(), stale) is None
+    assert stale.calls == 1
+
+
+class PagedResponse(object):
+    def __init__(self, json_data):
+        self.json_data = json_data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.json_data
+
+
+def divrec_record(day, value, water_class_num, identifier=''):
+    return {'dataMeasDate': f'{day}T00:00:00', 'dataValue': value, 'waterClassNum': water_class_num,
+            'wcIdentifier': identifier}
+
+
+def test_ingest_structures_divrec_pages(data_dir, monkeypatch):
+    # Three pages of divrecday records over two past water years, class 0 is a real class and
+    # a record without a class is left out of the partitions
+    pages = {
+        1: [divrec_record('2019-10-01', 1.0, 0, 'zero'), divrec_record('2019-10-01', 2.0, 7, 'seven'),
+            divrec_record('2019-10-02', 3.0, 0, 'zero')],
+        2: [divrec_record('2020-03-01', 4.0, 7, 'seven'), divrec_record('2020-03-02', 5.0, None)],
+        3: [divrec_record('2021-09-30', 6.0, 0, 'zero')],
+    }
+    requested = []
+
+    def get(url, timeout=None):
+        requested.append(url)
+        page_index = int(url.split('pageIndex=')[1].split('&')[0])
+        return PagedResponse({'PageCount': len(pages), 'pageIndex': page_index, 'ResultList': pages[page_index]})
+
+    monkeypatch.setattr(cdss.fetch, 'get', get)
+    classes = cdss.ingest_structures_divrec(None, '3200613', 2020, 2021, month=10)
+
+    assert sorted(int(url.split('pageIndex=')[1]) for url in requested) == [1, 2, 3]
+    assert sorted(classes) == ['0', '7']
+    assert classes['0']['dt'].astype(str).tolist() == ['2019-10-01', '2019-10-02', '2021-09-30']
+    assert classes['0']['val'].tolist() == [1.0, 3.0, 6.0]
+    assert classes['7']['val'].tolist() == [2.0, 4.0]
+
+    dates, values, class_nums, identifiers = cdss.divrec_columns(pages[1] + pages[2])
+    assert class_nums.tolist() == [0, 7, 0, 7, -1]
+    partitions = cdss.WaterClassPartitions.from_columns(dates, values, class_nums, identifiers)
+    assert partitions.classes['num'].tolist() == [0, 7]
+    assert partitions.classes['identifier'].tolist() == ['zero', 'seven']
+    assert partitions.classes['count'].tolist() == [2, 2]
+    stored = store.load('cdss_divrec', '3200613', 'divrecday', '0')
+    assert stored is not None and len(stored) == 3
@@ -0,0 +1,34 @@
+import numpy as np
+
+from api.reservoir import Reservoir
+from rw import date_range
+
+
+def daily(start, count):
+    a = np.zeros(count, [('dt', 'datetime64[s]'), ('val', 'f')])
+    a['dt'] = np.datetime64(start, 'D') + np.arange(count)
+    a['val'] = np.arange(count)
+    return a
+
+
+def masked(a, start_date, end_date):
+    dates = a['dt'].astype('datetime64[D]')
+    return a[(dates >= np.datetime64(start_date)) & (dates <= np.datetime64(end_date))]
+
+
+def test_clip_matches_mask():
+    a = daily('2020-01-01', 400)
+    for start_date, end_date in (('2020-03-01', '2020-06-30'), ('2019-06-01', '2020-01-10'),
+                                 ('2021-01-01', '2022-01-01'), ('2018-01-01', '2018-12-31'),
+                                 ('2020-05-01', '2020-04-01')):
+        np.testing.assert_array_equal(date_range.clip(a, start_date, end_date), masked(a, start_date, end_date))
+        np.testing.assert_array_equal(Reservoir.clip_array_by_dates(a, start_date, end_date),
+                                      masked(a, start_date, end_date))
+
+
+def test_clip_array_by_dates_returns_a_copy():
+    a = daily('2020-01-01', 100)
+    clipped = Reservoir.clip_array_by_dates(a, '2020-02-01', '2020-02-29')
+    assert not np.shares_memory(clipped, a)
+    clipped['val'] = -1
+    assert (a['val'] >= 0).all()
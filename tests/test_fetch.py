@@ -0,0 +1,15 @@
+from source.fetch import FetchScheduler
+
+
+def test_nested_run_all_does_not_deadlock():
+    scheduler = FetchScheduler(workers=2)
+
+    def inner(item):
+        return item * 2
+
+    def outer(item):
+        # Every pool thread is busy running outer, nested work has to run inline
+        return sum(scheduler.map(inner, range(item)))
+
+    assert scheduler.map(outer, range(8)) == [sum(i * 2 for i in range(item)) for item in range(8)]
+    scheduler.executor.shutdown()
@@ -0,0 +1,25 @@
+import numpy as np
+
+from api import pool_batch
+from api.pool_batch import PoolYear
+
+
+def test_detach_closes_the_block(monkeypatch):
+    monkeypatch.setattr(pool_batch, 'worker_shm', None)
+    years = {2020: PoolYear(['Oct-01', 'Oct-02'], {'Powell': np.array([1.0, 2.0]), 'Mead': [1.0, None]}, {},
+                            {'Powell': (np.array([3.0, 4.0]), None, None, None)})}
+    shm = pool_batch.pack(years, {'do_paper_drains': False})
+    try:
+        pool_batch.attach(shm.name)
+        year = pool_batch.worker_years[2020]
+        np.testing.assert_array_equal(year.data['Powell'], [1.0, 2.0])
+        assert year.data['Mead'] == [1.0, None]
+        del year
+        worker_shm = pool_batch.worker_shm
+        pool_batch.detach()
+        assert pool_batch.worker_shm is None
+        assert pool_batch.worker_years == {}
+        assert worker_shm.buf is None
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from api.pool import DrainRun, DrainType, FillRun, FillType
+
+# The kernels against the day by day FillRun and DrainRun loops over random call water, targets, run bounds
+# and pool types
+
+
+def random_run(rng, days:int):
+    pool = np.zeros(days)
+    pool[0] = rng.uniform(0, 50)
+    call_water = rng.uniform(-5, 10, days)
+    call_water[rng.random(days) < 0.2] = 0.0
+    call_water[rng.random(days) < 0.02] = np.nan
+    start_day = int(rng.integers(1, days))
+    end_day = int(rng.integers(start_day, days + 1)) if rng.random() < 0.7 else 0
+    return pool, call_water, start_day, end_day
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_kernels_match_day_by_day_loops(seed, trials=500, days=365):
+    rng = np.random.default_rng(seed)
+    dates = [''] * days
+    mismatches = []
+    for trial in range(trials):
+        pool, call_water, start_day, end_day = random_run(rng, days)
+        as_list = trial % 2 == 1
+        if trial % 3 == 0:
+            run = FillRun('check', FillType.FILL, start_day, dates)
+            run.target = float(rng.uniform(0, 1500))
+        else:
+            run = DrainRun('check', DrainType.DRAIN, start_day, dates)
+            pool[:] = rng.uniform(0, 1500)
+        run.end_day = end_day
+        reference_run = run.copy()
+
+        reference_pool = pool.tolist() if as_list else pool.copy()
+        kernel_pool = pool.tolist() if as_list else pool.copy()
+        if isinstance(run, FillRun):
+            reference_run.fill_pool_by_day(reference_pool, call_water)
+            run.fill_pool(kernel_pool, call_water)
+        else:
+            reference_run.drain_pool_by_day(reference_pool, call_water)
+            run.drain_pool(kernel_pool, call_water)
+
+        if run.complete_day != reference_run.complete_day \
+        or not np.isclose(run.complete_remaining_cfs, reference_run.complete_remaining_cfs, rtol=1e-9, atol=1e-9) \
+        or not np.allclose(kernel_pool, reference_pool, rtol=1e-9, atol=1e-9):
+            mismatches.append(f'trial {trial} {str(run)} reference {str(reference_run)}')
+    assert mismatches == []
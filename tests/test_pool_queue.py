@@ -0,0 +1,12 @@
+from api.pool import PoolQueue
+
+
+def test_compiled_equations_are_shared_and_bounded():
+    compiled = PoolQueue.compile_equation('Powell+Mead*0')
+    assert PoolQueue.compile_equation('Powell+Mead*0') is compiled
+    assert compiled.may_be_nulled
+    assert compiled.names_in(('Powell', 'Mead', 'Havasu')) == ('Powell', 'Mead')
+    maxsize = PoolQueue.compile_equation.cache_info().maxsize
+    for i in range(maxsize + 10):
+        PoolQueue.compile_equation(f'Powell+{i}')
+    assert PoolQueue.compile_equation.cache_info().currsize == maxsize
@@ -0,0 +1,64 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from source import reservoir_geometry, sidecar
+from source.reservoir_geometry import get_lake_powell_capacity
+
+powell_csv = Path(__file__).parents[1] / 'data' / 'Colorado_River' / 'Lake_Powell_2018_ElevAreaCap_interp.csv'
+
+# Capacities the pandas read_csv + scipy interp1d get_lake_powell_capacity returned before the cached tables
+legacy_capacities = {
+    3120.0: 0.04,
+    3370.0: 1676959.36,
+    3490.0: 5353021.28,
+    3500.0: 5818340.23,
+    3510.0: 6315769.35,
+    3525.0: 7127687.36,
+    3530.19: 7427162.58,
+    3588.0: 11479233.47,
+    3650.5: 17822284.02,
+    3700.0: 24705658.16,
+    3717.2: 27512345.19,
+}
+
+
+@pytest.fixture
+def powell(data_dir, monkeypatch):
+    csv_path = data_dir / 'data' / 'Colorado_River' / powell_csv.name
+    csv_path.parent.mkdir(parents=True)
+    shutil.copy(powell_csv, csv_path)
+    monkeypatch.setattr(reservoir_geometry, 'geometries', {})
+    return csv_path
+
+
+@pytest.mark.parametrize('reload', [False, True])
+def test_capacity_matches_legacy_lookup(powell, monkeypatch, reload):
+    if reload:
+        # Second process, the table comes from the sidecar rather than the CSV
+        get_lake_powell_capacity(3600.0)
+        monkeypatch.setattr(reservoir_geometry, 'geometries', {})
+    for feet, capacity in legacy_capacities.items():
+        assert get_lake_powell_capacity(feet, elev_col='Elevation_ft_NAVD88',
+                                        cap_col='Capacity_acrefeet') == pytest.approx(capacity, rel=1e-12)
+    series = get_lake_powell_capacity(np.array(list(legacy_capacities)))
+    np.testing.assert_allclose(series, list(legacy_capacities.values()), rtol=1e-12)
+
+
+def test_out_of_range_raises(powell):
+    with pytest.raises(ValueError):
+        get_lake_powell_capacity(3119.0)
+    with pytest.raises(ValueError):
+        get_lake_powell_capacity(3720.0)
+    geometry = reservoir_geometry.get_geometry('powell')
+    assert np.isnan(geometry.elevation_to_capacity(3720.0, bounds_error=False))
+    assert geometry.capacity_to_elevation(legacy_capacities[3588.0]) == pytest.approx(3588.0, abs=0.01)
+
+
+def test_sidecar_is_written_under_the_cache_directory(powell, data_dir):
+    get_lake_powell_capacity(3600.0)
+    assert sidecar.sidecar_path(powell, 'eac').exists()
+    assert sidecar.sidecar_path(powell, 'eac').parts[0] == 'cache'
+    assert list(powell.parent.iterdir()) == [powell]
@@ -0,0 +1,109 @@
+from source import rise_catalog
+from source.rise_catalog import RiseCatalog
+
+
+def catalog_record(record_id:int, update_date:str, item_ids:list[int], title:str='Lake Powell') -> dict:
+    return {'id': f'/rise/api/catalog-record/{record_id}',
+            'attributes': {'_id': record_id, 'recordTitle': title, 'updateDate': update_date},
+            'relationships': {'catalogItems': {'data': [{'id': f'/rise/api/catalog-item/{item_id}'}
+                                                        for item_id in item_ids]}}}
+
+
+class FakeRise(object):
+    def __init__(self):
+        self.records = []
+        self.complete = True
+        self.failing = set()
+        self.requested = []
+
+    def request_catalog_pages(self, catalog_path, unified_region_id, theme_id=0):
+        return list(self.records), self.complete
+
+    def request_catalog_item(self, item_path:str):
+        item_id = rise_catalog.catalog_id(item_path)
+        self.requested.append(item_id)
+        if item_id in self.failing:
+            return None
+        return {'itemTitle': f'Item {item_id}', 'parameterName': 'Storage', 'parameterUnit': 'af',
+                'parameterTimestep': 'daily'}
+
+
+def make_catalog(tmp_path, monkeypatch):
+    rise = FakeRise()
+    monkeypatch.setattr(rise_catalog, 'request_catalog_pages', rise.request_catalog_pages)
+    monkeypatch.setattr(rise_catalog, 'request_catalog_item', rise.request_catalog_item)
+    return rise, RiseCatalog(tmp_path / 'catalog.sqlite')
+
+
+def item_ids(catalog:RiseCatalog) -> set[int]:
+    return {row[0] for row in catalog.connection.execute('SELECT item_id FROM items')}
+
+
+def fts_ids(catalog:RiseCatalog) -> set[int]:
+    return {row[0] for row in catalog.connection.execute('SELECT rowid FROM items_fts')}
+
+
+def test_failed_items_are_refetched_after_record_changes(tmp_path, monkeypatch):
+    rise, catalog = make_catalog(tmp_path, monkeypatch)
+    rise.records = [catalog_record(1, '2024-01-01', [10, 11])]
+    assert catalog.update(7, 1) == 2
+
+    # Record changes and one of its items fails, the record keeps its old update date
+    rise.records = [catalog_record(1, '2024-02-01', [10, 11])]
+    rise.failing = {11}
+    assert catalog.update(7, 1) == 1
+
+    rise.failing = set()
+    rise.requested = []
+    assert catalog.update(7, 1) == 2
+    assert sorted(rise.requested) == [10, 11]
+
+    rise.requested = []
+    assert catalog.update(7, 1) == 0
+    assert rise.requested == []
+    catalog.close()
+
+
+def test_new_record_with_failed_item_is_retried(tmp_path, monkeypatch):
+    rise, catalog = make_catalog(tmp_path, monkeypatch)
+    rise.records = [catalog_record(1, '2024-01-01', [10, 11])]
+    rise.failing = {10}
+    assert catalog.update(7, 1) == 1
+
+    rise.failing = set()
+    rise.requested = []
+    catalog.update(7, 1)
+    assert 10 in rise.requested
+    assert item_ids(catalog) == {10, 11}
+    catalog.close()
+
+
+def test_records_and_items_leaving_the_catalog_are_pruned(tmp_path, monkeypatch):
+    rise, catalog = make_catalog(tmp_path, monkeypatch)
+    rise.records = [catalog_record(1, '2024-01-01', [10, 11]), catalog_record(2, '2024-01-01', [20], title='Lake Mead')]
+    catalog.update(7, 1)
+    assert item_ids(catalog) == fts_ids(catalog) == {10, 11, 20}
+    assert catalog.item_id('Lake Mead / Storage') == 20
+
+    # A partial catalog read doesn't prune
+    rise.records = [catalog_record(1, '2024-01-01', [10])]
+    rise.complete = False
+    catalog.update(7, 1)
+    assert item_ids(catalog) == {10, 11, 20}
+
+    rise.complete = True
+    catalog.update(7, 1)
+    assert item_ids(catalog) == fts_ids(catalog) == {10}
+    assert [row[0] for row in catalog.connection.execute('SELECT record_id FROM records')] == [1]
+    assert catalog.item_id('Lake Mead / Storage') is None
+    catalog.close()
+
+
+def test_prune_is_limited_to_the_region_updated(tmp_path, monkeypatch):
+    rise, catalog = make_catalog(tmp_path, monkeypatch)
+    rise.records = [catalog_record(1, '2024-01-01', [10])]
+    catalog.update(7, 1)
+    rise.records = [catalog_record(2, '2024-01-01', [20])]
+    catalog.update(8, 1)
+    assert item_ids(catalog) == {10, 20}
+    catalog.close()
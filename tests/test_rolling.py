@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from rw import rolling
+
+# A plain loop over every trailing window, the reference the vectorized statistics must match
+
+
+def loop_rolling(values, window, min_periods, percentiles):
+    result = {}
+    for stat in ('count', 'sum', 'mean', 'min', 'max') + tuple('p' + str(p) for p in percentiles):
+        result[stat] = np.full(len(values), np.nan)
+    for i in range(len(values)):
+        in_window = values[max(0, i - window + 1):i + 1]
+        valid = in_window[~np.isnan(in_window)]
+        result['count'][i] = len(valid)
+        if len(valid) < max(min_periods, 1):
+            continue
+        result['sum'][i] = valid.sum()
+        result['mean'][i] = valid.mean()
+        result['min'][i] = valid.min()
+        result['max'][i] = valid.max()
+        for p in percentiles:
+            result['p' + str(p)][i] = np.percentile(valid, p)
+    return result
+
+
+def random_values(rng, length, nan_fraction):
+    values = rng.uniform(-1000.0, 50000.0, length)
+    values[rng.random(length) < nan_fraction] = np.nan
+    if length > 12:
+        # A run of NaN longer than the smaller windows
+        start = int(rng.integers(0, length - 12))
+        values[start:start + 12] = np.nan
+    return values
+
+
+stats = ('count', 'sum', 'mean', 'min', 'max', 'percentile')
+percentiles = (0, 10, 50, 90, 100)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_rolling_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    # Some series are shorter than every window
+    values = random_values(rng, int(rng.integers(1, 120)), nan_fraction=0.2)
+    windows = (1, 3, 5, 10, 30, 200)
+    for min_periods in (1, 3):
+        result = rolling.rolling(values, windows=windows, stats=stats, percentiles=percentiles,
+                                 min_periods=min_periods)
+        for window in windows:
+            expected = loop_rolling(values, window, min_periods, percentiles)
+            np.testing.assert_array_equal(result[('count', window)], expected['count'])
+            for stat in ('sum', 'mean', 'min', 'max') + tuple('p' + str(p) for p in percentiles):
+                np.testing.assert_allclose(result[(stat, window)], expected[stat], rtol=1e-12, atol=1e-9,
+                                           err_msg=f'{stat} window {window}')
+
+
+def test_all_nan_and_empty_series():
+    result = rolling.rolling(np.full(8, np.nan), windows=(3,), stats=stats, percentiles=(50,))
+    assert (result[('count', 3)] == 0).all()
+    for key in ('sum', 'mean', 'min', 'max', 'p50'):
+        assert np.isnan(result[(key, 3)]).all()
+    result = rolling.rolling(np.array([]), windows=(3,), stats=stats, percentiles=(50,))
+    assert all(len(stat) == 0 for stat in result.values())
+
+
+def test_long_series_sums_do_not_drift():
+    # Large flows for decades of days then a quiet stretch, a single running cumulative sum would be
+    # around 1e13 by then and leave rounding residue in windows that hold only small values
+    rng = np.random.default_rng(0)
+    values = np.concatenate((rng.uniform(1e7, 1e8, 200_000), rng.uniform(0.0, 1e-3, 1000)))
+    window = 30
+    result = rolling.rolling(values, windows=(window,), stats=('sum', 'mean'))
+    for i in range(len(values) - 900, len(values), 37):
+        in_window = values[i - window + 1:i + 1]
+        assert result[('sum', window)][i] == pytest.approx(in_window.sum(), rel=1e-9)
+        assert result[('mean', window)][i] == pytest.approx(in_window.mean(), rel=1e-9)
+
+
+def test_series_helpers_match_loop():
+    rng = np.random.default_rng(1)
+    years = np.array([1990, 1991, 1993, 1994, 1995, 1999, 2000])
+    a = np.zeros(len(years), [('dt', 'i'), ('val', 'f')])
+    a['dt'] = years
+    a['val'] = rng.uniform(1.0, 100.0, len(years))
+    dense = np.full(years[-1] - years[0] + 1, np.nan)
+    dense[years - years[0]] = a['val']
+    expected = loop_rolling(dense, 3, 1, ())['mean'][years - years[0]]
+    np.testing.assert_allclose(rolling.running_average(a, 3)['val'], expected, rtol=1e-6)
+
+    values = list(rng.uniform(1.0, 100.0, 25))
+    expected = [np.mean(values[i - 10 + 1:i + 1]) for i in range(9, len(values))]
+    np.testing.assert_allclose(rolling.moving_average(values, 10), expected, rtol=1e-12)
+    assert rolling.moving_average(values[:5], 10) == []
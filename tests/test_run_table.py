@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from api.pool import DrainRun, FillRun
+from api.run_table import RunTable, merge_queue
+from tests.pool_runs import legacy_merge, random_queue
+
+
+def fields(run):
+    # Everything a merge can carry over, not just the printed form
+    values = [type(run).__name__, str(run), run.variable_name, run.start_day, run.end_day, run.complete_day,
+              run.complete_remaining_cfs, run.paper_start_cfs, run.paper_end_cfs, run.still_in_progress]
+    if isinstance(run, FillRun):
+        values += [run.fill_type, run.target, list(run.paper_fills), list(run.paper_fill_dates),
+                   [(date_value.start_date, date_value.value) for date_value in run.date_values]]
+    elif isinstance(run, DrainRun):
+        values += [run.drain_type, list(run.paper_drains), list(run.paper_drain_dates), run.transfer_to,
+                   [(overdraft.start_date, overdraft.value) for overdraft in run.overdrafts]]
+    else:
+        values += [run.drain_type]
+    return values
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_merge_adjacent_matches_queue_merges(seed, trials=100, runs=60):
+    rng = np.random.default_rng(seed)
+    dates = [np.datetime64('2000-10-01') + day for day in range(366)]
+    for trial in range(trials):
+        kind = trial % 3
+        pool_queue = random_queue(rng, kind, runs, dates)
+        # The queue merges modify the runs they merge, merge the table first
+        table_merged = [fields(run) for run in merge_queue(pool_queue)]
+        legacy_merged = [fields(run) for run in legacy_merge(pool_queue)]
+        assert table_merged == legacy_merged, f'trial {trial} kind {kind}'
+
+
+def test_round_trip_keeps_every_field():
+    rng = np.random.default_rng(5)
+    dates = [np.datetime64('2000-10-01') + day for day in range(366)]
+    for kind in range(3):
+        pool_queue = random_queue(rng, kind, 60, dates)
+        assert [fields(run) for run in RunTable.from_runs(pool_queue).to_queue()] == \
+               [fields(run) for run in pool_queue]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from source import series_cache, sidecar
+from source.series_cache import SeriesCache
+
+
+def test_sidecar_maps_are_cached_without_copying(data_dir):
+    file_path = data_dir / 'data' / 'gage.rdb'
+    file_path.parent.mkdir()
+    file_path.write_text('')
+    sidecar.save(file_path, {'': np.arange(1000, dtype=np.float64), 'cd': np.array(['A', 'P'] * 500)})
+    arrays = sidecar.load(file_path, ['', 'cd'])
+    assert not arrays[''].flags.writeable
+
+    cache = SeriesCache()
+    key = series_cache.series_key('usgs', 'gage')
+    a = cache.put(key, arrays[''], meta=('gage', arrays['cd']), paths=[file_path])
+    assert np.shares_memory(a, arrays[''])
+    assert cache.nbytes == 0
+    cached, (name, codes) = cache.get(key)
+    assert np.shares_memory(cached, arrays[''])
+    assert np.shares_memory(codes, arrays['cd'])
+
+
+def test_meta_arrays_are_frozen_and_counted():
+    cache = SeriesCache()
+    a = np.arange(100, dtype=np.float64)
+    codes = np.array(['A'] * 100)
+    key = series_cache.series_key('usgs', 'gage')
+    cache.put(key, a, meta=('gage', codes))
+    assert cache.nbytes == a.nbytes + codes.nbytes
+    cached, (name, cached_codes) = cache.get(key)
+    codes[0] = 'P'
+    assert cached_codes[0] == 'A'
+    with pytest.raises(ValueError):
+        cached_codes[0] = 'P'
+    cache.invalidate()
+    assert cache.nbytes == 0
@@ -0,0 +1,19 @@
+import numpy as np
+
+from source import revisions, sidecar
+
+
+def test_sidecars_are_written_under_the_cache_directory(data_dir):
+    file_path = data_dir / 'data' / 'USGS_Gages' / '09380000.rdb'
+    file_path.parent.mkdir(parents=True)
+    file_path.write_text('')
+    a = np.arange(5, dtype=np.float32)
+    sidecar.save(file_path, {'': a, 'cd': a * 2})
+
+    assert sidecar.sidecar_path(file_path) == sidecar.cache_path / 'USGS_Gages' / '09380000.npy'
+    assert sidecar.sidecar_path(file_path, 'cd') == sidecar.cache_path / 'USGS_Gages' / '09380000_cd.npy'
+    assert list(file_path.parent.iterdir()) == [file_path]
+    arrays = sidecar.load(file_path, ['', 'cd'])
+    np.testing.assert_array_equal(arrays[''], a)
+    np.testing.assert_array_equal(arrays['cd'], a * 2)
+    assert revisions.revision_path(file_path) == sidecar.cache_path / 'USGS_Gages' / '09380000.rev'
@@ -0,0 +1,73 @@
+import datetime
+import numpy as np
+from source import store
+from source.store import TimeSeriesStore
+
+
+def daily(start:str, end:str, value:float=1.0) -> np.ndarray:
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+    a = np.zeros(len(dates), store.default_dtype)
+    a['dt'] = dates
+    a['val'] = value
+    return a
+
+
+def test_empty_fetch_is_not_covered(data_dir):
+    time_series_store = TimeSeriesStore(data_dir / 'store.sqlite')
+    empty = np.zeros(0, store.default_dtype)
+    time_series_store.write('usgs', '09380000', '00060', '00003', empty, '2021-10-01', '2022-09-30')
+    assert time_series_store.load('usgs', '09380000', '00060', '00003', '2021-10-01', '2022-09-30') is None
+
+    # NWIS 'No sites found' parses to one zeroed day outside the requested range
+    no_sites = np.zeros(1, store.default_dtype)
+    time_series_store.write('usgs', '09380000', '00060', '00003', no_sites, '2021-10-01', '2022-09-30')
+    assert not time_series_store.covers('usgs', '09380000', '00060', '00003', '2021-10-01', '2022-09-30')
+    time_series_store.close()
+
+
+def test_adjacent_years_cover_a_multi_year_load(data_dir):
+    time_series_store = TimeSeriesStore(data_dir / 'store.sqlite')
+    for year in (2020, 2021, 2022):
+        time_series_store.write('usbr_rise', '509', '', '', daily(f'{year - 1}-10-01', f'{year}-09-30', year),
+                                datetime.date(year - 1, 10, 1), datetime.date(year, 9, 30))
+    rows = time_series_store.connection.execute('SELECT start_date, end_date FROM coverage').fetchall()
+    assert rows == [('2019-10-01', '2022-09-30')]
+
+    a = time_series_store.load('usbr_rise', '509', '', '', '2019-10-01', '2022-09-30')
+    assert len(a) == 366 + 365 + 365
+    assert a['val'][0] == 2020 and a['val'][-1] == 2022
+    assert time_series_store.covers('usbr_rise', '509', '', '', np.datetime64('2020-10-01T00:00:00'),
+                                    np.datetime64('2021-09-30T00:00:00'))
+    assert not time_series_store.covers('usbr_rise', '509', '', '', '2019-10-01', '2022-10-01')
+    time_series_store.close()
+
+
+def test_gap_between_years_is_not_covered(data_dir):
+    time_series_store = TimeSeriesStore(data_dir / 'store.sqlite')
+    time_series_store.write('cdss', 'x', '', '', daily('2019-10-01', '2020-09-30'), '2019-10-01', '2020-09-30')
+    time_series_store.write('cdss', 'x', '', '', daily('2021-10-01', '2022-09-30'), '2021-10-01', '2022-09-30')
+    assert not time_series_store.covers('cdss', 'x', '', '', '2019-10-01', '2022-09-30')
+    assert time_series_store.covers('cdss', 'x', '', '', '2021-10-01', '2022-09-30')
+    time_series_store.close()
+
+
+def test_open_bounds(data_dir):
+    time_series_store = TimeSeriesStore(data_dir / 'store.sqlite')
+    assert not time_series_store.covers('cdss', 'x', '', '', None, None)
+    time_series_store.write('cdss', 'x', '', '', daily('2019-10-01', '2020-09-30'), '2019-10-01', '2020-09-30')
+    assert time_series_store.covers('cdss', 'x', '', '', None, '2020-06-30')
+    assert time_series_store.covers('cdss', 'x', '', '', '2020-01-01', None)
+    assert len(time_series_store.load('cdss', 'x', '', '', None, None)) == 366
+    time_series_store.write('cdss', 'x', '', '', daily('2021-10-01', '2022-09-30'), '2021-10-01', '2022-09-30')
+    assert not time_series_store.covers('cdss', 'x', '', '', None, None)
+    time_series_store.close()
+
+
+def test_info_is_kept_apart_from_name(data_dir):
+    time_series_store = TimeSeriesStore(data_dir / 'store.sqlite')
+    time_series_store.write('usbr_rise', '509', '', '', daily('2019-10-01', '2020-09-30'), '2019-10-01', '2020-09-30',
+                            info='{"Parameter Name": "Lake/Reservoir Storage"}')
+    metadata = time_series_store.metadata('usbr_rise', '509')
+    assert metadata['name'] is None
+    assert metadata['info'] == '{"Parameter Name": "Lake/Reservoir Storage"}'
+    time_series_store.close()
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime
+
+import numpy as np
+
+from source import usbr_rise
+from source.water_year_info import WaterYearInfo
+
+
+class RangeResponse(object):
+    status_code = 200
+    reason = 'OK'
+
+    def __init__(self, days):
+        data = {'Location': 'Lake Powell', 'Parameter Name': 'Lake/Reservoir Storage', 'Timestep': 'daily',
+                'Units': 'af'}
+        for index, day in enumerate(days):
+            data[str(index)] = {'dateTime': f'{day}T00:00:00', 'result': 1000.0 + index}
+        self.content = json.dumps(data).encode('utf-8')
+
+
+def water_year(year):
+    return WaterYearInfo.get_water_year(datetime(year - 1, 10, 1), month=10)
+
+
+def test_request_range_skips_water_years_without_records(data_dir, monkeypatch):
+    # The download only has days in water year 2021, 2020 and 2022 have none
+    days = np.arange(np.datetime64('2020-10-01'), np.datetime64('2021-10-01'))
+    requested = []
+
+    def get(url, timeout=None):
+        requested.append(url)
+        return RangeResponse(days.astype(str))
+
+    monkeypatch.setattr(usbr_rise.fetch, 'get', get)
+    infos = [water_year(2020), water_year(2021), water_year(2022)]
+    assert usbr_rise.request_range(509, infos)
+    assert len(requested) == 1
+
+    assert not usbr_rise.cache_file_path(509, infos[0]).exists()
+    assert not usbr_rise.cache_file_path(509, infos[2]).exists()
+    info, a = usbr_rise.load_json(usbr_rise.cache_file_path(509, infos[1]))
+    assert info['Location'] == 'Lake Powell'
+    np.testing.assert_array_equal(a['dt'].astype('datetime64[D]'), days)
+
+    # A year written earlier is left alone when a later download has nothing for it
+    before = usbr_rise.cache_file_path(509, infos[1]).read_text()
+    days = days[:0]
+    assert usbr_rise.request_range(509, infos[1:2])
+    assert usbr_rise.cache_file_path(509, infos[1]).read_text() == before
@@ -0,0 +1,136 @@
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+import numpy as np
+import pytest
+from source import usgs_gage
+from source.usgs_gage import USGSGage, parse_rdb, request_daily_discharge_batch, split_multi_site_rdb
+from source.water_year_info import WaterYearInfo
+
+sites = {
+    '09380000': ('COLORADO RIVER AT LEES FERRY, AZ', '1234', [('2022-10-01', '8010', 'A'), ('2022-10-02', 'Ice', 'A'),
+                                                             ('2022-10-03', '7990', 'P')]),
+    '09180500': ('COLORADO RIVER NEAR CISCO, UT', '5678', [('2022-10-01', '2250', 'A:e'), ('2022-10-02', '2310', 'A'),
+                                                          ('2022-10-03', '2275', 'P')]),
+}
+
+
+def comment_block(site_list:list[str]) -> list[str]:
+    lines = ['# ---------------------------------- WARNING ----------------------------------------',
+             '# Some of the data that you have obtained from this U.S. Geological Survey database',
+             '#',
+             '# This file contains USGS time-series data for the following site(s):',
+             '#']
+    for site in site_list:
+        lines.append(f'#    USGS {site} {sites[site][0]}')
+    lines.append('#')
+    return lines
+
+
+def site_section(site:str) -> list[str]:
+    name, ts_id, days = sites[site]
+    value_column = f'{ts_id}_00060_00003'
+    lines = [f'# Data provided for site {site}',
+             '#            TS   parameter     statistic     Description',
+             f'#        {ts_id}       00060     00003     Discharge, cubic feet per second (Mean)',
+             '#',
+             f'agency_cd\tsite_no\tdatetime\t{value_column}\t{value_column}_cd',
+             '5s\t15s\t20d\t14n\t10s']
+    for date, value, code in days:
+        lines.append(f'USGS\t{site}\t{date}\t{value}\t{code}')
+    return lines
+
+
+def rdb(site_list:list[str]) -> str:
+    lines = comment_block(site_list)
+    for site in site_list:
+        lines += site_section(site)
+    return '\n'.join(lines) + '\n'
+
+
+class NWISHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        requested = query['sites'][0].split(',')
+        found = [site for site in requested if site in sites]
+        if found:
+            body = rdb(found)
+        else:
+            body = '#  No sites found matching all criteria\n'
+        self.server.requests.append(requested)
+        content = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def nwis(monkeypatch):
+    server = HTTPServer(('127.0.0.1', 0), NWISHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(usgs_gage, 'nwis_dv_url', f'http://127.0.0.1:{server.server_port}/nwis/dv')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def assert_same_series(batch, single):
+    batch_name, batch_a, batch_codes = batch
+    single_name, single_a, single_codes = single
+    assert batch_name == single_name
+    np.testing.assert_array_equal(batch_a['dt'], single_a['dt'])
+    np.testing.assert_array_equal(batch_a['val'], single_a['val'])
+    np.testing.assert_array_equal(batch_codes, single_codes)
+
+
+def test_split_multi_site_rdb_matches_single_site_documents():
+    documents = split_multi_site_rdb(rdb(list(sites)))
+    assert list(documents) == list(sites)
+    for site in sites:
+        assert_same_series(parse_rdb(documents[site]), parse_rdb(rdb([site])))
+
+
+def test_split_single_site_rdb_is_unchanged():
+    content = rdb(['09380000'])
+    assert split_multi_site_rdb(content) == {'09380000': content}
+
+
+def test_batch_cache_files_match_single_site_requests(data_dir, nwis):
+    water_year_info = WaterYearInfo(2023, datetime.date(2022, 10, 1), datetime.date(2023, 9, 30))
+    gages = [USGSGage(site, water_year_info) for site in sites]
+    missing = USGSGage('09999999', water_year_info)
+
+    results = request_daily_discharge_batch(gages + [missing], water_year_info)
+    assert results == {'09380000': True, '09180500': True, '09999999': False}
+    assert nwis.requests == [list(sites) + ['09999999']]
+    assert not missing.cache_file_path(water_year_info).exists()
+
+    for gage in gages:
+        batch_path = gage.cache_file_path(water_year_info)
+        batch = parse_rdb(batch_path.read_text())
+        single_path = data_dir / f'single_{gage.site}.csv'
+        gage.request_daily_discharge(single_path, water_year_info.start_date, water_year_info.end_date)
+        assert_same_series(batch, parse_rdb(single_path.read_text()))
+        assert batch[0].strip() == f'{gage.site} {sites[gage.site][0]}'
+
+
+def test_stored_water_year_sets_daily_discharge(data_dir, nwis):
+    water_year_info = WaterYearInfo(2023, datetime.date(2022, 10, 1), datetime.date(2023, 9, 30))
+    fetched = USGSGage('09380000', water_year_info).daily_discharge(water_year_info=water_year_info, update=False)
+    assert len(nwis.requests) == 1
+
+    gage = USGSGage('09380000', water_year_info)
+    stored = gage.daily_discharge(water_year_info=water_year_info, update=False)
+    assert len(nwis.requests) == 1
+    assert gage.daily_discharge_cfs is stored
+    assert gage.site_name.strip() == f"09380000 {sites['09380000'][0]}"
+    np.testing.assert_array_equal(stored['dt'].astype('datetime64[D]'), fetched['dt'].astype('datetime64[D]'))
+    np.testing.assert_array_equal(stored['val'], fetched['val'])
@@ -0,0 +1,99 @@
+import numpy as np
+
+from source import revisions
+from source.water_year_info import WaterYearCalendar, WaterYearInfo, month_day_labels
+
+
+def test_month_day_labels_do_not_grow():
+    size = len(month_day_labels)
+    days = np.arange(np.datetime64('1999-10-01'), np.datetime64('2004-10-01'))
+    for day in days:
+        label = WaterYearInfo.format_to_month_day(day)
+        assert label == day.astype(object).strftime('%b-%d')
+    assert WaterYearInfo.format_to_month_day(np.datetime64('2000-02-09'), leading_zeroes=False) == 'Feb-9'
+    assert len(month_day_labels) == size
+
+
+def test_calendar_cache_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(WaterYearCalendar, 'cache', type(WaterYearCalendar.cache)())
+    monkeypatch.setattr(WaterYearCalendar, 'identities', type(WaterYearCalendar.identities)())
+    monkeypatch.setattr(WaterYearCalendar, 'cache_size', 2)
+    first = np.arange(np.datetime64('2000-10-01'), np.datetime64('2001-10-01'))
+    second = first + 365
+    third = second + 365
+    calendar = WaterYearCalendar.for_dates(first)
+    WaterYearCalendar.for_dates(second)
+    assert WaterYearCalendar.for_dates(first) is calendar
+    WaterYearCalendar.for_dates(third)
+    assert len(WaterYearCalendar.cache) == 2
+    assert len(WaterYearCalendar.identities) == 2
+    assert WaterYearCalendar.for_dates(first.copy()) is calendar
+
+
+def test_calendar_found_by_identity_without_hashing(monkeypatch):
+    monkeypatch.setattr(WaterYearCalendar, 'cache', type(WaterYearCalendar.cache)())
+    monkeypatch.setattr(WaterYearCalendar, 'identities', type(WaterYearCalendar.identities)())
+    content_keys = []
+    content_key = WaterYearCalendar.content_key
+
+    def counting_content_key(dates, water_year_month):
+        content_keys.append(len(dates))
+        return content_key(dates, water_year_month)
+
+    monkeypatch.setattr(WaterYearCalendar, 'content_key', staticmethod(counting_content_key))
+    dates = [np.datetime64('2000-10-01') + day for day in range(365)]
+    calendar = WaterYearCalendar.for_dates(dates)
+    for _ in range(10):
+        assert WaterYearCalendar.for_dates(dates) is calendar
+    assert content_keys == [365]
+    # Equal dates in another object share the calendar, hashed once for that object
+    assert WaterYearCalendar.for_dates(list(dates)) is calendar
+    assert content_keys == [365, 365]
+    assert WaterYearCalendar.for_dates(dates, water_year_month=10) is not calendar
+
+
+def daily(start, values):
+    a = np.zeros(len(values), [('dt', 'datetime64[s]'), ('val', 'f')])
+    a['dt'] = np.datetime64(start) + np.arange(len(values)).astype('timedelta64[D]')
+    a['val'] = values
+    return a
+
+
+def test_diff_arrays_splits_changed_added_removed():
+    previous = daily('2023-10-01', [1.0, 2.0, np.nan, 4.0, 5.0])
+    new = daily('2023-10-02', [2.0, np.nan, 4.5, 5.0, 6.0, 7.0])
+    changed, added, removed = WaterYearInfo.diff_arrays(previous, new)
+
+    assert changed['dt'].tolist() == [np.datetime64('2023-10-04T00:00:00')]
+    assert (changed['old'][0], changed['new'][0]) == (4.0, 4.5)
+    assert added['dt'].astype('datetime64[D]').astype(str).tolist() == ['2023-10-06', '2023-10-07']
+    assert added['new'].tolist() == [6.0, 7.0]
+    assert removed['dt'].astype('datetime64[D]').astype(str).tolist() == ['2023-10-01']
+    assert removed['old'][0] == 1.0 and np.isnan(removed['new'][0])
+
+    differences = WaterYearInfo.compare_ndarray_containers(previous, new)
+    assert [d[0] for d in differences] == ['2023-10-01 00:00:00', '2023-10-04 00:00:00',
+                                           '2023-10-06 00:00:00', '2023-10-07 00:00:00']
+    assert differences[0] == ('2023-10-01 00:00:00', 1.0, None)
+    assert differences[2] == ('2023-10-06 00:00:00', None, 6.0)
+
+
+def test_diff_data_records_revisions_and_keeps_backup(data_dir):
+    file_path = data_dir / 'data' / 'USBR_RISE' / '919_2024.json'
+    file_path.parent.mkdir(parents=True)
+    backup = file_path.with_name('919_2024_20240101.json')
+    backup.write_text('{}')
+    previous = daily('2023-10-01', [1.0, 2.0, 3.0])
+    new = daily('2023-10-02', [2.5, 3.0, 4.0])
+
+    assert WaterYearInfo.diff_data(previous, new, file_path, backup) == (True, True)
+    written = revisions.load(file_path)
+    assert written['dt'].astype('datetime64[D]').astype(str).tolist() == ['2023-10-02', '2023-10-01']
+    assert written['old'].tolist() == [2.0, 1.0]
+    assert written['new'][0] == 2.5 and np.isnan(written['new'][1])
+    assert backup.exists()
+
+    # Only new days, nothing revised and the backup is dropped
+    assert WaterYearInfo.diff_data(new, daily('2023-10-02', [2.5, 3.0, 4.0, 5.0]), file_path, backup) == (False, True)
+    assert len(revisions.load(file_path)) == 2
+    assert not backup.exists()